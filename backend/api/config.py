@@ -20,6 +20,17 @@ class Config(BaseSettings):
     PROPERTIES_PATH: str = "original/04_StoneMasonryMicrostructureDatabase.csv"
     STONE_PROPERTIES_DIR_PATH: str = "original/03_Stones_geometric_properties"
 
+    # Compute, 0 workers for one per CPU
+    COMPUTE_WORKERS: int = 2
+    JOB_WORKERS: int = 2
+    JOB_QUEUE_SIZE: int = 16
+    JOB_RESULT_TTL: int = 600
+    VOLUME_MEMORY_BUDGET: int = 2 * 1024**3  # bytes
+    VOLUME_CHUNK_SIZE: int = 64  # voxels
+    # Precomputed graphs and slices, shared by all processes, "" to disable
+    ARTIFACT_CACHE_PATH: str = "/tmp/mmsdb_artifacts"
+    ARTIFACT_CACHE_BYTES: int = 4 * 1024**3
+
     # Mail/SMTP
     SMTP_HOST: str = "mail.epfl.ch"
     SMTP_PORT: int = 25
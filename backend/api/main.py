@@ -2,13 +2,16 @@ from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 from logging import INFO, basicConfig, warning
 
-from fastapi import FastAPI, status
+from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
 from pydantic import BaseModel
 
 from api.config import config
+from api.services.compute_pool import shutdown_executor
+from api.services.jobs import job_queue
+from api.services.properties import properties
 from api.views.auth import router as auth_router
 from api.views.compute import router as compute_router
 from api.views.files import router as files_router
@@ -20,7 +23,15 @@ basicConfig(level=INFO)
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
     FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    await job_queue.start()
+    try:
+        # Loaded from its snapshot, unless the properties file changed
+        await properties.get_store()
+    except HTTPException as e:
+        warning(e.detail)
     yield
+    await job_queue.stop()
+    shutdown_executor()
 
 
 app = FastAPI(root_path=config.PATH_PREFIX, lifespan=lifespan)
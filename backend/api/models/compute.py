@@ -1,9 +1,74 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
+GraphEngine = Literal["networkx", "csr", "grid", "multiresolution"]
+SweepEngine = Literal["csr", "grid"]
+PathEncoding = Literal["full", "chain", "npy", "simplified"]
+SearchMode = Literal["dijkstra", "astar", "bidirectional_astar"]
+JobState = Literal["queued", "running", "done", "failed"]
+
+
+class BootstrapBand(BaseModel):
+    # Bounds at each x
+    x: list[float]
+    lower: list[float]
+    upper: list[float]
+
 
-class CorrelationResult(BaseModel):
+class BootstrapResult(BaseModel):
+    samples: int
+    seed: int
+    confidence: float
+    # Percentile intervals, [lower, upper]
+    slope: list[float]
+    intercept: list[float]
+    # Confidence band of the fitted line
+    band: BootstrapBand
+    # Prediction band of new pairs, with the scatter of the residuals
+    prediction_band: BootstrapBand
+
+
+class LinearFit(BaseModel):
     slope: float
     intercept: float
     R2: float
     MAE: float
     outlier_indices: list[int]
+    bootstrap: BootstrapResult | None = None
+
+
+class CorrelationResult(LinearFit):
+    # Stage durations and cache hits, see `timing.StageTimings`
+    timings: dict[str, dict] | None = None
+
+
+class CorrelationFit(LinearFit):
+    x_column: str
+    y_column: str
+
+
+class CorrelationMatrix(BaseModel):
+    columns: list[str]
+    # Number of rows where both columns are numbers, for each pair
+    counts: list[list[int]]
+    pearson: list[list[float | None]]
+    spearman: list[list[float | None]]
+    fits: list[CorrelationFit]
+    timings: dict[str, dict] | None = None
+
+
+class LineQuery(BaseModel):
+    start_x: int
+    start_y: int
+    end_x: int
+    end_y: int
+    analysis_type: int
+
+
+class JobStatus(BaseModel):
+    id: str
+    state: JobState
+    timings: dict[str, float]
+    stage_timings: dict[str, dict] | None = None
+    error: str | None = None
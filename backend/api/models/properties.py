@@ -7,3 +7,12 @@ class Column(BaseModel):
 
 
 Table = list[Column]
+
+
+class PropertyQueryResult(BaseModel):
+    # Number of rows matching the filters, before the offset and limit
+    total: int
+    offset: int
+    # Index of each returned row in the properties table
+    rows: list[int]
+    columns: Table
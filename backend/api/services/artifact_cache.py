@@ -0,0 +1,173 @@
+"""
+Persistent cache of the precomputed arrays of the LMT computations.
+
+Graphs and prepared slices are stored under `config.ARTIFACT_CACHE_PATH`,
+one directory of .npy files per entry, named after the hash of the image
+and of the parameters. Entries are reloaded memory mapped, so that they are
+shared between the worker processes, the uvicorn workers and restarts, and
+only paged in when used. The least recently used entries are removed when
+the total size exceeds `config.ARTIFACT_CACHE_BYTES`.
+
+Entries are written to a temporary directory and renamed into place, so
+that concurrent writers of the same entry never expose a partial one, and
+renamed out of place before being removed. Their manifest lists their
+arrays, an entry missing any of them, being removed while read, is a miss.
+"""
+
+import hashlib
+import os
+import shutil
+from collections.abc import Callable
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import numpy as np
+from api.config import config
+from api.services.timing import record_cache
+
+# File of an entry listing its array names, one per line
+_MANIFEST = "manifest"
+
+# Hit and miss counters, shared with the worker processes, see `share_counters`
+_counters = get_context("spawn").Array("q", 2)
+
+
+def share_counters(counters: Any) -> None:
+    """Count in the counters of the parent process, as a pool initializer."""
+    global _counters
+    _counters = counters
+
+
+def shared_counters() -> Any:
+    return _counters
+
+
+def array_key(*parts: Any) -> str:
+    """
+    Content hash of arrays and other parameters, for cache keys.
+
+    Boolean arrays are hashed as packed bits, eight times less data to hash
+    than their bytes.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(f"{part.dtype.str}{part.shape}".encode())
+            data = np.packbits(part) if part.dtype == bool else part
+            digest.update(np.ascontiguousarray(data).data)
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = Path(path) if path else None
+        self.max_bytes = max_bytes
+
+    def get(self, key: str) -> dict[str, np.ndarray] | None:
+        """Arrays of an entry, memory mapped, or None if not cached."""
+        if self.path is None:
+            return None
+        entry = self.path / key
+        try:
+            names = (entry / _MANIFEST).read_text().split()
+            arrays = {
+                name: np.load(entry / f"{name}.npy", mmap_mode="r") for name in names
+            }
+            # Most recently used first when evicting
+            os.utime(entry)
+        except (OSError, ValueError):
+            # Missing, or removed while reading
+            self._count(miss=True)
+            return None
+        self._count(miss=False)
+        return arrays
+
+    def put(self, key: str, arrays: dict[str, np.ndarray]) -> None:
+        """Store the arrays of an entry, then evict to fit the byte budget."""
+        if self.path is None:
+            return
+        temporary = self.path / f".{key}.{uuid4().hex}"
+        try:
+            temporary.mkdir(parents=True)
+            for name, array in arrays.items():
+                np.save(temporary / f"{name}.npy", array)
+            (temporary / _MANIFEST).write_text("\n".join(arrays))
+            os.rename(temporary, self.path / key)
+        except OSError:
+            # Stored in the meantime by another process, or no space left
+            shutil.rmtree(temporary, ignore_errors=True)
+            return
+        self._evict()
+
+    def get_or_create(
+        self, key: str, create: Callable[[], dict[str, np.ndarray]]
+    ) -> dict[str, np.ndarray]:
+        """Arrays of an entry, created and stored if not cached."""
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = create()
+            self.put(key, arrays)
+        return arrays
+
+    def stats(self) -> dict[str, int]:
+        with _counters.get_lock():
+            hits, misses = _counters[:]
+        entries = self._entries()
+        return {
+            "hits": hits,
+            "misses": misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def _count(self, miss: bool) -> None:
+        record_cache("artifact", not miss)
+        with _counters.get_lock():
+            _counters[int(miss)] += 1
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        """Last use time, size and path of the stored entries."""
+        if self.path is None or not self.path.is_dir():
+            return []
+        entries = []
+        for entry in self.path.iterdir():
+            if entry.name.startswith("."):
+                continue
+            try:
+                size = sum(file.stat().st_size for file in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries above the byte budget."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(entry)
+            total -= size
+
+    def _remove(self, entry: Path) -> None:
+        """
+        Remove an entry, renamed out of place first so that readers miss it
+        rather than get part of it. Memory maps of the entry in other
+        processes stay valid.
+        """
+        tombstone = entry.with_name(f".{entry.name}.{uuid4().hex}.evicted")
+        try:
+            os.rename(entry, tombstone)
+        except OSError:
+            return  # removed in the meantime by another process
+        shutil.rmtree(tombstone, ignore_errors=True)
+
+
+artifact_cache = ArtifactCache(config.ARTIFACT_CACHE_PATH, config.ARTIFACT_CACHE_BYTES)
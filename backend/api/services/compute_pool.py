@@ -0,0 +1,88 @@
+"""
+Process pool for the CPU-bound computations of the compute endpoints.
+
+Line minimum traces and regression fits hold the GIL for seconds on large
+inputs. Running them in the event loop, even in a thread, stalls every
+other request of the worker, health checks included. They are dispatched
+to a pool of `config.COMPUTE_WORKERS` processes instead.
+
+Uploaded images are not pickled to the workers: they are copied once into
+a shared memory segment, owned by the calling process, and the workers
+attach to it by name.
+"""
+
+import asyncio
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from io import BytesIO
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, TypeVar
+
+from api.config import config
+from api.services.artifact_cache import share_counters, shared_counters
+
+T = TypeVar("T")
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the process pool, created on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=config.COMPUTE_WORKERS or None,
+            # Forking a process running an event loop and threads is unsafe
+            mp_context=get_context("spawn"),
+            initializer=share_counters,
+            initargs=(shared_counters(),),
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """Shut the process pool down, if it was started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def run_in_pool(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """Run fn in the process pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(fn, *args, **kwargs))
+
+
+@contextmanager
+def shared_bytes(data: bytes) -> Iterator[tuple[str, int]]:
+    """Copy data into a shared memory segment, yielding its name and size."""
+    shm = SharedMemory(create=True, size=max(len(data), 1))
+    try:
+        shm.buf[: len(data)] = data
+        yield shm.name, len(data)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def run_with_shared_image(
+    fn: Callable[..., T], shm_name: str, size: int, /, *args: Any, **kwargs: Any
+) -> T:
+    """
+    Call fn with the image in a shared memory segment as first argument.
+
+    Meant to run in a worker: the segment is attached as a file-like object
+    and detached before returning, its owner is in charge of unlinking it.
+    """
+    shm = SharedMemory(name=shm_name, track=False)
+    try:
+        view = shm.buf[:size]
+        image_file = BytesIO(view)
+        view.release()
+        return fn(image_file, *args, **kwargs)
+    finally:
+        shm.close()
@@ -1,34 +1,299 @@
+import asyncio
+import warnings
+
 import numpy as np
-from api.models.compute import CorrelationResult
+from api.models.compute import (
+    BootstrapBand,
+    BootstrapResult,
+    CorrelationFit,
+    CorrelationMatrix,
+    CorrelationResult,
+)
+from api.services.compute_pool import run_in_pool
 from api.services.properties import properties
+from api.services.timing import record_cache, timed
+from cachetools import LRUCache
+from fastapi import HTTPException
+from scipy.stats import rankdata
+from sklearn.exceptions import ConvergenceWarning
 from sklearn.linear_model import HuberRegressor
 from sklearn.metrics import mean_absolute_error
 
+# Fewest pairs of numbers for a correlation coefficient or a fit
+_MIN_PAIRS = 3
+# Bootstrap fits per process pool task
+_BOOTSTRAP_CHUNK = 100
+# Points of the x grid of the bootstrap band
+_BAND_POINTS = 50
+
+# Bootstrap results, by columns, categories, parameters and data version
+_bootstrap_cache: LRUCache[tuple, BootstrapResult] = LRUCache(maxsize=64)
+
 
 async def compute_correlation_parameters(
-    x_column: str, y_column: str, allowed_categories: list[str] = []
+    x_column: str,
+    y_column: str,
+    allowed_categories: list[str] = [],
+    bootstrap: int = 0,
+    seed: int = 0,
+    confidence: float = 0.95,
 ) -> CorrelationResult:
-    x_raw = await properties.get_property_column_values(
-        x_column, allowed_categories=allowed_categories
+    """
+    Robust fit of y_column against x_column, see `fit_correlation`.
+
+    With bootstrap, the fit also gets percentile confidence intervals of its
+    slope and intercept, and a confidence band of its line, from that many
+    fits of resampled pairs. The prediction band adds to each fitted line a
+    residual of that fit at a random pair, for the spread of new pairs
+    around the line. The fits are run in chunks in the process pool and only
+    depend on the seed, not on the chunks.
+    """
+    with timed("columns"):
+        x_values = await properties.get_property_column_values(
+            x_column, allowed_categories=allowed_categories
+        )
+        y_values = await properties.get_property_column_values(
+            y_column, allowed_categories=allowed_categories
+        )
+
+    with timed("fit"):
+        result = await run_in_pool(fit_correlation, x_values, y_values)
+    if bootstrap == 0:
+        return result
+
+    store = await properties.get_store()
+    key = (
+        x_column,
+        y_column,
+        frozenset(allowed_categories),
+        bootstrap,
+        seed,
+        confidence,
+        store.version,
+    )
+    cached = _bootstrap_cache.get(key)
+    record_cache("bootstrap", cached is not None)
+    if cached is None:
+        with timed("bootstrap"):
+            cached = await _bootstrap(x_values, y_values, bootstrap, seed, confidence)
+        _bootstrap_cache[key] = cached
+    result.bootstrap = cached
+    return result
+
+
+async def _bootstrap(
+    x_values: np.ndarray,
+    y_values: np.ndarray,
+    samples: int,
+    seed: int,
+    confidence: float,
+) -> BootstrapResult:
+    valid = np.isfinite(x_values) & np.isfinite(y_values)
+    x = np.asarray(x_values, dtype=float)[valid]
+    y = np.asarray(y_values, dtype=float)[valid]
+    chunks = await asyncio.gather(
+        *(
+            run_in_pool(
+                bootstrap_fits,
+                x,
+                y,
+                seed,
+                start,
+                min(start + _BOOTSTRAP_CHUNK, samples),
+            )
+            for start in range(0, samples, _BOOTSTRAP_CHUNK)
+        )
+    )
+    fits = np.concatenate(chunks)
+
+    percentiles = [50 * (1 - confidence), 50 * (1 + confidence)]
+    grid = np.linspace(x.min(), x.max(), _BAND_POINTS)
+    lines = fits[:, :1] * grid + fits[:, 1:]
+    lower, upper = np.percentile(lines, percentiles, axis=0)
+    # Residuals of each fit, one at a random pair for each point of the grid
+    rows = np.random.default_rng(seed).integers(0, len(x), lines.shape)
+    residuals = y[rows] - (fits[:, :1] * x[rows] + fits[:, 1:])
+    prediction_lower, prediction_upper = np.percentile(
+        lines + residuals, percentiles, axis=0
+    )
+    return BootstrapResult(
+        samples=samples,
+        seed=seed,
+        confidence=confidence,
+        slope=np.percentile(fits[:, 0], percentiles).tolist(),
+        intercept=np.percentile(fits[:, 1], percentiles).tolist(),
+        band=BootstrapBand(x=grid.tolist(), lower=lower.tolist(), upper=upper.tolist()),
+        prediction_band=BootstrapBand(
+            x=grid.tolist(),
+            lower=prediction_lower.tolist(),
+            upper=prediction_upper.tolist(),
+        ),
     )
-    y_raw = await properties.get_property_column_values(
-        y_column, allowed_categories=allowed_categories
+
+
+def bootstrap_fits(
+    x: np.ndarray, y: np.ndarray, seed: int, start: int, stop: int
+) -> np.ndarray:
+    """
+    Huber fits of the bootstrap samples start to stop of the pairs (x, y).
+
+    Sample i is drawn from a generator seeded with (seed, i), so that the
+    samples do not depend on how they are split between tasks.
+
+    Returns
+    -------
+    np.ndarray
+        Slope and intercept of each sample, of shape (stop - start, 2).
+    """
+    fits = np.empty((stop - start, 2))
+    with warnings.catch_warnings():
+        # Resamples with few distinct pairs may not converge
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        for i in range(start, stop):
+            rows = np.random.default_rng([seed, i]).integers(0, len(x), len(x))
+            huber = HuberRegressor().fit(x[rows].reshape(-1, 1), y[rows])
+            fits[i - start] = huber.coef_[0], huber.intercept_
+    return fits
+
+
+async def compute_correlation_matrix(
+    allowed_categories: list[str] = [],
+    fit_pairs: list[tuple[str, str]] = [],
+) -> CorrelationMatrix:
+    """
+    Correlation coefficients of every pair of numeric columns, and robust fits.
+
+    The coefficients are computed over the rows where both columns are
+    numbers. The robust fits of the requested pairs, see `fit_correlation`,
+    run in parallel in the process pool.
+    """
+    store = await properties.get_store()
+    columns = store.numeric_columns()
+    with timed("columns"):
+        values = {
+            column: await properties.get_property_column_values(
+                column, allowed_categories=allowed_categories
+            )
+            for column in {*columns, *(c for pair in fit_pairs for c in pair)}
+        }
+
+    for x_column, y_column in fit_pairs:
+        valid = np.isfinite(values[x_column]) & np.isfinite(values[y_column])
+        if np.count_nonzero(valid) < _MIN_PAIRS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Not enough numeric values to fit '{y_column}' "
+                f"against '{x_column}'",
+            )
+
+    with timed("matrix"):
+        counts, pearson, spearman = await run_in_pool(
+            pairwise_correlations,
+            np.column_stack([values[column] for column in columns]),
+        )
+    with timed("fit"):
+        fits = await asyncio.gather(
+            *(
+                run_in_pool(fit_correlation, values[x_column], values[y_column])
+                for x_column, y_column in fit_pairs
+            )
+        )
+
+    def to_lists(matrix: np.ndarray) -> list[list[float | None]]:
+        return np.where(np.isnan(matrix), None, matrix).tolist()
+
+    return CorrelationMatrix(
+        columns=columns,
+        counts=counts.tolist(),
+        pearson=to_lists(pearson),
+        spearman=to_lists(spearman),
+        fits=[
+            CorrelationFit(
+                x_column=x_column,
+                y_column=y_column,
+                **fit.model_dump(exclude={"timings"}),
+            )
+            for (x_column, y_column), fit in zip(fit_pairs, fits)
+        ],
     )
 
-    x_valid = []
-    y_valid = []
 
-    for x_val, y_val in zip(x_raw, y_raw):
-        try:
-            x_float = float(x_val)
-            y_float = float(y_val)
-            x_valid.append(x_float)
-            y_valid.append(y_float)
-        except (ValueError, TypeError):
-            continue
+def pairwise_correlations(
+    values: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pearson and Spearman coefficients of all the pairs of columns.
+
+    Each pair only uses the rows where both of its values are numbers, NaN
+    marking the others. Coefficients are NaN for the pairs with fewer than
+    three rows or a constant column on their rows.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Values of shape (rows, columns).
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        Row counts, Pearson and Spearman coefficients, of shape
+        (columns, columns).
+    """
+    valid = np.isfinite(values)
+    counts = valid.T.astype(np.int64) @ valid
+    pearson = _masked_pearson(values, valid)
+
+    # Ranks depend on the rows of each pair: for each column, its values are
+    # ranked once per other column, on the rows where both are numbers, and
+    # the other columns are ranked on the rows where this one is a number
+    spearman = np.full(counts.shape, np.nan)
+    for i in range(values.shape[1]):
+        rows = valid[:, i]
+        others = values[rows]
+        this = np.where(valid[rows], values[rows, i : i + 1], np.nan)
+        spearman[i] = _paired_pearson(
+            rankdata(this, axis=0, nan_policy="omit"),
+            rankdata(others, axis=0, nan_policy="omit"),
+        )
+    return counts, pearson, spearman
+
+
+def _masked_pearson(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Pearson coefficients of all the pairs of columns, with matrix products."""
+    weights = valid.astype(np.float64)
+    # Centered on the column means, for accuracy
+    x = np.where(valid, values - np.nanmean(values, axis=0, keepdims=True), 0.0)
+    n = weights.T @ weights
+    sum_x = x.T @ weights  # sum of column i on the rows of pair (i, j)
+    sum_xx = (x * x).T @ weights
+    sum_xy = x.T @ x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = n * sum_xy - sum_x * sum_x.T
+        variance = n * sum_xx - sum_x**2
+        pearson = covariance / np.sqrt(variance * variance.T)
+    pearson[(n < _MIN_PAIRS) | ~np.isfinite(pearson)] = np.nan
+    return np.clip(pearson, -1.0, 1.0)
+
+
+def _paired_pearson(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pearson coefficients of the matching columns of a and b."""
+    valid = np.isfinite(a) & np.isfinite(b)
+    n = valid.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = np.where(valid, a - np.nanmean(np.where(valid, a, np.nan), axis=0), 0.0)
+        b = np.where(valid, b - np.nanmean(np.where(valid, b, np.nan), axis=0), 0.0)
+        pearson = (a * b).sum(axis=0) / np.sqrt(
+            (a * a).sum(axis=0) * (b * b).sum(axis=0)
+        )
+    pearson[(n < _MIN_PAIRS) | ~np.isfinite(pearson)] = np.nan
+    return np.clip(pearson, -1.0, 1.0)
+
 
-    x1 = np.array(x_valid, dtype=float)
-    y1 = np.array(y_valid, dtype=float)
+def fit_correlation(x_values: np.ndarray, y_values: np.ndarray) -> CorrelationResult:
+    """Robust linear regression of the pairs of values that are both numbers."""
+    valid = np.isfinite(x_values) & np.isfinite(y_values)
+    x1 = np.asarray(x_values, dtype=float)[valid]
+    y1 = np.asarray(y_values, dtype=float)[valid]
 
     # ==============================
     # ROBUST REGRESSION (Huber)
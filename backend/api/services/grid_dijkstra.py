@@ -0,0 +1,660 @@
+"""
+Shortest paths on the pixel lattice of a binary image, without building a graph.
+
+`bwgraph` materializes every edge of the mortar network before a search can
+start. The solver below walks the image directly instead: neighbors are found
+by adding fixed linear offsets to a pixel index and edge costs are computed on
+the fly with the same rules as `bwgraph` (Euclidean step length, scaled by
+`interface_weight` when one of the two pixels is at the stone-mortar
+interface). All the state lives in flat arrays of one item per pixel.
+
+When numba is installed, the searches, Dijkstra, A* and bidirectional A*, run
+in compiled kernels over the same arrays, the interpreted loops being the
+fallback.
+"""
+
+from array import array
+from heapq import heappop, heappush
+from itertools import product
+from math import inf, sqrt
+from typing import Sequence
+
+import numpy as np
+
+from .bwgraph import interface_mask
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def grid_shortest_path(
+    bw: np.ndarray,
+    sources: Sequence[int],
+    targets: Sequence[int],
+    interface_weight: float = 1.0,
+    connectivity: int | None = None,
+    heuristic: bool = False,
+    interface: np.ndarray | None = None,
+    bidirectional: bool = False,
+) -> list[int] | None:
+    """
+    Find the shortest path from any of the sources to any of the targets.
+
+    Parameters
+    ----------
+    bw : np.ndarray
+        Binary image, 2D or 3D. Non-zero pixels are mortar, zero pixels stone.
+    sources : Sequence[int]
+        Linear indices of the pixels the path may start from.
+    targets : Sequence[int]
+        Linear indices of the pixels the path may end at.
+    interface_weight : float, default=1.0
+        Scaling factor of the edges touching the stone-mortar interface, see
+        `bwgraph`.
+    connectivity : int, optional
+        Pixel connectivity, see `bwgraph`. Default is the maximum connectivity.
+    heuristic : bool, default=False
+        Run A* instead of Dijkstra, guided by the Euclidean distance to the
+        target scaled by min(1, interface_weight), which never overestimates
+        the remaining cost. Only used when there is a single target.
+    interface : np.ndarray, optional
+        Precomputed mask of the pixels at the stone-mortar interface, see
+        `interface_mask`. Only its values on mortar pixels are used.
+    bidirectional : bool, default=False
+        With heuristic, run a bidirectional A* from both ends, with the
+        average of the forward and backward heuristics as potential. Only
+        used when there is a single source and a single target.
+
+    Returns
+    -------
+    list[int] | None
+        Linear indices of the pixels along the path, from source to target,
+        or None if no target can be reached.
+    """
+    bw = np.asarray(bw, dtype=bool)
+    if interface_weight <= 0:
+        raise ValueError("interface_weight must be positive")
+
+    grid = _PaddedGrid(bw, connectivity, interface)
+    sources = grid.to_padded(sources)
+    targets = grid.to_padded(targets)
+
+    if heuristic and bidirectional and len(sources) == 1 and len(targets) == 1:
+        path = _bidirectional_search(
+            grid, int(sources[0]), int(targets[0]), interface_weight
+        )
+        return None if path is None else grid.from_padded(path).tolist()
+
+    goal = None
+    if heuristic and len(targets) == 1:
+        goal = (grid.coordinates(int(targets[0])), min(1.0, interface_weight))
+
+    predecessors, reached = _search(
+        grid, sources, targets, interface_weight=interface_weight, goal=goal
+    )
+    if reached < 0:
+        return None
+
+    return grid.from_padded(_walk_back(predecessors, reached)).tolist()
+
+
+def grid_shortest_path_tree(
+    bw: np.ndarray,
+    source: int,
+    targets: Sequence[int],
+    interface_weight: float = 1.0,
+    connectivity: int | None = None,
+    interface: np.ndarray | None = None,
+) -> list[list[int] | None]:
+    """
+    Find the shortest paths from one source to each of the targets.
+
+    A single search is run, stopped as soon as every target is settled, and
+    the paths are read from its predecessor tree.
+
+    Parameters
+    ----------
+    bw, interface_weight, connectivity, interface
+        See `grid_shortest_path`.
+    source : int
+        Linear index of the pixel the paths start from.
+    targets : Sequence[int]
+        Linear indices of the pixels the paths end at.
+
+    Returns
+    -------
+    list[list[int] | None]
+        For each target, in the same order, the linear indices of the pixels
+        along the path from source to target, or None if it cannot be reached.
+    """
+    bw = np.asarray(bw, dtype=bool)
+    if interface_weight <= 0:
+        raise ValueError("interface_weight must be positive")
+
+    grid = _PaddedGrid(bw, connectivity, interface)
+    padded_source = int(grid.to_padded([source])[0])
+    padded_targets = grid.to_padded(targets)
+
+    predecessors, _ = _search(
+        grid,
+        np.array([padded_source]),
+        padded_targets,
+        interface_weight=interface_weight,
+        all_targets=True,
+    )
+
+    paths: list[list[int] | None] = []
+    for t in padded_targets.tolist():
+        if t != padded_source and predecessors[t] < 0:
+            paths.append(None)
+        else:
+            paths.append(grid.from_padded(_walk_back(predecessors, t)).tolist())
+    return paths
+
+
+def path_cost(
+    bw: np.ndarray,
+    path: Sequence[int],
+    interface_weight: float = 1.0,
+    interface: np.ndarray | None = None,
+) -> float:
+    """
+    Cost of a path with the edge costs of the searches, see `bwgraph`.
+
+    Parameters
+    ----------
+    bw, interface_weight, interface
+        See `grid_shortest_path`.
+    path : Sequence[int]
+        Linear indices of consecutive neighbor pixels.
+
+    Returns
+    -------
+    float
+        Sum of the Euclidean step lengths, scaled by interface_weight for the
+        steps touching the stone-mortar interface.
+    """
+    bw = np.asarray(bw, dtype=bool)
+    if interface is None:
+        interface = interface_mask(bw)
+    nodes = np.asarray(path, dtype=np.int64)
+    coords = np.column_stack(np.unravel_index(nodes, bw.shape))
+    lengths = np.sqrt((np.diff(coords, axis=0) ** 2).sum(axis=1))
+    at_interface = interface.ravel()[nodes]
+    touching = at_interface[:-1] | at_interface[1:]
+    return float(np.where(touching, lengths * interface_weight, lengths).sum())
+
+
+def _walk_back(predecessors: array, target: int) -> list[int]:
+    """Follow the predecessors from target back to its source."""
+    path = [target]
+    while predecessors[path[-1]] >= 0:
+        path.append(predecessors[path[-1]])
+    path.reverse()
+    return path
+
+
+class _PaddedGrid:
+    """Binary image padded with one layer of stone, as flat compact arrays.
+
+    The padding guarantees that neighbors of a mortar pixel are always inside
+    the array, so steps never need a bounds check.
+    """
+
+    def __init__(
+        self,
+        bw: np.ndarray,
+        connectivity: int | None,
+        interface: np.ndarray | None = None,
+    ) -> None:
+        dim = bw.ndim
+        if dim not in [2, 3]:
+            raise ValueError("Input must be 2D or 3D array")
+        if connectivity is None:
+            connectivity = 3**dim - 1
+        if dim == 2 and connectivity not in [4, 8]:
+            raise ValueError("Valid connectivities for 2D array are 4 and 8")
+        elif dim == 3 and connectivity not in [6, 18, 26]:
+            raise ValueError("Valid connectivities for 3D array are 6, 18, and 26")
+
+        self.shape = bw.shape
+        self.padded_shape = tuple(s + 2 for s in bw.shape)
+        self.mortar = bytearray(np.pad(bw, 1).tobytes())
+        if interface is None:
+            interface = interface_mask(bw)
+        self.interface = bytearray(np.pad(interface, 1).tobytes())
+
+        # Faces only for the lowest connectivity, faces and edges for 18
+        max_norm = {4: 1, 6: 1, 18: 2}.get(connectivity, dim)
+        strides = np.cumprod((1,) + self.padded_shape[:0:-1])[::-1]
+        self.strides = strides.astype(np.int64)
+        self.steps = [
+            (int(np.dot(offset, strides)), sqrt(sum(o * o for o in offset)))
+            for offset in product([-1, 0, 1], repeat=dim)
+            if 0 < sum(abs(o) for o in offset) <= max_norm
+        ]
+
+    @property
+    def size(self) -> int:
+        return len(self.mortar)
+
+    def to_padded(self, indices: Sequence[int]) -> np.ndarray:
+        coords = np.unravel_index(np.asarray(indices, dtype=np.int64), self.shape)
+        return np.ravel_multi_index(tuple(c + 1 for c in coords), self.padded_shape)
+
+    def from_padded(self, indices: Sequence[int]) -> np.ndarray:
+        coords = np.unravel_index(
+            np.asarray(indices, dtype=np.int64), self.padded_shape
+        )
+        return np.ravel_multi_index(tuple(c - 1 for c in coords), self.shape)
+
+    def kernel_arrays(self) -> tuple[np.ndarray, ...]:
+        """Mortar, interface, steps and their lengths, as the kernels take them."""
+        return (
+            np.frombuffer(self.mortar, dtype=np.uint8),
+            np.frombuffer(self.interface, dtype=np.uint8),
+            np.array([step for step, _ in self.steps], dtype=np.int64),
+            np.array([length for _, length in self.steps], dtype=np.float64),
+        )
+
+    def coordinates(self, index: int) -> tuple[int, ...]:
+        coords = []
+        for s in reversed(self.padded_shape):
+            index, c = divmod(index, s)
+            coords.append(c)
+        return tuple(reversed(coords))
+
+
+def _search(
+    grid: _PaddedGrid,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    interface_weight: float,
+    goal: tuple[tuple[int, ...], float] | None = None,
+    all_targets: bool = False,
+) -> tuple[array, int]:
+    """
+    Dijkstra (or A* when a goal is given) over the padded grid.
+
+    Returns the predecessor array (-1 for no predecessor) and the first
+    target settled, or -1 if none is reachable. With all_targets, the search
+    goes on until every target is settled and the last one is returned.
+    """
+    if _search_kernel is not None:
+        is_target = np.zeros(grid.size, dtype=np.uint8)
+        is_target[targets] = 1
+        coords, scale = ((), 0.0) if goal is None else goal
+        return _search_kernel(
+            *grid.kernel_arrays(),
+            np.asarray(sources, dtype=np.int64),
+            is_target,
+            float(interface_weight),
+            all_targets,
+            grid.strides,
+            np.array(grid.padded_shape, dtype=np.int64),
+            np.array(coords, dtype=np.float64),
+            float(scale),
+        )
+
+    n = grid.size
+    mortar = grid.mortar
+    interface = grid.interface
+    steps = grid.steps
+
+    distances = array("d", [inf]) * n
+    predecessors = array("q", [-1]) * n
+    settled = bytearray(n)
+    is_target = bytearray(n)
+    for t in targets:
+        is_target[t] = 1
+    remaining = sum(is_target) if all_targets else 1
+
+    def estimate(node: int) -> float:
+        if goal is None:
+            return 0.0
+        coords, scale = goal
+        position = grid.coordinates(node)
+        return scale * sqrt(sum((p - g) ** 2 for p, g in zip(position, coords)))
+
+    heap: list[tuple[float, int]] = []
+    for s in sources:
+        s = int(s)
+        if mortar[s]:
+            distances[s] = 0.0
+            heappush(heap, (estimate(s), s))
+
+    while heap:
+        _, u = heappop(heap)
+        if settled[u]:
+            continue
+        settled[u] = 1
+        if is_target[u]:
+            remaining -= 1
+            if remaining == 0:
+                return predecessors, u
+
+        du = distances[u]
+        u_interface = interface[u]
+        for step, length in steps:
+            v = u + step
+            if not mortar[v] or settled[v]:
+                continue
+            if u_interface or interface[v]:
+                length *= interface_weight
+            dv = du + length
+            if dv < distances[v]:
+                distances[v] = dv
+                predecessors[v] = u
+                heappush(heap, (dv + estimate(v), v))
+
+    return predecessors, -1
+
+
+def _distance(
+    node: int, strides: np.ndarray, shape: np.ndarray, point: np.ndarray
+) -> float:
+    """Euclidean distance from a pixel of the padded grid to a point."""
+    squares = 0.0
+    for d in range(point.shape[0]):
+        squares += ((node // strides[d]) % shape[d] - point[d]) ** 2
+    return np.sqrt(squares)
+
+
+def _grid_search(
+    mortar: np.ndarray,
+    interface: np.ndarray,
+    offsets: np.ndarray,
+    lengths: np.ndarray,
+    sources: np.ndarray,
+    is_target: np.ndarray,
+    interface_weight: float,
+    all_targets: bool,
+    strides: np.ndarray,
+    shape: np.ndarray,
+    goal: np.ndarray,
+    scale: float,
+) -> tuple[np.ndarray, int]:
+    """
+    Dijkstra over the padded grid, as `_search`, on NumPy arrays.
+
+    It is an A* when goal has the coordinates of the target, the heuristic
+    being their distance scaled by scale; goal is empty for Dijkstra.
+    Written in the subset of Python that numba compiles, see
+    `_search_kernel`. The heap is seeded with a sentinel entry so that numba
+    can infer its type.
+    """
+    n = mortar.shape[0]
+    distances = np.full(n, np.inf)
+    predecessors = np.full(n, -1, dtype=np.int64)
+    settled = np.zeros(n, dtype=np.uint8)
+    remaining = 1
+    if all_targets:
+        remaining = 0
+        for i in range(n):
+            remaining += is_target[i]
+    guided = goal.shape[0] > 0
+
+    heap = [(0.0, np.int64(-1))]
+    heappop(heap)
+    for s in sources:
+        if mortar[s]:
+            distances[s] = 0.0
+            estimate = scale * _distance(s, strides, shape, goal) if guided else 0.0
+            heappush(heap, (estimate, np.int64(s)))
+
+    last = np.int64(-1)
+    while heap:
+        _, u = heappop(heap)
+        if settled[u]:
+            continue
+        settled[u] = 1
+        if is_target[u]:
+            last = u
+            remaining -= 1
+            if remaining == 0:
+                return predecessors, last
+
+        du = distances[u]
+        u_interface = interface[u]
+        for k in range(offsets.shape[0]):
+            v = u + offsets[k]
+            if not mortar[v] or settled[v]:
+                continue
+            length = lengths[k]
+            if u_interface or interface[v]:
+                length *= interface_weight
+            dv = du + length
+            if dv < distances[v]:
+                distances[v] = dv
+                predecessors[v] = u
+                if guided:
+                    heappush(heap, (dv + scale * _distance(v, strides, shape, goal), v))
+                else:
+                    heappush(heap, (dv, v))
+
+    return predecessors, np.int64(-1)
+
+
+def _bidirectional(
+    mortar: np.ndarray,
+    interface: np.ndarray,
+    offsets: np.ndarray,
+    lengths: np.ndarray,
+    source: int,
+    target: int,
+    interface_weight: float,
+    strides: np.ndarray,
+    shape: np.ndarray,
+    source_coords: np.ndarray,
+    target_coords: np.ndarray,
+    scale: float,
+) -> tuple[np.ndarray, int]:
+    """
+    Bidirectional A* over the padded grid, as `_bidirectional_search`, on
+    NumPy arrays.
+
+    Written in the subset of Python that numba compiles, see
+    `_bidirectional_kernel`. Returns the predecessors of the forward and
+    backward searches, stacked, and the meeting pixel, -1 if there is none.
+    """
+    n = mortar.shape[0]
+    distances = np.full((2, n), np.inf)
+    predecessors = np.full((2, n), -1, dtype=np.int64)
+    settled = np.zeros((2, n), dtype=np.uint8)
+    forward = [(0.0, np.int64(-1))]
+    heappop(forward)
+    backward = [(0.0, np.int64(-1))]
+    heappop(backward)
+
+    distances[0, source] = 0.0
+    distances[1, target] = 0.0
+    heappush(
+        forward,
+        (
+            scale
+            * (
+                _distance(source, strides, shape, target_coords)
+                - _distance(source, strides, shape, source_coords)
+            )
+            / 2,
+            np.int64(source),
+        ),
+    )
+    heappush(
+        backward,
+        (
+            -scale
+            * (
+                _distance(target, strides, shape, target_coords)
+                - _distance(target, strides, shape, source_coords)
+            )
+            / 2,
+            np.int64(target),
+        ),
+    )
+
+    best = np.inf
+    meeting = np.int64(-1)
+    while forward and backward:
+        if forward[0][0] + backward[0][0] >= best:
+            break
+
+        side = 0 if forward[0][0] <= backward[0][0] else 1
+        if side == 0:
+            _, u = heappop(forward)
+        else:
+            _, u = heappop(backward)
+        if settled[side, u]:
+            continue
+        settled[side, u] = 1
+
+        du = distances[side, u]
+        u_interface = interface[u]
+        for k in range(offsets.shape[0]):
+            v = u + offsets[k]
+            if not mortar[v] or settled[side, v]:
+                continue
+            length = lengths[k]
+            if u_interface or interface[v]:
+                length *= interface_weight
+            dv = du + length
+            if dv < distances[side, v]:
+                distances[side, v] = dv
+                predecessors[side, v] = u
+                potential = (
+                    scale
+                    * (
+                        _distance(v, strides, shape, target_coords)
+                        - _distance(v, strides, shape, source_coords)
+                    )
+                    / 2
+                )
+                if side == 0:
+                    heappush(forward, (dv + potential, v))
+                else:
+                    heappush(backward, (dv - potential, v))
+                if dv + distances[1 - side, v] < best:
+                    best = dv + distances[1 - side, v]
+                    meeting = v
+
+    return predecessors, meeting
+
+
+# Compiled on first use, and cached on disk by numba across processes. The
+# distance helper is compiled too, for the kernels to call it
+_search_kernel = None
+_bidirectional_kernel = None
+if njit is not None:
+    _distance = njit(cache=True, nogil=True)(_distance)
+    _search_kernel = njit(cache=True, nogil=True)(_grid_search)
+    _bidirectional_kernel = njit(cache=True, nogil=True)(_bidirectional)
+
+
+def _bidirectional_search(
+    grid: _PaddedGrid, source: int, target: int, interface_weight: float
+) -> list[int] | None:
+    """
+    Bidirectional A* between two pixels of the padded grid.
+
+    Both searches run Dijkstra on the edge costs reduced by the potential
+    p(v) = (h_target(v) - h_source(v)) / 2, for the forward search, and -p(v)
+    for the backward one, which makes the reduced costs the same and
+    non-negative in both directions. The searches stop once the sum of their
+    smallest keys reaches the cost of the best path found through a pixel
+    reached by both.
+
+    Returns the path, from source to target, or None if there is none.
+    """
+    mortar = grid.mortar
+    interface = grid.interface
+    steps = grid.steps
+    n = grid.size
+    if not (mortar[source] and mortar[target]):
+        return None
+    if source == target:
+        return [source]
+
+    scale = min(1.0, interface_weight)
+    source_coords = grid.coordinates(source)
+    target_coords = grid.coordinates(target)
+
+    if _bidirectional_kernel is not None:
+        predecessors, meeting = _bidirectional_kernel(
+            *grid.kernel_arrays(),
+            source,
+            target,
+            float(interface_weight),
+            grid.strides,
+            np.array(grid.padded_shape, dtype=np.int64),
+            np.array(source_coords, dtype=np.float64),
+            np.array(target_coords, dtype=np.float64),
+            scale,
+        )
+        if meeting < 0:
+            return None
+        return _join_paths(predecessors[0], predecessors[1], int(meeting))
+
+    def potential(node: int) -> float:
+        position = grid.coordinates(node)
+        to_target = sqrt(sum((p - t) ** 2 for p, t in zip(position, target_coords)))
+        to_source = sqrt(sum((p - s) ** 2 for p, s in zip(position, source_coords)))
+        return scale * (to_target - to_source) / 2
+
+    distances = (array("d", [inf]) * n, array("d", [inf]) * n)
+    predecessors = (array("q", [-1]) * n, array("q", [-1]) * n)
+    settled = (bytearray(n), bytearray(n))
+    signs = (1.0, -1.0)
+    heaps: tuple[list[tuple[float, int]], list[tuple[float, int]]] = ([], [])
+    for side, start in enumerate((source, target)):
+        distances[side][start] = 0.0
+        heaps[side].append((signs[side] * potential(start), start))
+
+    # Cost of the best path found so far, and its meeting pixel
+    best = inf
+    meeting = -1
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        _, u = heappop(heaps[side])
+        if settled[side][u]:
+            continue
+        settled[side][u] = 1
+
+        dist, other = distances[side], distances[1 - side]
+        preds = predecessors[side]
+        sign = signs[side]
+        du = dist[u]
+        u_interface = interface[u]
+        for step, length in steps:
+            v = u + step
+            if not mortar[v] or settled[side][v]:
+                continue
+            if u_interface or interface[v]:
+                length *= interface_weight
+            dv = du + length
+            if dv < dist[v]:
+                dist[v] = dv
+                preds[v] = u
+                heappush(heaps[side], (dv + sign * potential(v), v))
+                if dv + other[v] < best:
+                    best = dv + other[v]
+                    meeting = v
+
+    if meeting < 0:
+        return None
+    return _join_paths(predecessors[0], predecessors[1], meeting)
+
+
+def _join_paths(forward: array, backward: array, meeting: int) -> list[int]:
+    """Path through the meeting pixel of a bidirectional search."""
+    path = _walk_back(forward, meeting)
+    node = meeting
+    while backward[node] >= 0:
+        node = int(backward[node])
+        path.append(node)
+    return path
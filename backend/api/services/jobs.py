@@ -0,0 +1,156 @@
+"""
+In-process queue of compute jobs, for computations longer than a request.
+
+Jobs are submitted as coroutine functions, put in a bounded queue and run by
+a fixed number of worker tasks, which usually hand the actual work over to
+the process pool. A full queue refuses new jobs instead of growing without
+limit. Finished jobs are kept for `config.JOB_RESULT_TTL` seconds.
+
+The stage timings of a job are collected while it runs, see `timing`; the
+work of a job adds the ones of its process pool calls with `add_timings`.
+The timings of the jobs done are aggregated in `timing_metrics`, under the
+name they were submitted with.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any
+from uuid import uuid4
+
+from api.config import config
+from api.models.compute import JobState, JobStatus
+from api.services.timing import collect_timings, timing_metrics
+
+logger = getLogger("uvicorn.error")
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    work: Callable[[], Awaitable[Any]]
+    name: str = "job"
+    state: JobState = "queued"
+    result: Any = None
+    error: str | None = None
+    queued_at: float = field(default_factory=time.monotonic)
+    started_at: float | None = None
+    finished_at: float | None = None
+    stage_timings: dict[str, dict] | None = None
+
+    def status(self) -> JobStatus:
+        now = time.monotonic()
+        timings = {"queued": (self.started_at or now) - self.queued_at}
+        if self.started_at is not None:
+            timings["running"] = (self.finished_at or now) - self.started_at
+        return JobStatus(
+            id=self.id,
+            state=self.state,
+            timings=timings,
+            stage_timings=self.stage_timings,
+            error=self.error,
+        )
+
+
+class JobQueue:
+    def __init__(
+        self,
+        workers: int = config.JOB_WORKERS,
+        max_queued: int = config.JOB_QUEUE_SIZE,
+        result_ttl: float = config.JOB_RESULT_TTL,
+    ) -> None:
+        self._workers = workers
+        self._max_queued = max_queued
+        self._result_ttl = result_ttl
+        self._jobs: dict[str, Job] = {}
+        self._queue: asyncio.Queue[Job] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start the worker tasks in the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self._max_queued)
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self._workers)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks, queued jobs are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(
+        self, work: Callable[[], Awaitable[Any]], name: str = "job"
+    ) -> JobStatus:
+        """Queue a job, raising JobQueueFullError if there is no room left."""
+        if self._queue is None:
+            raise RuntimeError("Job queue is not started")
+        self._purge()
+        job = Job(id=uuid4().hex, work=work, name=name)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError("Job queue is full")
+        self._jobs[job.id] = job
+        return job.status()
+
+    def get(self, job_id: str) -> Job | None:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    def _purge(self) -> None:
+        """Forget the jobs finished for longer than the result TTL."""
+        expiry = time.monotonic() - self._result_ttl
+        for job_id in [
+            job.id
+            for job in self._jobs.values()
+            if job.finished_at is not None and job.finished_at < expiry
+        ]:
+            del self._jobs[job_id]
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        assert queue is not None
+        while True:
+            job = await queue.get()
+            job.state = "running"
+            job.started_at = time.monotonic()
+            try:
+                with collect_timings() as stage_timings:
+                    job.result = await job.work()
+                job.state = "done"
+            except Exception as e:
+                logger.exception(f"Job {job.id} failed")
+                job.error = str(e)
+                job.state = "failed"
+            finally:
+                job.work = _done
+                job.finished_at = time.monotonic()
+                job.stage_timings = stage_timings.as_dict()
+                # Time spent outside of the stages, waiting for a compute worker
+                job.stage_timings["stages"]["pool"] = max(
+                    0.0,
+                    job.finished_at
+                    - job.started_at
+                    - sum(job.stage_timings["stages"].values()),
+                )
+                if job.state == "done":
+                    timing_metrics.record(
+                        job.name, job.stage_timings, job.finished_at - job.started_at
+                    )
+                queue.task_done()
+
+
+async def _done() -> None:
+    """Placeholder for the work of finished jobs, releasing their inputs."""
+
+
+job_queue = JobQueue()
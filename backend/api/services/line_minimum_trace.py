@@ -29,40 +29,64 @@ Note:
 """
 
 import base64
-import hashlib
 import os
+from collections.abc import Callable
+from dataclasses import fields
 from io import BytesIO
+from typing import BinaryIO
 
 import networkx as nx
 import numpy as np
-from cachetools import TTLCache, cached
+from cachetools import TTLCache
 from PIL import Image
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
 
-from .bwgraph import bwgraph
+from .artifact_cache import array_key, artifact_cache
+from .bwgraph import bwgraph, bwgraph_csr, bwgraph_csr_sweep
+from .grid_dijkstra import grid_shortest_path, grid_shortest_path_tree
+from .multiresolution import multiresolution_shortest_path
+from .overlay import render_overlay_png, store_overlay
+from .path_encoding import PATH_ENCODINGS, encode_path
+from .prepared_slice import PreparedSlice, prepare_slice
+from .timing import record_cache, timed
+
+# Image given as a file path, a file, the file content or an array
+ImageSource = str | BinaryIO | bytes | np.ndarray
+
+_NPY_MAGIC = b"\x93NUMPY"
+_NPZ_MAGIC = b"PK"
 
 
 def calculate_line_minimum_trace(
-    image_file_path: str,
-    start_coords: list,
-    end_coords: list,
+    image_file_path: ImageSource,
+    start_coords: list | None = None,
+    end_coords: list | None = None,
     real_length: float = 149.0,
     real_height: float = 140.0,
     calculate_LMT: int = 1,
     interface_weight: float = 1.0,
     boundary_margin: int = 5,
     return_plot: bool = True,
+    graph_engine: str = "networkx",
+    edge_to_edge: bool = False,
+    search: str = "dijkstra",
+    path_encoding: str = "full",
+    simplify_tolerance: float | None = None,
+    keep_overlay: bool = False,
 ) -> dict:
     """
     Calculate Line of Minimum Trace for masonry analysis.
 
     Parameters
     ----------
-    image_file_path : str
-        Path to the binary image file
-    start_coords : list
-        [row, col] coordinates for start point
-    end_coords : list
-        [row, col] coordinates for end point
+    image_file_path : ImageSource
+        Path to the binary image file, the file itself, its content or the
+        image as an array, see `_load_binary_image`
+    start_coords : list, optional
+        [row, col] coordinates for start point, not needed with edge_to_edge
+    end_coords : list, optional
+        [row, col] coordinates for end point, not needed with edge_to_edge
     real_length : float
         Real-world length of the masonry panel
     real_height : float
@@ -74,7 +98,37 @@ def calculate_line_minimum_trace(
     boundary_margin : int
         Boundary margin in pixels
     return_plot : bool
-        Whether to return plot image as base64 string
+        Whether to return the path drawn on the image, see
+        `render_overlay_png`, as a base64 PNG string
+    graph_engine : str
+        Shortest path backend: "networkx" builds a NetworkX graph, "csr"
+        builds a sparse adjacency matrix and runs scipy's Dijkstra, which is
+        much faster and lighter on large images, "grid" searches the pixel
+        lattice directly without building any graph, using the least memory,
+        "multiresolution" runs the grid search coarse to fine on an image
+        pyramid, faster on large images, with a trace within 2% of the
+        minimum as checked against an estimate of it, not guaranteed
+    edge_to_edge : bool
+        Find the minimum trace over all paths crossing the wall, from the
+        left to the right edge for horizontal bed joints and from the top to
+        the bottom edge otherwise, in a single search instead of between
+        start_coords and end_coords
+    search : str
+        Point to point search algorithm: "dijkstra", "astar" guided by the
+        Euclidean distance to the end point, or "bidirectional_astar" from
+        both end points. The A* searches find a path of the same cost while
+        visiting fewer pixels. Only "dijkstra" is available with the "csr" and
+        "multiresolution" engines, edge_to_edge searches always use Dijkstra.
+    path_encoding : str
+        Encoding of the path coordinates, see `encode_path`: "full" lists of
+        pixel and real-world coordinates, "chain" code, "npy" float32 buffer
+        or "simplified" lists of the vertices kept within simplify_tolerance
+    simplify_tolerance : float, optional
+        Tolerance in real-world units of the "simplified" encoding, default
+        is the size of a pixel
+    keep_overlay : bool
+        Keep the image and the path to draw their overlay later, see
+        `overlay.store_overlay`, the result getting its "result_id"
 
     Returns
     -------
@@ -83,158 +137,788 @@ def calculate_line_minimum_trace(
     """
 
     try:
+        if graph_engine not in GRAPH_ENGINES:
+            return {
+                "error": f"Unknown graph engine '{graph_engine}'",
+                "success": False,
+            }
+        if search not in SEARCH_MODES[graph_engine]:
+            return {
+                "error": f"Search '{search}' is not available with the "
+                f"'{graph_engine}' graph engine",
+                "success": False,
+            }
+        if path_encoding not in PATH_ENCODINGS:
+            return {
+                "error": f"Unknown path encoding '{path_encoding}'",
+                "success": False,
+            }
+
         # Read the binary image
-        if not os.path.exists(image_file_path):
+        if isinstance(image_file_path, str) and not os.path.exists(image_file_path):
             return {
                 "error": f"Image file not found at {image_file_path}",
                 "success": False,
             }
 
-        image = np.array(Image.open(image_file_path).convert("L"))
-        # Convert to binary (assuming white=255 is mortar, black=0 is stone)
-        image = (image > 128).astype(bool)
-
-        # Apply boundary conditions based on LMT type
-        if boundary_margin:
-            if calculate_LMT == 1:  # Horizontal bed joint
-                image[:, :boundary_margin] = 1
-                image[:, -boundary_margin:] = 1
-                image[:boundary_margin, :] = 0
-                image[-boundary_margin:, :] = 0
-            else:  # Vertical joints or wall leaf connections
-                image[:, :boundary_margin] = 0
-                image[:, -boundary_margin:] = 0
-                image[:boundary_margin, :] = 1
-                image[-boundary_margin:, :] = 1
-
-        # Create the graph
-        G = bwgraph_cached(image, interface_weight=interface_weight)
+        with timed("decode"):
+            image = _load_binary_image(image_file_path)
+        with timed("boundary"):
+            _apply_boundary_conditions(image, calculate_LMT, boundary_margin)
+            prepared = prepare_slice_cached(image)
         sz = image.shape
 
-        pixel_length = sz[1]  # corresponding length in pixels
-        pixel_height = sz[0]  # corresponding height in pixels
-
-        # Calculate the scale factors for length and height
-        length_scale_factor = real_length / pixel_length
-        height_scale_factor = real_height / pixel_height
+        if edge_to_edge:
+            with timed("boundary"):
+                sources, targets = _boundary_nodes(image, calculate_LMT)
+                if not sources or not targets:
+                    return {
+                        "error": "No mortar found on the wall edges",
+                        "success": False,
+                    }
+                sources, targets = prepared.reachable(sources, targets)
+        else:
+            if start_coords is None or end_coords is None:
+                return {"error": "Start and end points are required", "success": False}
 
-        # Validate and adjust coordinates
-        start_point = [
-            max(0, min(start_coords[1], pixel_height - 1)),
-            max(0, min(start_coords[0], pixel_length - 1)),
-        ]
-        end_point = [
-            max(0, min(end_coords[1], pixel_height - 1)),
-            max(0, min(end_coords[0], pixel_length - 1)),
-        ]
+            # Check if points are on valid mortar (white) regions and find nearest if needed
+            start_point = _snap_to_mortar(prepared, start_coords)
+            end_point = _snap_to_mortar(prepared, end_coords)
 
-        # Check if points are on valid mortar (white) regions and find nearest if needed
-        start_point = _find_nearest_mortar(
-            image, start_point, pixel_height, pixel_length
-        )
-        end_point = _find_nearest_mortar(image, end_point, pixel_height, pixel_length)
+            if start_point is None:
+                return {"error": "No mortar found near start point", "success": False}
 
-        if start_point is None:
-            return {"error": "No mortar found near start point", "success": False}
+            if end_point is None:
+                return {"error": "No mortar found near end point", "success": False}
 
-        if end_point is None:
-            return {"error": "No mortar found near end point", "success": False}
+            # Convert to linear indices
+            sources = [int(np.ravel_multi_index((start_point[0], start_point[1]), sz))]
+            targets = [int(np.ravel_multi_index((end_point[0], end_point[1]), sz))]
 
-        # Convert to linear indices
-        source = np.ravel_multi_index((start_point[0], start_point[1]), sz)
-        target = np.ravel_multi_index((end_point[0], end_point[1]), sz)
-
-        # Check if nodes exist in graph
-        if source not in G.nodes or target not in G.nodes:
+        # Calculate shortest path between start and end points, unless they
+        # are in different parts of the mortar network
+        path_nodes = None
+        try:
+            if sources and prepared.connected(sources[0], targets[0]):
+                with timed("search"):
+                    path_nodes = _shortest_path(
+                        image,
+                        sources,
+                        targets,
+                        interface_weight,
+                        graph_engine,
+                        interface=prepared.interface,
+                        search=search,
+                    )
+        except nx.NodeNotFound:
             return {
                 "error": "Start or end point not accessible in mortar network",
                 "success": False,
             }
+        if path_nodes is None:
+            return {"error": "No path found between selected points", "success": False}
 
-        # Calculate shortest path between start and end points
-        try:
-            path_nodes = nx.shortest_path(
-                G, source=source, target=target, weight="weight"
+        if edge_to_edge:
+            start_point = [int(c) for c in np.unravel_index(path_nodes[0], sz)]
+            end_point = [int(c) for c in np.unravel_index(path_nodes[-1], sz)]
+
+        with timed("serialization"):
+            results = _path_results(
+                path_nodes,
+                sz,
+                real_length,
+                real_height,
+                calculate_LMT,
+                path_encoding=path_encoding,
+                simplify_tolerance=simplify_tolerance,
             )
-        except nx.NetworkXNoPath:
-            return {"error": "No path found between selected points", "success": False}
+        results["start_point_used"] = start_point
+        results["end_point_used"] = end_point
+
+        # Generate plot if requested
+        if return_plot:
+            with timed("plot"):
+                pi, pj = np.unravel_index(path_nodes, sz)
+                plot_base64 = _generate_plot(image, pi, pj, start_point, end_point)
+            results["plot_image"] = plot_base64
+
+        if keep_overlay:
+            with timed("plot"):
+                pi, pj = np.unravel_index(path_nodes, sz)
+                result_id = store_overlay(
+                    image, np.column_stack((pj, pi)), start_point, end_point
+                )
+            if result_id is not None:
+                results["result_id"] = result_id
+
+        return results
+
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}", "success": False}
 
-        # Convert linear indices back to 2D coordinates
-        path_coords = [np.unravel_index(node, sz) for node in path_nodes]
-        pi = [coord[0] for coord in path_coords]
-        pj = [coord[1] for coord in path_coords]
 
-        # Scale the path coordinates to real-world units
-        pi_scaled = np.array(pi) * height_scale_factor
-        pj_scaled = np.array(pj) * length_scale_factor
+def calculate_line_minimum_trace_batch(
+    image_file_path: ImageSource,
+    queries: list[dict],
+    real_length: float = 149.0,
+    real_height: float = 140.0,
+    interface_weight: float = 1.0,
+    boundary_margin: int = 5,
+    graph_engine: str = "networkx",
+    path_encoding: str = "full",
+    simplify_tolerance: float | None = None,
+) -> dict:
+    """
+    Calculate the Line of Minimum Trace for many start/end pairs on one image.
+
+    The image is read once and a single search is run per distinct start
+    point and analysis type, the resulting shortest path tree giving the
+    paths to all the end points queried from that start.
 
-        # Combine x and y coordinates into a matrix
-        zigzag_coordinates = np.column_stack((pj_scaled, pi_scaled))
+    Parameters
+    ----------
+    image_file_path : ImageSource
+        Path to the binary image file, the file itself, its content or the
+        image as an array, see `_load_binary_image`
+    queries : list[dict]
+        Each with "start_coords", "end_coords" and "calculate_LMT" entries,
+        same meaning as in `calculate_line_minimum_trace`
+    real_length, real_height, interface_weight, boundary_margin, graph_engine,
+    path_encoding, simplify_tolerance
+        See `calculate_line_minimum_trace`
 
-        # Calculate the Euclidean distances between consecutive points
-        distances = np.sqrt(np.sum(np.diff(zigzag_coordinates, axis=0) ** 2, axis=1))
+    Returns
+    -------
+    dict
+        Results containing one entry per query, in the same order, formatted
+        as the results of `calculate_line_minimum_trace` without plot
+    """
 
-        # Sum up the distances to get the total length
-        total_length = np.sum(distances)
+    try:
+        if graph_engine not in GRAPH_ENGINES:
+            return {
+                "error": f"Unknown graph engine '{graph_engine}'",
+                "success": False,
+            }
+        if path_encoding not in PATH_ENCODINGS:
+            return {
+                "error": f"Unknown path encoding '{path_encoding}'",
+                "success": False,
+            }
 
-        # Compute LMT based on the selected option
-        if calculate_LMT == 0:
-            LMT_type = "vertical"
-            LMT_result = total_length / real_height
-        elif calculate_LMT == 1:
-            LMT_type = "horizontal"
-            LMT_result = total_length / real_length
+        if isinstance(image_file_path, str) and not os.path.exists(image_file_path):
+            return {
+                "error": f"Image file not found at {image_file_path}",
+                "success": False,
+            }
+
+        with timed("decode"):
+            raw_image = _load_binary_image(image_file_path)
+        sz = raw_image.shape
+        results: list[dict] = [{} for _ in queries]
+
+        # Vertical joints and wall leaf connections share the same boundaries
+        groups: dict[bool, list[int]] = {}
+        for i, query in enumerate(queries):
+            groups.setdefault(query["calculate_LMT"] == 1, []).append(i)
+
+        for indices in groups.values():
+            with timed("boundary"):
+                image = raw_image.copy()
+                _apply_boundary_conditions(
+                    image, queries[indices[0]]["calculate_LMT"], boundary_margin
+                )
+                prepared = prepare_slice_cached(image)
+
+            # Pending (query index, end point) for each start pixel
+            pending: dict[int, list[tuple[int, list]]] = {}
+            snapped: dict[int, list] = {}
+            for i in indices:
+                start_point = _snap_to_mortar(prepared, queries[i]["start_coords"])
+                end_point = _snap_to_mortar(prepared, queries[i]["end_coords"])
+                if start_point is None:
+                    results[i] = {
+                        "error": "No mortar found near start point",
+                        "success": False,
+                    }
+                elif end_point is None:
+                    results[i] = {
+                        "error": "No mortar found near end point",
+                        "success": False,
+                    }
+                else:
+                    source = int(np.ravel_multi_index(tuple(start_point), sz))
+                    target = int(np.ravel_multi_index(tuple(end_point), sz))
+                    if not prepared.connected(source, target):
+                        results[i] = {
+                            "error": "No path found between selected points",
+                            "success": False,
+                        }
+                        continue
+                    pending.setdefault(source, []).append((i, end_point))
+                    snapped[source] = start_point
+
+            for source, ends in pending.items():
+                targets = [int(np.ravel_multi_index(tuple(p), sz)) for _, p in ends]
+                try:
+                    with timed("search"):
+                        paths = _shortest_path_tree(
+                            image,
+                            source,
+                            targets,
+                            interface_weight,
+                            graph_engine,
+                            interface=prepared.interface,
+                        )
+                except nx.NodeNotFound:
+                    paths = None
+
+                for k, (i, end_point) in enumerate(ends):
+                    if paths is None:
+                        results[i] = {
+                            "error": "Start or end point not accessible in mortar network",
+                            "success": False,
+                        }
+                    elif paths[k] is None:
+                        results[i] = {
+                            "error": "No path found between selected points",
+                            "success": False,
+                        }
+                    else:
+                        with timed("serialization"):
+                            results[i] = _path_results(
+                                paths[k],
+                                sz,
+                                real_length,
+                                real_height,
+                                queries[i]["calculate_LMT"],
+                                path_encoding=path_encoding,
+                                simplify_tolerance=simplify_tolerance,
+                            )
+                        results[i]["start_point_used"] = list(snapped[source])
+                        results[i]["end_point_used"] = end_point
+
+        return {"success": True, "results": results}
+
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}", "success": False}
+
+
+def calculate_line_minimum_trace_sweep(
+    image_file_path: ImageSource,
+    interface_weights: list[float],
+    start_coords: list | None = None,
+    end_coords: list | None = None,
+    real_length: float = 149.0,
+    real_height: float = 140.0,
+    calculate_LMT: int = 1,
+    boundary_margin: int = 5,
+    graph_engine: str = "csr",
+    edge_to_edge: bool = False,
+    path_encoding: str = "full",
+    simplify_tolerance: float | None = None,
+) -> dict:
+    """
+    Calculate the Line of Minimum Trace for several interface weights.
+
+    The image, its end points and, with the "csr" engine, the graph edges and
+    the interface test are computed once, only the edge weights change from
+    one interface weight to the next. The searches run back to back.
+
+    Parameters
+    ----------
+    image_file_path : ImageSource
+        Path to the binary image file, the file itself, its content or the
+        image as an array, see `_load_binary_image`
+    interface_weights : list[float]
+        Alpha values to compute the trace for
+    start_coords, end_coords, real_length, real_height, calculate_LMT,
+    boundary_margin, edge_to_edge, path_encoding, simplify_tolerance
+        See `calculate_line_minimum_trace`
+    graph_engine : str
+        Either "csr" or "grid", see `calculate_line_minimum_trace`
+
+    Returns
+    -------
+    dict
+        Results containing one entry per interface weight, in the same order,
+        formatted as the results of `calculate_line_minimum_trace` without
+        plot, with their "interface_weight"
+    """
+
+    try:
+        if graph_engine not in SWEEP_ENGINES:
+            return {
+                "error": f"Graph engine '{graph_engine}' does not support sweeps",
+                "success": False,
+            }
+        if any(w <= 0 for w in interface_weights):
+            return {"error": "Interface weights must be positive", "success": False}
+        if path_encoding not in PATH_ENCODINGS:
+            return {
+                "error": f"Unknown path encoding '{path_encoding}'",
+                "success": False,
+            }
+
+        if isinstance(image_file_path, str) and not os.path.exists(image_file_path):
+            return {
+                "error": f"Image file not found at {image_file_path}",
+                "success": False,
+            }
+
+        with timed("decode"):
+            image = _load_binary_image(image_file_path)
+        with timed("boundary"):
+            _apply_boundary_conditions(image, calculate_LMT, boundary_margin)
+            prepared = prepare_slice_cached(image)
+        sz = image.shape
+
+        if edge_to_edge:
+            with timed("boundary"):
+                sources, targets = _boundary_nodes(image, calculate_LMT)
+                if not sources or not targets:
+                    return {
+                        "error": "No mortar found on the wall edges",
+                        "success": False,
+                    }
+                sources, targets = prepared.reachable(sources, targets)
+            if not sources:
+                return {
+                    "error": "No path found between selected points",
+                    "success": False,
+                }
         else:
-            LMT_type = "wall_leaf_connection"
-            LMT_result = total_length / real_height
-
-        # Ensure LMT values are not less than 1
-        LMT_result = max(LMT_result, 1.0)
-
-        # Prepare results
-        results = {
-            "success": True,
-            "lmt_type": LMT_type,
-            "lmt_result": float(LMT_result),
-            "total_length": float(total_length),
-            "path_coordinates": {
-                "pixel_coordinates": [[int(pj[i]), int(pi[i])] for i in range(len(pi))],
-                "real_world_coordinates": zigzag_coordinates.tolist(),
-            },
-            "start_point_used": start_point,
-            "end_point_used": end_point,
-            "image_dimensions": {"width": pixel_length, "height": pixel_height},
-            "scale_factors": {
-                "length_scale": float(length_scale_factor),
-                "height_scale": float(height_scale_factor),
-            },
-        }
+            if start_coords is None or end_coords is None:
+                return {"error": "Start and end points are required", "success": False}
 
-        # Generate plot if requested
-        if return_plot:
-            plot_base64 = _generate_plot(
-                image, pi, pj, start_point, end_point, LMT_type
+            start_point = _snap_to_mortar(prepared, start_coords)
+            end_point = _snap_to_mortar(prepared, end_coords)
+            if start_point is None:
+                return {"error": "No mortar found near start point", "success": False}
+            if end_point is None:
+                return {"error": "No mortar found near end point", "success": False}
+
+            sources = [int(np.ravel_multi_index(tuple(start_point), sz))]
+            targets = [int(np.ravel_multi_index(tuple(end_point), sz))]
+            if not prepared.connected(sources[0], targets[0]):
+                return {
+                    "error": "No path found between selected points",
+                    "success": False,
+                }
+
+        if graph_engine == "csr":
+            paths = (
+                _csr_shortest_path(graph, sources, targets)
+                for graph in bwgraph_csr_sweep(image, interface_weights)
+            )
+        else:
+            paths = (
+                grid_shortest_path(
+                    image,
+                    sources,
+                    targets,
+                    interface_weight=interface_weight,
+                    interface=prepared.interface,
+                )
+                for interface_weight in interface_weights
             )
-            results["plot_image"] = plot_base64
 
-        return results
+        results = []
+        for interface_weight in interface_weights:
+            # The graph weights of the "csr" engine are updated in the search
+            with timed("search"):
+                path_nodes = next(paths)
+            if path_nodes is None:
+                results.append(
+                    {
+                        "error": "No path found between selected points",
+                        "success": False,
+                        "interface_weight": interface_weight,
+                    }
+                )
+                continue
+            with timed("serialization"):
+                result = _path_results(
+                    path_nodes,
+                    sz,
+                    real_length,
+                    real_height,
+                    calculate_LMT,
+                    path_encoding=path_encoding,
+                    simplify_tolerance=simplify_tolerance,
+                )
+            result["interface_weight"] = interface_weight
+            result["start_point_used"] = [
+                int(c) for c in np.unravel_index(path_nodes[0], sz)
+            ]
+            result["end_point_used"] = [
+                int(c) for c in np.unravel_index(path_nodes[-1], sz)
+            ]
+            results.append(result)
+
+        return {"success": True, "results": results}
 
     except Exception as e:
         return {"error": f"Unexpected error: {str(e)}", "success": False}
 
 
+def _load_binary_image(image_file_path: ImageSource) -> np.ndarray:
+    """
+    Read an image as a new boolean array, True for mortar.
+
+    Grayscale images and arrays are thresholded, white=255 being mortar and
+    black=0 stone. Binary images are used without conversion: 1-bit images,
+    boolean arrays or .npy files, and .npz files of rows of bits packed with
+    np.packbits, in a "packed" array, with the image "shape".
+    """
+    if isinstance(image_file_path, np.ndarray):
+        return _binarize(image_file_path).copy()
+    if isinstance(image_file_path, str):
+        with open(image_file_path, "rb") as f:
+            return _load_binary_image(f)
+    if isinstance(image_file_path, bytes):
+        image_file_path = BytesIO(image_file_path)
+
+    position = image_file_path.tell()
+    magic = image_file_path.read(len(_NPY_MAGIC))
+    image_file_path.seek(position)
+
+    if magic == _NPY_MAGIC:
+        return _binarize(np.load(image_file_path, allow_pickle=False))
+    if magic.startswith(_NPZ_MAGIC):
+        with np.load(image_file_path, allow_pickle=False) as archive:
+            shape = tuple(int(s) for s in archive["shape"])
+            if len(shape) != 2:
+                raise ValueError("Image must be 2D array")
+            image = np.unpackbits(archive["packed"], axis=-1, count=shape[1])
+        if image.shape != shape:
+            raise ValueError("Packed bits do not match the image shape")
+        return image.view(bool)
+
+    image = Image.open(image_file_path)
+    if image.mode == "1":
+        return np.array(image)
+    if image.mode != "L":
+        image = image.convert("L")
+    return np.asarray(image) > 128
+
+
+def _binarize(image: np.ndarray) -> np.ndarray:
+    """Boolean image of an array, itself if already boolean."""
+    if image.ndim != 2:
+        raise ValueError("Image must be 2D array")
+    if image.dtype == bool:
+        return image
+    return image > 128
+
+
+def _apply_boundary_conditions(
+    image: np.ndarray, calculate_LMT: int, boundary_margin: int
+) -> None:
+    """Apply boundary conditions based on LMT type, in place."""
+    if boundary_margin:
+        if calculate_LMT == 1:  # Horizontal bed joint
+            image[:, :boundary_margin] = 1
+            image[:, -boundary_margin:] = 1
+            image[:boundary_margin, :] = 0
+            image[-boundary_margin:, :] = 0
+        else:  # Vertical joints or wall leaf connections
+            image[:, :boundary_margin] = 0
+            image[:, -boundary_margin:] = 0
+            image[:boundary_margin, :] = 1
+            image[-boundary_margin:, :] = 1
+
+
+def _snap_to_mortar(prepared: PreparedSlice, coords: list) -> list | None:
+    """Clip [x, y] coordinates to the image and move them to the nearest mortar."""
+    pixel_height, pixel_length = prepared.image.shape
+
+    # Validate and adjust coordinates
+    point = [
+        max(0, min(coords[1], pixel_height - 1)),
+        max(0, min(coords[0], pixel_length - 1)),
+    ]
+    return prepared.snap(point)
+
+
+def _path_results(
+    path_nodes: list[int],
+    sz: tuple[int, ...],
+    real_length: float,
+    real_height: float,
+    calculate_LMT: int,
+    path_encoding: str = "full",
+    simplify_tolerance: float | None = None,
+) -> dict:
+    """Scale a path to real-world units, compute its LMT and encode it."""
+    pixel_length = sz[1]  # corresponding length in pixels
+    pixel_height = sz[0]  # corresponding height in pixels
+
+    # Calculate the scale factors for length and height
+    length_scale_factor = real_length / pixel_length
+    height_scale_factor = real_height / pixel_height
+
+    # Convert linear indices back to 2D coordinates
+    pi, pj = np.unravel_index(path_nodes, sz)
+
+    # Scale the path coordinates to real-world units
+    pi_scaled = pi * height_scale_factor
+    pj_scaled = pj * length_scale_factor
+
+    # Combine x and y coordinates into a matrix
+    zigzag_coordinates = np.column_stack((pj_scaled, pi_scaled))
+
+    # Calculate the Euclidean distances between consecutive points
+    distances = np.sqrt(np.sum(np.diff(zigzag_coordinates, axis=0) ** 2, axis=1))
+
+    # Sum up the distances to get the total length
+    total_length = np.sum(distances)
+
+    # Compute LMT based on the selected option
+    if calculate_LMT == 0:
+        LMT_type = "vertical"
+        LMT_result = total_length / real_height
+    elif calculate_LMT == 1:
+        LMT_type = "horizontal"
+        LMT_result = total_length / real_length
+    else:
+        LMT_type = "wall_leaf_connection"
+        LMT_result = total_length / real_height
+
+    # Ensure LMT values are not less than 1
+    LMT_result = max(LMT_result, 1.0)
+
+    return {
+        "success": True,
+        "lmt_type": LMT_type,
+        "lmt_result": float(LMT_result),
+        "total_length": float(total_length),
+        "path_coordinates": encode_path(
+            np.column_stack((pj, pi)),
+            zigzag_coordinates,
+            path_encoding,
+            tolerance=simplify_tolerance,
+        ),
+        "image_dimensions": {"width": pixel_length, "height": pixel_height},
+        "scale_factors": {
+            "length_scale": float(length_scale_factor),
+            "height_scale": float(height_scale_factor),
+        },
+    }
+
+
+GRAPH_ENGINES = ("networkx", "csr", "grid", "multiresolution")
+# Graph engines reusing the graph topology across interface weights
+SWEEP_ENGINES = ("csr", "grid")
+# Point to point search algorithms available with each graph engine
+SEARCH_MODES = {
+    "networkx": ("dijkstra", "astar"),
+    "csr": ("dijkstra",),
+    "grid": ("dijkstra", "astar", "bidirectional_astar"),
+    "multiresolution": ("dijkstra",),
+}
+
+
+def _shortest_path(
+    image: np.ndarray,
+    sources: list[int],
+    targets: list[int],
+    interface_weight: float,
+    graph_engine: str,
+    interface: np.ndarray | None = None,
+    search: str = "dijkstra",
+) -> list[int] | None:
+    """
+    Shortest path from any source to any target pixel, None if there is no path.
+
+    Sources and targets are linear pixel indices. With several sources or
+    targets, a single multi-source search is run, as if a virtual
+    super-source were connected to all sources and a virtual super-sink to
+    all targets with zero-weight edges. A precomputed interface mask is
+    only used by the "grid" and "multiresolution" engines. The A* searches,
+    see `SEARCH_MODES`, are only run between a single source and target.
+
+    Raises nx.NodeNotFound if an end point is not part of the mortar network.
+    """
+    if not (np.all(image.flat[sources]) and np.all(image.flat[targets])):
+        raise nx.NodeNotFound("Start or end node not in graph")
+
+    if graph_engine == "multiresolution":
+        return multiresolution_shortest_path(
+            image,
+            sources,
+            targets,
+            interface_weight=interface_weight,
+            interface=interface,
+        )
+
+    if graph_engine == "grid":
+        return grid_shortest_path(
+            image,
+            sources,
+            targets,
+            interface_weight=interface_weight,
+            interface=interface,
+            heuristic=search != "dijkstra",
+            bidirectional=search == "bidirectional_astar",
+        )
+
+    if graph_engine == "csr":
+        with timed("graph"):
+            graph = bwgraph_csr_cached(image, interface_weight=interface_weight)
+        return _csr_shortest_path(graph, sources, targets)
+
+    with timed("graph"):
+        G = bwgraph_cached(image, interface_weight=interface_weight)
+    if any(node not in G.nodes for node in [*sources, *targets]):
+        raise nx.NodeNotFound("Start or end node not in graph")
+    if len(sources) > 1 or len(targets) > 1:
+        G = G.copy()
+        G.add_edges_from((_SUPER_SOURCE, s, {"weight": 0.0}) for s in sources)
+        G.add_edges_from((t, _SUPER_SINK, {"weight": 0.0}) for t in targets)
+        try:
+            return nx.shortest_path(G, _SUPER_SOURCE, _SUPER_SINK, weight="weight")[
+                1:-1
+            ]
+        except nx.NetworkXNoPath:
+            return None
+    try:
+        if search == "astar":
+            return nx.astar_path(
+                G,
+                sources[0],
+                targets[0],
+                heuristic=_euclidean_heuristic(image.shape, interface_weight),
+                weight="weight",
+            )
+        return nx.shortest_path(G, sources[0], targets[0], weight="weight")
+    except nx.NetworkXNoPath:
+        return None
+
+
+def _euclidean_heuristic(
+    shape: tuple[int, ...], interface_weight: float
+) -> Callable[[int, int], float]:
+    """
+    A* heuristic between two pixels of an image of this shape.
+
+    Every edge costs at least min(1, interface_weight) times its length, so
+    the scaled Euclidean distance never overestimates the remaining cost.
+    """
+    scale = min(1.0, interface_weight)
+
+    def heuristic(u: int, v: int) -> float:
+        ui, uj = divmod(u, shape[1])
+        vi, vj = divmod(v, shape[1])
+        return scale * float(np.hypot(ui - vi, uj - vj))
+
+    return heuristic
+
+
+def _csr_shortest_path(
+    graph: csr_matrix, sources: list[int], targets: list[int]
+) -> list[int] | None:
+    """Multi-source shortest path on a `bwgraph_csr` matrix."""
+    distances, predecessors, _ = dijkstra(
+        graph,
+        directed=False,
+        indices=sources,
+        return_predecessors=True,
+        min_only=True,
+    )
+    target = targets[int(np.argmin(distances[targets]))]
+    if not np.isfinite(distances[target]):
+        return None
+    return _path_from_predecessors(predecessors, target)
+
+
+def _shortest_path_tree(
+    image: np.ndarray,
+    source: int,
+    targets: list[int],
+    interface_weight: float,
+    graph_engine: str,
+    interface: np.ndarray | None = None,
+) -> list[list[int] | None]:
+    """
+    Shortest paths from one source to each target pixel, None where there is no path.
+
+    A single search is run from the source and all the paths are read from
+    its shortest path tree. The "multiresolution" engine, meant for single
+    paths, runs the "grid" search.
+
+    Raises nx.NodeNotFound if the source is not part of the mortar network.
+    """
+    if not image.flat[source]:
+        raise nx.NodeNotFound("Start node not in graph")
+
+    if graph_engine in ("grid", "multiresolution"):
+        return grid_shortest_path_tree(
+            image,
+            source,
+            targets,
+            interface_weight=interface_weight,
+            interface=interface,
+        )
+
+    if graph_engine == "csr":
+        graph = bwgraph_csr_cached(image, interface_weight=interface_weight)
+        distances, predecessors = dijkstra(
+            graph, directed=False, indices=source, return_predecessors=True
+        )
+        return [
+            _path_from_predecessors(predecessors, t)
+            if np.isfinite(distances[t])
+            else None
+            for t in targets
+        ]
+
+    G = bwgraph_cached(image, interface_weight=interface_weight)
+    if source not in G.nodes:
+        raise nx.NodeNotFound("Start node not in graph")
+    _, paths = nx.single_source_dijkstra(G, source, weight="weight")
+    return [paths.get(t) for t in targets]
+
+
+# Virtual nodes for multi-source searches, pixel indices are never negative
+_SUPER_SOURCE = -1
+_SUPER_SINK = -2
+
+
+def _path_from_predecessors(predecessors: np.ndarray, target: int) -> list[int]:
+    """Walk a scipy predecessor array back from target to its source."""
+    path = [target]
+    while predecessors[path[-1]] >= 0:
+        path.append(int(predecessors[path[-1]]))
+    path.reverse()
+    return path
+
+
+def _boundary_nodes(image: np.ndarray, calculate_LMT: int) -> tuple[list, list]:
+    """
+    Mortar pixels on the two opposite edges crossed by the LMT.
+
+    Horizontal bed joints run from the left to the right edge, vertical
+    joints and wall leaf connections from the top to the bottom edge. The
+    outermost line is used, so the paths cross the whole boundary strip and
+    have the same extent as the ones between user-selected edge points.
+    """
+    if calculate_LMT == 1:
+        first, last = (slice(None), 0), (slice(None), -1)
+    else:
+        first, last = (0, slice(None)), (-1, slice(None))
+
+    nodes = []
+    for edge in (first, last):
+        mask = np.zeros(image.shape, dtype=bool)
+        mask[edge] = image[edge]
+        nodes.append(np.flatnonzero(mask).tolist())
+    return nodes[0], nodes[1]
+
+
 _bwgraph_cache: TTLCache = TTLCache(maxsize=32, ttl=600)  # Cache for 10 minutes
 
 
-@cached(
-    _bwgraph_cache,
-    key=lambda bw, node_weights=None, connectivity=None, interface_weight=1.0: (
-        _array_checksum(bw),
-        _array_checksum(node_weights),
-        connectivity,
-        interface_weight,
-    ),
-)
 def bwgraph_cached(
     bw: np.ndarray,
     node_weights: np.ndarray | None = None,
@@ -242,77 +926,103 @@ def bwgraph_cached(
     interface_weight: float = 1.0,
 ) -> nx.Graph:
     """Cached version of bwgraph function."""
-    return bwgraph(
-        bw,
-        node_weights=node_weights,
-        connectivity=connectivity,
-        interface_weight=interface_weight,
-    )
+    key = array_key(bw, node_weights, connectivity, interface_weight)
+    G = _bwgraph_cache.get(key)
+    record_cache("graph", G is not None)
+    if G is None:
+        G = bwgraph(
+            bw,
+            node_weights=node_weights,
+            connectivity=connectivity,
+            interface_weight=interface_weight,
+        )
+        _bwgraph_cache[key] = G
+    return G
 
 
-def _array_checksum(arr: np.ndarray | None) -> str | None:
-    """Compute SHA256 checksum of a numpy array, or None if arr is None."""
-    if arr is None:
-        return None
-    return hashlib.sha256(arr.tobytes()).hexdigest()
+_bwgraph_csr_cache: TTLCache = TTLCache(maxsize=32, ttl=600)
 
 
-def _find_nearest_mortar(image, point, pixel_height, pixel_length, max_radius=10):
-    """Find the nearest mortar pixel within a given radius."""
-    if image[point[0], point[1]] == 1:
-        return point
+def bwgraph_csr_cached(
+    bw: np.ndarray,
+    node_weights: np.ndarray | None = None,
+    connectivity: int | None = None,
+    interface_weight: float = 1.0,
+) -> csr_matrix:
+    """
+    Cached version of bwgraph_csr function.
 
-    # Find nearest mortar pixel within a small radius
-    for radius in range(1, max_radius + 1):
-        for dy in range(-radius, radius + 1):
-            for dx in range(-radius, radius + 1):
-                new_y = point[0] + dy
-                new_x = point[1] + dx
-                if (
-                    0 <= new_y < pixel_height
-                    and 0 <= new_x < pixel_length
-                    and image[new_y, new_x] == 1
-                ):
-                    return [new_y, new_x]
+    Kept in memory, and on disk in the artifact cache, from where it is
+    reloaded memory mapped.
+    """
+    key = "bwgraph_csr-" + array_key(bw, node_weights, connectivity, interface_weight)
+    graph = _bwgraph_csr_cache.get(key)
+    record_cache("graph", graph is not None)
+    if graph is None:
 
-    return None
+        def create() -> dict[str, np.ndarray]:
+            graph = bwgraph_csr(
+                bw,
+                node_weights=node_weights,
+                connectivity=connectivity,
+                interface_weight=interface_weight,
+            )
+            return {
+                "data": graph.data,
+                "indices": graph.indices,
+                "indptr": graph.indptr,
+            }
 
+        arrays = artifact_cache.get_or_create(key, create)
+        graph = csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=(bw.size, bw.size),
+        )
+        _bwgraph_csr_cache[key] = graph
+    return graph
 
-def _generate_plot(image, pi, pj, start_point, end_point, lmt_type):
-    """Generate plot and return as base64 string."""
-    import matplotlib.pyplot as plt
 
-    try:
-        fig, ax = plt.subplots(figsize=(12, 8))
-        ax.imshow(image, cmap="gray")
-
-        # Plot the shortest path
-        ax.plot(pj, pi, "r-", linewidth=4, label="LMT Path")
-        ax.plot(
-            start_point[1],
-            start_point[0],
-            "go",
-            markersize=10,
-            linewidth=2,
-            label="Start",
-        )
-        ax.plot(
-            end_point[1], end_point[0], "ro", markersize=10, linewidth=2, label="End"
-        )
+_prepared_slice_cache: TTLCache = TTLCache(maxsize=32, ttl=600)
+
 
-        ax.legend()
-        ax.set_title(f"{lmt_type.title()} Line of Minimum Trace")
-        ax.set_xlabel("Pixel X")
-        ax.set_ylabel("Pixel Y")
+def prepare_slice_cached(image: np.ndarray) -> PreparedSlice:
+    """
+    Cached version of prepare_slice function.
 
-        # Convert plot to base64 string
-        buffer = BytesIO()
-        plt.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        buffer.seek(0)
-        plot_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
+    Kept in memory, and on disk in the artifact cache, from where it is
+    reloaded memory mapped.
+    """
+    key = "prepared_slice-" + array_key(image)
+    prepared = _prepared_slice_cache.get(key)
+    record_cache("prepared_slice", prepared is not None)
+    if prepared is None:
+
+        def create() -> dict[str, np.ndarray]:
+            prepared = prepare_slice(image)
+            return {
+                field.name: getattr(prepared, field.name)
+                for field in fields(PreparedSlice)
+                if getattr(prepared, field.name) is not None
+            }
 
-        return plot_base64
+        arrays = artifact_cache.get_or_create(key, create)
+        prepared = PreparedSlice(
+            image=arrays["image"],
+            interface=arrays["interface"],
+            nearest=arrays.get("nearest"),
+            labels=arrays["labels"],
+        )
+        _prepared_slice_cache[key] = prepared
+    return prepared
+
+
+def _generate_plot(image, pi, pj, start_point, end_point):
+    """Generate plot and return as base64 string."""
+    try:
+        png = render_overlay_png(
+            image, np.column_stack((pj, pi)), start_point, end_point
+        )
+        return base64.b64encode(png).decode()
     except Exception:
         return None
 
@@ -0,0 +1,216 @@
+"""
+Coarse-to-fine shortest paths on a pyramid of binary images.
+
+The optimal path of a large slice lives in a thin mortar corridor, but a
+full search visits the whole mortar network. Here, the image is repeatedly
+downsampled, keeping a coarse pixel as mortar if any of its fine pixels is
+mortar, so that no mortar connection is lost. The path is searched on the
+coarsest level, then each finer level is only searched within a band around
+the path of the level above.
+
+The band search is not guaranteed to be optimal: the coarse path may go
+around stones on the other side than the best path, which then leaves the
+band, and the more levels, the more stone structure is lost; with 4 levels,
+synthetic walls of 1000 pixels and more got paths 17% to 26% too costly.
+So the cost of the result is checked against a lower estimate, the optimal
+cost on the first coarse level times factor, and the full image is searched
+when it is more than max_gap above. If the band does not connect the end points,
+it is widened a few times, and the full image is searched as well.
+
+The estimate is not a strict bound, the coarse interface differing from the
+fine one, but it stayed within 2.5% below the optimal cost on the example
+slice and the synthetic walls, where the results are within max_gap of the
+optimal cost.
+"""
+
+from typing import Sequence
+
+import numpy as np
+from scipy import ndimage
+
+from .bwgraph import interface_mask
+from .grid_dijkstra import grid_shortest_path, path_cost
+
+# Coarsest level side, in pixels, below which no further level is built
+_MIN_LEVEL_SIZE = 32
+# Band width factor between the attempts at one level
+_BAND_GROWTH = 4
+
+
+def multiresolution_shortest_path(
+    bw: np.ndarray,
+    sources: Sequence[int],
+    targets: Sequence[int],
+    interface_weight: float = 1.0,
+    factor: int = 2,
+    max_levels: int = 2,
+    band: int = 3,
+    interface: np.ndarray | None = None,
+    max_gap: float = 0.02,
+) -> list[int] | None:
+    """
+    Find a short path from any of the sources to any of the targets.
+
+    Parameters
+    ----------
+    bw, sources, targets, interface_weight, interface
+        See `grid_shortest_path`, only 2D images are supported.
+    factor : int, default=2
+        Downsampling factor between two levels.
+    max_levels : int, default=2
+        Maximum number of levels, including the full resolution one. Above
+        2, the first coarse level is searched in full for the lower estimate
+        of the cost as well.
+    band : int, default=3
+        Half width in pixels of the band searched around the upsampled path
+        at each level.
+    max_gap : float, default=0.02
+        Largest relative excess of the path cost over its lower estimate, see
+        the module docstring, beyond which the full image is searched.
+
+    Returns
+    -------
+    list[int] | None
+        Linear indices of the pixels along the path, from source to target,
+        or None if no target can be reached.
+    """
+    bw = np.asarray(bw, dtype=bool)
+    if bw.ndim != 2:
+        raise ValueError("Input must be 2D array")
+    if interface is None:
+        interface = interface_mask(bw)
+
+    pyramid = [bw]
+    while (
+        len(pyramid) < max_levels
+        and min(pyramid[-1].shape) // factor >= _MIN_LEVEL_SIZE
+    ):
+        pyramid.append(_downsample(pyramid[-1], factor))
+
+    def at_level(indices: Sequence[int], level: int) -> list[int]:
+        coords = np.unravel_index(np.asarray(indices, dtype=np.int64), bw.shape)
+        scale = factor**level
+        return np.unique(
+            np.ravel_multi_index(
+                tuple(c // scale for c in coords), pyramid[level].shape
+            )
+        ).tolist()
+
+    def exact() -> list[int] | None:
+        return grid_shortest_path(
+            bw, sources, targets, interface_weight, interface=interface
+        )
+
+    top = len(pyramid) - 1
+    if top == 0:
+        return exact()
+    path = grid_shortest_path(
+        pyramid[top], at_level(sources, top), at_level(targets, top), interface_weight
+    )
+    if path is None:
+        # Downsampling keeps all connections, there is no path at all
+        return None
+
+    # Lower estimate of the cost, from the optimal path on the first level
+    first = (
+        path
+        if top == 1
+        else grid_shortest_path(
+            pyramid[1], at_level(sources, 1), at_level(targets, 1), interface_weight
+        )
+    )
+    estimate = factor * path_cost(pyramid[1], first, interface_weight)
+
+    for level in range(top - 1, -1, -1):
+        image = pyramid[level]
+        level_interface = interface if level == 0 else interface_mask(image)
+        coarse_path = path
+        # Widen the band when it does not connect the end points, as coarse
+        # pixels may join mortar regions that are only connected further away
+        for width in (band, band * _BAND_GROWTH, band * _BAND_GROWTH**2):
+            corridor = _corridor(
+                coarse_path, pyramid[level + 1].shape, image.shape, factor, width
+            )
+            path = _search_within(
+                image,
+                corridor,
+                at_level(sources, level),
+                at_level(targets, level),
+                interface_weight,
+                level_interface,
+            )
+            if path is not None:
+                break
+        if path is None:
+            return exact()
+
+    if path_cost(bw, path, interface_weight, interface) > (1 + max_gap) * estimate:
+        return exact()
+    return path
+
+
+def _downsample(bw: np.ndarray, factor: int) -> np.ndarray:
+    """Coarse image where a pixel is mortar if any pixel of its block is."""
+    shape = tuple(-(-s // factor) for s in bw.shape)
+    padded = np.zeros(tuple(s * factor for s in shape), dtype=bool)
+    padded[: bw.shape[0], : bw.shape[1]] = bw
+    return padded.reshape(shape[0], factor, shape[1], factor).any(axis=(1, 3))
+
+
+def _corridor(
+    coarse_path: list[int],
+    coarse_shape: tuple[int, ...],
+    shape: tuple[int, ...],
+    factor: int,
+    band: int,
+) -> np.ndarray:
+    """Band around a coarse path, at the resolution of the finer level."""
+    coarse = np.zeros(coarse_shape, dtype=bool)
+    coarse.flat[coarse_path] = True
+    fine = np.repeat(np.repeat(coarse, factor, axis=0), factor, axis=1)
+    fine = fine[: shape[0], : shape[1]]
+    return ndimage.binary_dilation(
+        fine, ndimage.generate_binary_structure(2, 2), iterations=band
+    )
+
+
+def _search_within(
+    image: np.ndarray,
+    corridor: np.ndarray,
+    sources: list[int],
+    targets: list[int],
+    interface_weight: float,
+    interface: np.ndarray,
+) -> list[int] | None:
+    """Search restricted to the bounding box of the corridor."""
+    rows = np.flatnonzero(corridor.any(axis=1))
+    columns = np.flatnonzero(corridor.any(axis=0))
+    box = (
+        slice(rows[0], rows[-1] + 1),
+        slice(columns[0], columns[-1] + 1),
+    )
+    origin = np.array([rows[0], columns[0]])
+    cropped = image[box] & corridor[box]
+
+    def to_box(indices: list[int]) -> list[int]:
+        coords = np.array(np.unravel_index(indices, image.shape)).T - origin
+        inside = np.all((coords >= 0) & (coords < cropped.shape), axis=1)
+        inside[inside] = cropped[tuple(coords[inside].T)]
+        return np.ravel_multi_index(tuple(coords[inside].T), cropped.shape).tolist()
+
+    box_sources, box_targets = to_box(sources), to_box(targets)
+    if not box_sources or not box_targets:
+        return None
+
+    # The interface of the whole image, the corridor walls are not stone
+    path = grid_shortest_path(
+        cropped,
+        box_sources,
+        box_targets,
+        interface_weight,
+        interface=interface[box],
+    )
+    if path is None:
+        return None
+    coords = np.array(np.unravel_index(path, cropped.shape)).T + origin
+    return np.ravel_multi_index(tuple(coords.T), image.shape).tolist()
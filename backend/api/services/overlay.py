@@ -0,0 +1,206 @@
+"""
+Overlays of a line minimum trace path on its binary image.
+
+The path and its end points are drawn straight onto the image at its native
+resolution, as a PNG, or as a compact SVG to be laid over the image by the
+client. Results of POST /compute/line keep what is needed to draw them in
+the artifact cache, the image as packed bits and the path, so that the
+overlay is only rendered when it is looked at, by any server process.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from io import BytesIO
+from uuid import uuid4
+
+import numpy as np
+from api.services.artifact_cache import artifact_cache
+from PIL import Image, ImageDraw
+
+PATH_COLOR = (255, 0, 0)
+START_COLOR = (0, 128, 0)
+END_COLOR = (255, 0, 0)
+
+# Overlay PNG palette: stone, mortar, path, start and end colors
+_PALETTE = ((0, 0, 0), (255, 255, 255), PATH_COLOR, START_COLOR, END_COLOR)
+_RESULT_ID = re.compile(r"[0-9a-f]{32}")
+
+
+@dataclass(frozen=True)
+class LineOverlay:
+    """What is needed to draw the overlay of a line minimum trace result."""
+
+    packed: np.ndarray  # binary image, rows of bits packed with np.packbits
+    width: int
+    height: int
+    pixel_coordinates: np.ndarray  # [x, y] along the path
+    start_point: list[int]  # [row, col]
+    end_point: list[int]  # [row, col]
+
+    @cached_property
+    def image(self) -> np.ndarray:
+        return np.unpackbits(self.packed, axis=1, count=self.width).astype(bool)
+
+
+def store_overlay(
+    image: np.ndarray,
+    pixel_coordinates: np.ndarray,
+    start_point: list[int],
+    end_point: list[int],
+) -> str | None:
+    """
+    Keep an overlay in the artifact cache, returning its result id.
+
+    None when the artifact cache is disabled, overlays are not kept then.
+    """
+    if artifact_cache.path is None:
+        return None
+    result_id = uuid4().hex
+    artifact_cache.put(
+        f"overlay-{result_id}",
+        {
+            "packed": np.packbits(image, axis=1),
+            "shape": np.array(image.shape),
+            "path": np.asarray(pixel_coordinates, dtype=np.int32).reshape(-1, 2),
+            "points": np.array([start_point, end_point]),
+        },
+    )
+    return result_id
+
+
+def get_overlay(result_id: str) -> LineOverlay | None:
+    """Overlay of a result, None if unknown or evicted from the cache."""
+    if _RESULT_ID.fullmatch(result_id) is None:
+        return None
+    arrays = artifact_cache.get(f"overlay-{result_id}")
+    if arrays is None:
+        return None
+    height, width = arrays["shape"].tolist()
+    start_point, end_point = arrays["points"].tolist()
+    return LineOverlay(
+        packed=arrays["packed"],
+        width=width,
+        height=height,
+        pixel_coordinates=arrays["path"],
+        start_point=start_point,
+        end_point=end_point,
+    )
+
+
+def render_stored_overlay(result_id: str) -> bytes | None:
+    """PNG overlay of a stored result, see `render_overlay_png`."""
+    overlay = get_overlay(result_id)
+    if overlay is None:
+        return None
+    return render_overlay_png(
+        overlay.image,
+        overlay.pixel_coordinates,
+        overlay.start_point,
+        overlay.end_point,
+    )
+
+
+def render_overlay_png(
+    image: np.ndarray,
+    pixel_coordinates: np.ndarray | list,
+    start_point: list[int],
+    end_point: list[int],
+) -> bytes:
+    """
+    Draw the path and its end points on a binary image, encoded as PNG.
+
+    The path and the markers are drawn by PIL, so that the cost grows with
+    their size rather than with the image size, on a palette image, a third
+    of the data of an RGB image to encode.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        Binary image, True for mortar, drawn in white, and False for stone.
+    pixel_coordinates : np.ndarray | list
+        [x, y] pixel coordinates of the vertices of the path, which runs
+        straight between them.
+    start_point, end_point : list[int]
+        [row, col] pixel coordinates of the end points, drawn as discs.
+
+    Returns
+    -------
+    bytes
+        Palette PNG image of the same size as the binary image.
+    """
+    canvas = Image.fromarray(np.ascontiguousarray(image, dtype=bool).view(np.uint8))
+    canvas.putpalette([channel for color in _PALETTE for channel in color])
+    drawing = ImageDraw.Draw(canvas)
+
+    points = _polyline(np.asarray(pixel_coordinates, dtype=np.intp).reshape(-1, 2))
+    if len(points) > 1:
+        drawing.line(
+            [tuple(p) for p in points.tolist()],
+            fill=2,
+            width=_line_width(image.shape),
+            joint="curve",
+        )
+
+    radius = _marker_radius(image.shape)
+    for color, (row, col) in enumerate((start_point, end_point), start=3):
+        drawing.ellipse(
+            [col - radius, row - radius, col + radius, row + radius], fill=color
+        )
+
+    buffer = BytesIO()
+    canvas.save(buffer, format="png", compress_level=1)
+    return buffer.getvalue()
+
+
+def render_overlay_svg(
+    width: int,
+    height: int,
+    pixel_coordinates: np.ndarray | list,
+    start_point: list[int],
+    end_point: list[int],
+) -> str:
+    """
+    Draw the path and its end points as an SVG in pixel coordinates.
+
+    The SVG has no background, it is meant to be laid over the image. The
+    path is a single polyline, where runs of steps in the same direction are
+    merged into one segment.
+    """
+    points = _polyline(np.asarray(pixel_coordinates, dtype=np.intp).reshape(-1, 2))
+    shape = (height, width)
+    radius = _marker_radius(shape)
+    polyline = " ".join(f"{x},{y}" for x, y in points.tolist())
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" '
+        f'viewBox="0 0 {width} {height}" width="{width}" height="{height}">'
+        f'<polyline points="{polyline}" fill="none" stroke="{_hex(PATH_COLOR)}" '
+        f'stroke-width="{_line_width(shape)}" stroke-linejoin="round"/>'
+        f'<circle cx="{start_point[1]}" cy="{start_point[0]}" r="{radius}" '
+        f'fill="{_hex(START_COLOR)}"/>'
+        f'<circle cx="{end_point[1]}" cy="{end_point[0]}" r="{radius}" '
+        f'fill="{_hex(END_COLOR)}"/>'
+        "</svg>"
+    )
+
+
+def _polyline(points: np.ndarray) -> np.ndarray:
+    """Keep the first and last points and the points where the path turns."""
+    if len(points) <= 2:
+        return points
+    steps = np.diff(points, axis=0)
+    turns = np.any(steps[1:] != steps[:-1], axis=1)
+    return np.concatenate([points[:1], points[1:-1][turns], points[-1:]])
+
+
+def _line_width(shape: tuple[int, ...]) -> int:
+    """Path width in pixels, visible whatever the image size."""
+    return max(1, min(shape[:2]) // 200)
+
+
+def _marker_radius(shape: tuple[int, ...]) -> int:
+    return max(2, min(shape[:2]) // 80)
+
+
+def _hex(color: tuple[int, int, int]) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*color)
@@ -0,0 +1,187 @@
+"""
+Encodings of the paths returned by the line minimum trace computations.
+
+The "full" encoding lists every pixel of the path twice, as pixel and as
+real-world coordinates, which makes multi-MB JSON for long paths. The other
+encodings are much more compact:
+
+- "chain": the start pixel and one 3-bit direction code per step, packed
+  and base64 encoded, lossless as the path only makes unit steps;
+- "npy": the real-world coordinates as a base64 encoded float32 .npy file;
+- "simplified": the coordinates of the vertices kept by the Ramer-Douglas-
+  Peucker algorithm, with a tolerance in real-world units.
+"""
+
+import base64
+from io import BytesIO
+
+import numpy as np
+
+PATH_ENCODINGS = ("full", "chain", "npy", "simplified")
+
+# Steps [dx, dy] of the chain codes, counterclockwise from the +x direction
+_CHAIN_STEPS = np.array(
+    [[1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1], [0, 1], [1, 1]]
+)
+# Chain code of each step, indexed by [dy + 1, dx + 1]
+_CHAIN_CODES = np.full((3, 3), -1)
+_CHAIN_CODES[_CHAIN_STEPS[:, 1] + 1, _CHAIN_STEPS[:, 0] + 1] = np.arange(8)
+_CHAIN_BITS = np.array([4, 2, 1])
+
+
+def encode_path(
+    pixel_coordinates: np.ndarray,
+    real_world_coordinates: np.ndarray,
+    path_encoding: str = "full",
+    tolerance: float | None = None,
+) -> dict:
+    """
+    Encode a path for a JSON response.
+
+    Parameters
+    ----------
+    pixel_coordinates : np.ndarray
+        Integer [x, y] pixel coordinates along the path, one row per pixel.
+    real_world_coordinates : np.ndarray
+        The same coordinates, scaled to real-world units.
+    path_encoding : str, default="full"
+        One of `PATH_ENCODINGS`.
+    tolerance : float, optional
+        Maximum distance, in real-world units, between the simplified and the
+        full path, for the "simplified" encoding. Default is the size of the
+        largest pixel side.
+
+    Returns
+    -------
+    dict
+        Coordinate lists, pixel_coordinates and real_world_coordinates, for
+        the "full" and "simplified" encodings, a chain code for "chain" and a
+        .npy file for "npy", along with the encoding name.
+    """
+    if path_encoding == "full":
+        return {
+            "pixel_coordinates": pixel_coordinates.tolist(),
+            "real_world_coordinates": real_world_coordinates.tolist(),
+        }
+    if path_encoding == "chain":
+        return {"encoding": "chain", **chain_encode(pixel_coordinates)}
+    if path_encoding == "npy":
+        buffer = BytesIO()
+        np.save(buffer, real_world_coordinates.astype(np.float32))
+        return {
+            "encoding": "npy",
+            "real_world_coordinates": base64.b64encode(buffer.getvalue()).decode(),
+        }
+    if path_encoding == "simplified":
+        if tolerance is None:
+            steps = np.abs(np.diff(real_world_coordinates, axis=0))
+            tolerance = float(steps.max()) if len(steps) else 0.0
+        keep = simplify(real_world_coordinates, tolerance)
+        return {
+            "encoding": "simplified",
+            "tolerance": tolerance,
+            "pixel_coordinates": pixel_coordinates[keep].tolist(),
+            "real_world_coordinates": real_world_coordinates[keep].tolist(),
+        }
+    raise ValueError(f"Unknown path encoding '{path_encoding}'")
+
+
+def decode_path(path_coordinates: dict, scale_factors: dict) -> np.ndarray:
+    """
+    Pixel coordinates of the vertices of an encoded path.
+
+    Consecutive vertices are neighbors, except for the "simplified" encoding
+    where the path runs straight between them.
+
+    Parameters
+    ----------
+    path_coordinates : dict
+        Path encoded by `encode_path`.
+    scale_factors : dict
+        length_scale and height_scale of the result, to convert real-world
+        coordinates back to pixels.
+
+    Returns
+    -------
+    np.ndarray
+        Integer [x, y] pixel coordinates, one row per vertex.
+    """
+    encoding = path_coordinates.get("encoding", "full")
+    if encoding == "chain":
+        return chain_decode(
+            path_coordinates["start"],
+            path_coordinates["codes"],
+            path_coordinates["length"],
+        )
+    if encoding == "npy":
+        buffer = BytesIO(base64.b64decode(path_coordinates["real_world_coordinates"]))
+        scale = np.array([scale_factors["length_scale"], scale_factors["height_scale"]])
+        return np.rint(np.load(buffer) / scale).astype(np.int64)
+    return np.array(path_coordinates["pixel_coordinates"], dtype=np.int64).reshape(
+        -1, 2
+    )
+
+
+def chain_encode(pixel_coordinates: np.ndarray) -> dict:
+    """Freeman chain code of a path of unit steps, with 3 bits per step."""
+    steps = np.diff(pixel_coordinates, axis=0)
+    if np.any(np.abs(steps) > 1):
+        raise ValueError("Chain code requires unit steps between pixels")
+    codes = _CHAIN_CODES[steps[:, 1] + 1, steps[:, 0] + 1]
+    if np.any(codes < 0):
+        raise ValueError("Chain code requires distinct consecutive pixels")
+    bits = (codes[:, None] & _CHAIN_BITS) > 0
+    return {
+        "start": pixel_coordinates[0].tolist(),
+        "length": len(pixel_coordinates),
+        "codes": base64.b64encode(np.packbits(bits.ravel()).tobytes()).decode(),
+    }
+
+
+def chain_decode(start: list[int], codes: str, length: int) -> np.ndarray:
+    """Pixel coordinates of a path from its chain code, see `chain_encode`."""
+    packed = np.frombuffer(base64.b64decode(codes), dtype=np.uint8)
+    bits = np.unpackbits(packed)[: 3 * (length - 1)].reshape(-1, 3)
+    steps = _CHAIN_STEPS[bits @ _CHAIN_BITS]
+    coordinates = np.empty((length, 2), dtype=np.int64)
+    coordinates[0] = start
+    np.cumsum(steps, axis=0, out=coordinates[1:])
+    coordinates[1:] += coordinates[0]
+    return coordinates
+
+
+def simplify(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Ramer-Douglas-Peucker simplification of a polyline.
+
+    Returns a boolean mask of the points kept, the first and last included.
+    The distances of the points of a section to its chord are computed at
+    once, the sections are split until they are all within tolerance.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[[0, -1]] = True
+
+    sections = [(0, n - 1)]
+    while sections:
+        first, last = sections.pop()
+        if last - first < 2:
+            continue
+        chord = points[last] - points[first]
+        offsets = points[first + 1 : last] - points[first]
+        chord_length = np.hypot(*chord)
+        if chord_length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            cross = chord[0] * offsets[:, 1] - chord[1] * offsets[:, 0]
+            distances = np.abs(cross) / chord_length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            sections.append((first, split))
+            sections.append((split, last))
+    return keep
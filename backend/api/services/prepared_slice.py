@@ -0,0 +1,92 @@
+"""
+Per-image precomputations shared by all the LMT queries on one slice.
+
+Everything that only depends on the binary image (with its boundary
+conditions applied) is computed once with `scipy.ndimage` and stored in a
+`PreparedSlice`:
+
+- the mortar pixels at the stone-mortar interface, found by erosion;
+- the nearest mortar pixel of every pixel, from the Euclidean distance
+  transform, so that snapping a point to the mortar is a single lookup;
+- the connected components of the mortar network, with the same
+  connectivity as `bwgraph`, so that two points with no path between them
+  can be rejected before any shortest path search.
+"""
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+from scipy import ndimage
+
+
+@dataclass(frozen=True)
+class PreparedSlice:
+    """
+    Precomputed arrays of a binary image.
+
+    Attributes
+    ----------
+    image : np.ndarray
+        Binary image, True for mortar.
+    interface : np.ndarray
+        True for the mortar pixels with a stone face neighbor.
+    nearest : np.ndarray | None
+        Coordinates of the nearest mortar pixel of each pixel, of shape
+        (ndim, *image.shape), or None if there is no mortar at all.
+    labels : np.ndarray
+        Connected component of each mortar pixel, 0 for stone.
+    """
+
+    image: np.ndarray
+    interface: np.ndarray
+    nearest: np.ndarray | None
+    labels: np.ndarray
+
+    def snap(self, point: Sequence[int]) -> list[int] | None:
+        """Nearest mortar pixel of the pixel at point, None without mortar."""
+        if self.nearest is None:
+            return None
+        return [int(c) for c in self.nearest[(slice(None), *point)]]
+
+    def connected(self, a: int, b: int) -> bool:
+        """Whether a path exists between two pixels, given as linear indices."""
+        label = self.labels.flat[a]
+        return bool(label) and label == self.labels.flat[b]
+
+    def reachable(self, sources: list[int], targets: list[int]) -> tuple[list, list]:
+        """Keep only the sources and targets in components containing both."""
+        common = np.intersect1d(self.labels.flat[sources], self.labels.flat[targets])
+        common = common[common > 0]
+        return (
+            np.asarray(sources)[np.isin(self.labels.flat[sources], common)].tolist(),
+            np.asarray(targets)[np.isin(self.labels.flat[targets], common)].tolist(),
+        )
+
+
+def prepare_slice(image: np.ndarray) -> PreparedSlice:
+    """
+    Run the per-image precomputations on a binary image.
+
+    The arrays of the result are read-only, so that it can be safely shared
+    between queries.
+    """
+    image = np.array(image, dtype=bool)
+    face = ndimage.generate_binary_structure(image.ndim, 1)
+    full = ndimage.generate_binary_structure(image.ndim, image.ndim)
+
+    # Outside of the image is not stone, as in `interface_mask`
+    interface = image & ~ndimage.binary_erosion(image, face, border_value=1)
+
+    nearest = None
+    if image.any():
+        nearest = ndimage.distance_transform_edt(
+            ~image, return_distances=False, return_indices=True
+        )
+
+    labels, _ = ndimage.label(image, full)
+
+    for arr in (image, interface, nearest, labels):
+        if arr is not None:
+            arr.setflags(write=False)
+    return PreparedSlice(image, interface, nearest, labels)
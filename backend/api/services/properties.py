@@ -1,35 +1,55 @@
+import asyncio
+import re
 from io import StringIO
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from api.config import config
-from api.models.properties import Column, Table
+from api.models.properties import Column, PropertyQueryResult, Table
+from api.services.property_store import (
+    PropertyColumn,
+    PropertyStore,
+    load_property_store,
+)
 from api.views.files import get_local_file_content
+from cachetools import LRUCache
 from fastapi import HTTPException
 
+# Operator and value of a filter "<column><operator><value>", such as
+# "Height [cm]>=100", after the column name
+_FILTER = re.compile(r"(?P<operator>==|!=|<=|>=|<|>)(?P<value>.*)")
+
 
 class Properties:
     def __init__(self) -> None:
-        self._data: pd.DataFrame | None = None
+        self._store: PropertyStore | None = None
+        # Concurrent first requests wait for a single load of the store
+        self._store_lock = asyncio.Lock()
+        # Filtered numeric columns, by column and set of categories
+        self._column_values: LRUCache[tuple[str, frozenset[str]], np.ndarray] = (
+            LRUCache(maxsize=256)
+        )
         self._stone_data: dict[str, pd.DataFrame] = {}
         self._properties: Table | None = None
-        self._property_columns: dict[str, list[str]] = {}
         self._stone_properties: dict[str, Table] = {}
 
-    async def get_data(self) -> pd.DataFrame:
-        if self._data is not None:
-            return self._data
-
-        properties_full_path = Path(config.DATA_PATH) / config.PROPERTIES_PATH
-        body, _ = get_local_file_content(properties_full_path)
-        if body is None:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Properties file not found at {properties_full_path}",
-            )
-        data = pd.read_csv(StringIO(body.decode("utf-8")))
-        self._data = data
-        return data
+    async def get_store(self) -> PropertyStore:
+        """The properties table, loaded once, see `load_property_store`."""
+        if self._store is not None:
+            return self._store
+
+        async with self._store_lock:
+            if self._store is None:
+                properties_full_path = Path(config.DATA_PATH) / config.PROPERTIES_PATH
+                body, _ = get_local_file_content(properties_full_path)
+                if body is None:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"Properties file not found at {properties_full_path}",
+                    )
+                self._store = await asyncio.to_thread(load_property_store, body)
+        return self._store
 
     async def get_stone_data(self, wall_id: str) -> pd.DataFrame:
         if wall_id in self._stone_data:
@@ -53,40 +73,141 @@ class Properties:
         if self._properties is not None:
             return self._properties
 
-        data = await self.get_data()
-        columns = []
-
-        for col in data.columns:
-            column = Column(
-                name=str(col).strip(), values=data[col].astype(str).tolist()
-            )
-            columns.append(column)
+        store = await self.get_store()
+        columns = [
+            Column(name=name.strip(), values=column.strings())
+            for name, column in store.columns.items()
+        ]
 
         self._properties = columns
         return columns
 
     async def get_property_column_values(
         self, column_name: str, allowed_categories: list[str] = []
-    ) -> list[str]:
-        if column_name in self._property_columns:
-            return self._property_columns[column_name]
+    ) -> np.ndarray:
+        """
+        Numeric values of a column, in the allowed categories if any.
+
+        Returns a float64 array, NaN where missing or not a number, instead of
+        the list of cell strings. It is shared by the requests, read-only.
+        """
+        store = await self.get_store()
+        values = self._check_column(store, column_name).numeric
+        if len(allowed_categories) == 0:
+            return values
+
+        key = (column_name, frozenset(allowed_categories))
+        filtered = self._column_values.get(key)
+        if filtered is None:
+            filtered = values[store.rows_in_categories(allowed_categories)]
+            # Shared by the requests
+            filtered.setflags(write=False)
+            self._column_values[key] = filtered
+        return filtered
+
+    async def query_property_entries(
+        self,
+        columns: list[str] = [],
+        filters: list[str] = [],
+        allowed_categories: list[str] = [],
+        sort: list[str] = [],
+        offset: int = 0,
+        limit: int | None = None,
+    ) -> PropertyQueryResult:
+        """
+        Rows of the properties table matching all the filters, sorted.
+
+        Parameters
+        ----------
+        columns : list[str]
+            Columns to return, all of them by default.
+        filters : list[str]
+            Filters as "<column><operator><value>", see
+            `PropertyColumn.compare` for the operators.
+        allowed_categories : list[str]
+            Categories of the rows to return, all of them by default.
+        sort : list[str]
+            Columns to sort by, the first one first, descending when
+            prefixed with "-". The rows are in table order by default and
+            between equal keys.
+        offset : int
+            Number of matching rows to skip.
+        limit : int, optional
+            Largest number of rows to return, default is all of them.
+        """
+        store = await self.get_store()
+        for name in [*columns, *(key.removeprefix("-") for key in sort)]:
+            self._check_column(store, name)
+
+        mask = np.ones(store.rows, dtype=bool)
+        for query in filters:
+            name, match = self._parse_filter(store, query)
+            column = store[name]
+            try:
+                mask &= column.compare(match["operator"], match["value"])
+            except ValueError:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid filter '{query}', "
+                    f"'{match['value']}' is not a number",
+                )
+        if len(allowed_categories) > 0:
+            in_categories = np.zeros(store.rows, dtype=bool)
+            in_categories[store.rows_in_categories(allowed_categories)] = True
+            mask &= in_categories
+
+        rows = np.flatnonzero(mask)
+        if sort:
+            keys = [
+                key
+                for name in reversed(sort)
+                for key in store[name.removeprefix("-")].sort_keys(
+                    descending=name.startswith("-")
+                )
+            ]
+            rows = rows[np.lexsort([key[rows] for key in keys])]
+        total = len(rows)
+        rows = rows[offset : None if limit is None else offset + limit]
+
+        return PropertyQueryResult(
+            total=total,
+            offset=offset,
+            rows=rows.tolist(),
+            columns=[
+                Column(name=name.strip(), values=store[name].strings(rows))
+                for name in (columns or store.columns)
+            ],
+        )
 
-        data = await self.get_data()
+    @staticmethod
+    def _parse_filter(store: PropertyStore, query: str) -> tuple[str, re.Match]:
+        """
+        Column name of a filter, and the match of its operator and value.
+
+        Column names may contain operator characters, such as "(l<20 cm)",
+        so the known names are tried first, the longest first.
+        """
+        for name in sorted(store.columns, key=len, reverse=True):
+            if query.startswith(name):
+                match = _FILTER.fullmatch(query, len(name))
+                if match is not None:
+                    return name, match
+        match = _FILTER.search(query)
+        if match is None or match.start() == 0:
+            raise HTTPException(status_code=400, detail=f"Invalid filter '{query}'")
+        raise HTTPException(
+            status_code=404,
+            detail=f"Column '{query[: match.start()]}' not found in properties table.",
+        )
 
-        if column_name not in data.columns:
+    @staticmethod
+    def _check_column(store: PropertyStore, name: str) -> PropertyColumn:
+        if name not in store:
             raise HTTPException(
                 status_code=404,
-                detail=f"Column '{column_name}' not found in properties table.",
+                detail=f"Column '{name}' not found in properties table.",
             )
-
-        # Category is the first 2 characters of "Wall ID"
-        filtered = (
-            data[data["Wall ID"].str[:2].isin(allowed_categories)]
-            if len(allowed_categories) > 0
-            else data
-        )
-        values = filtered[column_name].tolist()
-        return values
+        return store[name]
 
     async def get_stones_property_entries(self, wall_id: str) -> Table:
         if wall_id in self._stone_properties:
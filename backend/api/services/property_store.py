@@ -0,0 +1,240 @@
+"""
+Typed columnar store of the properties table.
+
+The CSV file is parsed once into one `PropertyColumn` per column: numeric
+values as a float64 array, NaN where missing or not a number, and for text
+columns the values dictionary-encoded as codes into their distinct strings.
+Columns of mixed numbers and text, such as "-" for missing values, are both.
+
+The arrays are kept in the artifact cache, keyed by the hash of the CSV
+content, and reloaded memory mapped, so that restarts and the other server
+processes do not parse the file again.
+"""
+
+import hashlib
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Literal
+
+import numpy as np
+import pandas as pd
+
+from .artifact_cache import artifact_cache
+
+ColumnKind = Literal["int", "float", "text"]
+_KINDS: tuple[ColumnKind, ...] = ("int", "float", "text")
+
+_OPERATORS: dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    "==": np.equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+
+# Column of the wall identifiers, their first 2 characters are the category
+WALL_ID_COLUMN = "Wall ID"
+
+
+@dataclass(frozen=True)
+class PropertyColumn:
+    """
+    Values of one column of the properties table.
+
+    Attributes
+    ----------
+    name : str
+        Column name, as in the CSV header.
+    kind : str
+        "int" or "float" for numeric columns, "text" otherwise.
+    numeric : np.ndarray
+        Values as float64, NaN where missing or not a number.
+    codes : np.ndarray | None
+        For text columns, index of each value in categories, -1 if missing.
+    categories : np.ndarray | None
+        For text columns, the distinct values, sorted.
+    """
+
+    name: str
+    kind: ColumnKind
+    numeric: np.ndarray
+    codes: np.ndarray | None = None
+    categories: np.ndarray | None = None
+
+    @property
+    def is_numeric(self) -> bool:
+        """Numeric column, or text column of mostly numbers."""
+        if self.kind != "text":
+            return True
+        return np.count_nonzero(np.isfinite(self.numeric)) > len(self.numeric) / 2
+
+    def strings(self, rows: np.ndarray | None = None) -> list[str]:
+        """
+        Values as strings, "nan" where missing, as pandas prints them.
+
+        Only the given rows, in their order, if any.
+        """
+        if self.kind == "text":
+            labels = np.append(self.categories.astype(object), "nan")
+            codes = self.codes if rows is None else self.codes[rows]
+            return labels[codes].tolist()
+        numeric = self.numeric if rows is None else self.numeric[rows]
+        if self.kind == "int":
+            return [str(v) for v in numeric.astype(np.int64).tolist()]
+        return [str(v) for v in numeric.tolist()]
+
+    def compare(self, operator: str, value: str) -> np.ndarray:
+        """
+        Mask of the rows whose value compares to the given one.
+
+        Operators are "==", "!=", "<", "<=", ">" and ">=". Text columns are
+        compared as strings for equality, numbers otherwise, missing values
+        never matching a number.
+        """
+        if operator in ("==", "!=") and self.kind == "text":
+            index = np.searchsorted(self.categories, value)
+            if index < len(self.categories) and self.categories[index] == value:
+                mask = self.codes == index
+            else:
+                mask = np.zeros(len(self.codes), dtype=bool)
+            return mask if operator == "==" else ~mask
+        number = float(value)
+        if operator == "!=":
+            # Not NaN != number, as missing values are not numbers
+            return ~(self.numeric == number)
+        return _OPERATORS[operator](self.numeric, number)
+
+    def sort_keys(self, descending: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Keys to sort the rows by this column, the last one first, see
+        `np.lexsort`: its values then whether they are missing.
+
+        Numeric columns, including text columns of mostly numbers, sort by
+        number, others by string. Missing values are last either way.
+        """
+        if self.is_numeric:
+            missing = np.isnan(self.numeric)
+            values = np.where(missing, 0.0, self.numeric)
+        else:
+            missing = self.codes < 0
+            values = self.codes
+        return (-values if descending else values), missing
+
+
+class PropertyStore:
+    def __init__(self, columns: list[PropertyColumn], version: str = "") -> None:
+        self.columns = {column.name: column for column in columns}
+        # Hash of the CSV content, to key the results computed from it
+        self.version = version
+        self.rows = len(columns[0].numeric) if columns else 0
+        # Rows of each category, in table order
+        self.category_rows: dict[str, np.ndarray] = {}
+        if WALL_ID_COLUMN in self.columns:
+            self.category_rows = _category_rows(self.columns[WALL_ID_COLUMN])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __getitem__(self, name: str) -> PropertyColumn:
+        return self.columns[name]
+
+    def numeric_columns(self) -> list[str]:
+        """Names of the numeric columns, see `PropertyColumn.is_numeric`."""
+        return [name for name, column in self.columns.items() if column.is_numeric]
+
+    def rows_in_categories(self, categories: Iterable[str]) -> np.ndarray:
+        """Indices of the rows of any of the categories, in table order."""
+        rows = [
+            self.category_rows[c] for c in set(categories) if c in self.category_rows
+        ]
+        if not rows:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(rows))
+
+
+def _category_rows(wall_ids: PropertyColumn) -> dict[str, np.ndarray]:
+    """Rows of each category, grouped with one sort of the category codes."""
+    if wall_ids.kind != "text":
+        return {}
+    prefixes, prefix_codes = np.unique(
+        wall_ids.categories.astype("<U2"), return_inverse=True
+    )
+    # Missing identifiers, code -1, are after every category
+    row_codes = np.append(prefix_codes, len(prefixes))[wall_ids.codes]
+    order = np.argsort(row_codes, kind="stable")
+    bounds = np.searchsorted(row_codes[order], np.arange(len(prefixes) + 1))
+    return {
+        str(prefix): order[start:end]
+        for prefix, start, end in zip(prefixes, bounds[:-1], bounds[1:])
+    }
+
+
+def build_property_store(content: bytes) -> PropertyStore:
+    """Parse a CSV file content into a `PropertyStore`."""
+    data = pd.read_csv(BytesIO(content))
+    columns = []
+    for name in data.columns:
+        series = data[name]
+        if pd.api.types.is_integer_dtype(series):
+            kind: ColumnKind = "int"
+        elif pd.api.types.is_numeric_dtype(series):
+            kind = "float"
+        else:
+            kind = "text"
+        numeric = pd.to_numeric(series, errors="coerce").to_numpy(np.float64)
+        codes = categories = None
+        if kind == "text":
+            codes, uniques = pd.factorize(series, sort=True)
+            codes = codes.astype(np.int32)
+            categories = np.asarray(uniques, dtype=str)
+        columns.append(PropertyColumn(str(name), kind, numeric, codes, categories))
+    return PropertyStore(columns, version=_content_version(content))
+
+
+def load_property_store(content: bytes) -> PropertyStore:
+    """
+    `PropertyStore` of a CSV file content, from its snapshot if there is one.
+
+    The snapshot is created on the first load of a given content.
+    """
+    version = _content_version(content)
+    arrays = artifact_cache.get_or_create(
+        "properties-" + version, lambda: _to_arrays(build_property_store(content))
+    )
+    return _from_arrays(arrays, version)
+
+
+def _content_version(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _to_arrays(store: PropertyStore) -> dict[str, np.ndarray]:
+    """Arrays of a store, without objects, to save them as .npy files."""
+    columns = list(store.columns.values())
+    arrays = {
+        "names": np.array([c.name for c in columns], dtype=str),
+        "kinds": np.array([_KINDS.index(c.kind) for c in columns], dtype=np.int8),
+    }
+    for i, column in enumerate(columns):
+        arrays[f"numeric_{i}"] = column.numeric
+        if column.kind == "text":
+            arrays[f"codes_{i}"] = column.codes
+            arrays[f"categories_{i}"] = column.categories
+    return arrays
+
+
+def _from_arrays(arrays: dict[str, np.ndarray], version: str) -> PropertyStore:
+    return PropertyStore(
+        [
+            PropertyColumn(
+                name=str(name),
+                kind=_KINDS[kind],
+                numeric=arrays[f"numeric_{i}"],
+                codes=arrays.get(f"codes_{i}"),
+                categories=arrays.get(f"categories_{i}"),
+            )
+            for i, (name, kind) in enumerate(zip(arrays["names"], arrays["kinds"]))
+        ],
+        version=version,
+    )
@@ -0,0 +1,184 @@
+"""
+Per-stage timings of the compute requests.
+
+Computations mark their stages with `timed`, as a context manager or a
+decorator, and their cache lookups with `record_cache`. Both only record
+within `collect_timings`, the rest of the time they cost a context variable
+lookup. A stage nested in another one is only counted in its own duration,
+so that the durations of a request add up.
+
+Stages running in the process pool are collected there by `timed_call` and
+returned along with the result, to be added to the request ones with
+`add_timings`. The views send the timings as a
+`Server-Timing` header and aggregate them in `timing_metrics`.
+"""
+
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class StageTimings:
+    """Durations of the stages of one computation, and its cache hits."""
+
+    def __init__(self) -> None:
+        self.stages: dict[str, float] = {}
+        self.cache: dict[str, bool] = {}
+        # Durations of the stages nested in each running stage
+        self._nested: list[float] = []
+
+    def add(self, timings: dict[str, dict]) -> None:
+        """
+        Add timings returned by `timed_call`, typically from the process pool,
+        as stages nested in the running stage.
+        """
+        for name, duration in timings["stages"].items():
+            self.stages[name] = self.stages.get(name, 0.0) + duration
+        if self._nested:
+            self._nested[-1] += sum(timings["stages"].values())
+        for name, hit in timings["cache"].items():
+            self.cache[name] = self.cache.get(name, True) and hit
+
+    def as_dict(self) -> dict[str, dict]:
+        """Stage durations in seconds and cache hit flags."""
+        return {"stages": dict(self.stages), "cache": dict(self.cache)}
+
+
+_current: ContextVar[StageTimings | None] = ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[StageTimings]:
+    """Collect the stage timings of the code run within."""
+    timings = StageTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Time a stage, adding up its durations if run several times."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings._nested.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = timings._nested.pop()
+        # Nested stages run in parallel in the pool may add up to more
+        own = max(0.0, elapsed - nested)
+        timings.stages[name] = timings.stages.get(name, 0.0) + own
+        if timings._nested:
+            timings._nested[-1] += elapsed
+
+
+def record_cache(name: str, hit: bool) -> None:
+    """Record a cache lookup, a hit only if every lookup of this cache hit."""
+    timings = _current.get()
+    if timings is not None:
+        timings.cache[name] = timings.cache.get(name, True) and hit
+
+
+def timed_call(
+    fn: Callable[..., T], /, *args: Any, **kwargs: Any
+) -> tuple[T, dict[str, dict]]:
+    """Call fn, returning its result and its timings, see `StageTimings`."""
+    with collect_timings() as timings:
+        result = fn(*args, **kwargs)
+    return result, timings.as_dict()
+
+
+def add_timings(timings: dict[str, dict]) -> None:
+    """Add timings to the ones being collected, see `StageTimings.add`."""
+    current = _current.get()
+    if current is not None:
+        current.add(timings)
+
+
+def server_timing(timings: dict[str, dict], total: float | None = None) -> str:
+    """
+    Format timings as a `Server-Timing` header value.
+
+    Stages are metrics with their duration in milliseconds, caches are
+    metrics named "cache-<name>" described as "hit" or "miss".
+    """
+    metrics = [
+        f"{name};dur={duration * 1000:.1f}"
+        for name, duration in timings["stages"].items()
+    ]
+    metrics += [
+        f'cache-{name};desc="{"hit" if hit else "miss"}"'
+        for name, hit in timings["cache"].items()
+    ]
+    if total is not None:
+        metrics.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metrics)
+
+
+class TimingMetrics:
+    """Aggregated timings of the requests of each endpoint, in this process."""
+
+    def __init__(self) -> None:
+        self._endpoints: dict[str, dict] = {}
+
+    def record(self, endpoint: str, timings: dict[str, dict], total: float) -> None:
+        metrics = self._endpoints.setdefault(
+            endpoint, {"requests": 0, "total": _new_stage(), "stages": {}, "cache": {}}
+        )
+        metrics["requests"] += 1
+        _add_duration(metrics["total"], total)
+        for name, duration in timings["stages"].items():
+            _add_duration(metrics["stages"].setdefault(name, _new_stage()), duration)
+        for name, hit in timings["cache"].items():
+            counts = metrics["cache"].setdefault(name, {"hits": 0, "misses": 0})
+            counts["hits" if hit else "misses"] += 1
+
+    def snapshot(self) -> dict[str, dict]:
+        """
+        Request count and, for the whole requests and each stage, the count,
+        total, mean and maximum durations in seconds, with the cache hit and
+        miss counts, per endpoint.
+        """
+        return {
+            endpoint: {
+                "requests": metrics["requests"],
+                "total": _stage_summary(metrics["total"]),
+                "stages": {
+                    name: _stage_summary(stage)
+                    for name, stage in metrics["stages"].items()
+                },
+                "cache": {name: dict(c) for name, c in metrics["cache"].items()},
+            }
+            for endpoint, metrics in self._endpoints.items()
+        }
+
+    def clear(self) -> None:
+        self._endpoints.clear()
+
+
+def _new_stage() -> dict[str, float]:
+    return {"count": 0, "total": 0.0, "max": 0.0}
+
+
+def _add_duration(stage: dict[str, float], duration: float) -> None:
+    stage["count"] += 1
+    stage["total"] += duration
+    stage["max"] = max(stage["max"], duration)
+
+
+def _stage_summary(stage: dict[str, float]) -> dict[str, float]:
+    return {**stage, "mean": stage["total"] / stage["count"]}
+
+
+timing_metrics = TimingMetrics()
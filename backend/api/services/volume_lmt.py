@@ -0,0 +1,679 @@
+"""
+Line of Minimum Trace through a voxelized wall.
+
+The wall is a binary volume of shape (slices, rows, columns), each slice
+being a binary image as used by `calculate_line_minimum_trace`. It is read
+either from a `.npy` file, memory mapped, or from a directory of slice
+images, and never loaded whole: it is split into cubic chunks, read on
+demand while the search progresses.
+
+The chunks and their search state live in a fixed number of slots, sized
+by the memory budget. When the search reaches a chunk while every slot is
+taken, the least recently used chunk, typically one whose voxels are all
+settled, is spilled to a scratch directory and reloaded from there if the
+search or the path walk comes back to it. The memory use is bounded
+whatever the size of the volume.
+
+The edge costs are the ones of `bwgraph` with the maximum (26) connectivity,
+and the search is an A* guided by the straight line distance to the end
+point, so only the chunks around the path are ever loaded. When numba is
+installed, the search runs in a compiled kernel, which returns to Python
+only to swap chunks, the same code run as Python being the fallback.
+"""
+
+import os
+import tempfile
+from collections import OrderedDict
+from itertools import product
+from math import prod
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from api.config import config
+from PIL import Image
+from scipy import ndimage
+
+from .bwgraph import interface_mask
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+IMAGE_SUFFIXES = (".png", ".tif", ".tiff", ".bmp", ".jpg", ".jpeg")
+
+# Bytes of loaded data and search state per voxel, see `ChunkedVolume`
+_BYTES_PER_VOXEL = 12
+# Chunks a search step may need at once, around a corner of a chunk
+_MIN_CHUNKS = 8
+# Share of the memory budget for the decoded slices of a `SliceStack`
+_SLICE_CACHE_SHARE = 0.25
+
+# Steps to the 26 neighbors, and their lengths
+_OFFSETS = np.array([o for o in product([-1, 0, 1], repeat=3) if any(o)])
+_LENGTHS = np.sqrt((_OFFSETS**2).sum(axis=1))
+
+# Arrays of a chunk slot saved when it is spilled
+_SPILLED = ("mortar", "interface", "distances", "predecessors", "settled")
+
+# Outcomes of a run of the search kernel, see `_astar`
+_REACHED, _NO_PATH, _NEED_CHUNK, _HEAP_FULL = range(4)
+
+
+class VolumeBudgetError(Exception):
+    pass
+
+
+def calculate_line_minimum_trace_3d(
+    volume_path: str,
+    start_coords: list,
+    end_coords: list,
+    real_length: float = 149.0,
+    real_height: float = 140.0,
+    real_thickness: float = 50.0,
+    calculate_LMT: int = 2,
+    interface_weight: float = 1.0,
+    boundary_margin: int = 5,
+    memory_budget: int = config.VOLUME_MEMORY_BUDGET,
+    chunk_size: int = config.VOLUME_CHUNK_SIZE,
+) -> dict:
+    """
+    Calculate the Line of Minimum Trace between two voxels of a wall volume.
+
+    Parameters
+    ----------
+    volume_path : str
+        Path to a `.npy` binary volume, non-zero for mortar, or to a
+        directory of binary slice images, sorted by name
+    start_coords : list
+        [x, y, z] coordinates for start point, z being the slice
+    end_coords : list
+        [x, y, z] coordinates for end point
+    real_length, real_height : float
+        Real-world length and height of the slices
+    real_thickness : float
+        Real-world thickness of the wall, across the slices
+    calculate_LMT, interface_weight, boundary_margin
+        See `calculate_line_minimum_trace`, the boundary conditions are
+        applied to every slice
+    memory_budget : int
+        Size in bytes of the decoded slices and chunks kept in memory during
+        the search, chunks beyond it being spilled to disk
+    chunk_size : int
+        Size of the side of the cubic chunks, in voxels
+
+    Returns
+    -------
+    dict
+        Results containing LMT values and path coordinates as [x, y, z]
+    """
+    try:
+        if not os.path.exists(volume_path):
+            return {
+                "error": f"Volume not found at {volume_path}",
+                "success": False,
+            }
+
+        slice_cache = int(memory_budget * _SLICE_CACHE_SHARE)
+        try:
+            volume = ChunkedVolume(
+                load_volume(volume_path, cache_bytes=slice_cache),
+                calculate_LMT=calculate_LMT,
+                boundary_margin=boundary_margin,
+                chunk_size=chunk_size,
+                memory_budget=memory_budget - slice_cache,
+            )
+        except VolumeBudgetError as e:
+            return {"error": str(e), "success": False}
+
+        start_point = volume.snap(_clip(start_coords[::-1], volume.shape))
+        end_point = volume.snap(_clip(end_coords[::-1], volume.shape))
+        if start_point is None:
+            return {"error": "No mortar found near start point", "success": False}
+        if end_point is None:
+            return {"error": "No mortar found near end point", "success": False}
+
+        path = volume.shortest_path(start_point, end_point, interface_weight)
+        if path is None:
+            return {"error": "No path found between selected points", "success": False}
+
+        # Voxel sizes along (slices, rows, columns)
+        scale = np.array(
+            [
+                real_thickness / volume.shape[0],
+                real_height / volume.shape[1],
+                real_length / volume.shape[2],
+            ]
+        )
+        voxels = np.array(path)
+        real_world = voxels * scale
+        total_length = float(
+            np.sum(np.sqrt(np.sum(np.diff(real_world, axis=0) ** 2, axis=1)))
+        )
+
+        if calculate_LMT == 0:
+            LMT_type = "vertical"
+            LMT_result = total_length / real_height
+        elif calculate_LMT == 1:
+            LMT_type = "horizontal"
+            LMT_result = total_length / real_length
+        else:
+            LMT_type = "wall_leaf_connection"
+            LMT_result = total_length / real_height
+
+        return {
+            "success": True,
+            "lmt_type": LMT_type,
+            "lmt_result": float(max(LMT_result, 1.0)),
+            "total_length": total_length,
+            "path_coordinates": {
+                "voxel_coordinates": voxels[:, ::-1].tolist(),
+                "real_world_coordinates": real_world[:, ::-1].tolist(),
+            },
+            "start_point_used": start_point[::-1],
+            "end_point_used": end_point[::-1],
+            "volume_dimensions": {
+                "width": volume.shape[2],
+                "height": volume.shape[1],
+                "depth": volume.shape[0],
+            },
+            "chunks_loaded": volume.chunks_loaded,
+            "chunks_spilled": volume.chunks_spilled,
+        }
+
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}", "success": False}
+
+
+def load_volume(
+    volume_path: str, cache_bytes: int = config.VOLUME_MEMORY_BUDGET
+) -> "np.ndarray | SliceStack":
+    """
+    Open a binary volume without reading it, see `calculate_line_minimum_trace_3d`.
+
+    Decoded slices of a directory of slice images are kept up to cache_bytes.
+    """
+    if os.path.isdir(volume_path):
+        return SliceStack(
+            sorted(
+                p
+                for p in Path(volume_path).iterdir()
+                if p.suffix.lower() in IMAGE_SUFFIXES
+            ),
+            cache_bytes=cache_bytes,
+        )
+    volume = np.load(volume_path, mmap_mode="r")
+    if volume.ndim != 3:
+        raise ValueError("Volume must be a 3D array")
+    return volume
+
+
+class SliceStack:
+    """
+    Directory of slice images, read as a volume.
+
+    Each slice image is decoded once and kept as packed bits, the least
+    recently used ones being dropped above cache_bytes, so that the chunks
+    sharing slices do not decode them again. Only the rows and bytes of
+    columns of a block are unpacked.
+    """
+
+    def __init__(
+        self, paths: Sequence[Path], cache_bytes: int = config.VOLUME_MEMORY_BUDGET
+    ) -> None:
+        if not paths:
+            raise ValueError("No slice images found")
+        self.paths = list(paths)
+        self.cache_bytes = cache_bytes
+        with Image.open(self.paths[0]) as first:
+            self.shape = (len(self.paths), first.height, first.width)
+        self._slices: OrderedDict[int, np.ndarray] = OrderedDict()
+        self._slices_bytes = 0
+        self.decoded = 0
+
+    def __getitem__(self, key: tuple[slice, slice, slice]) -> np.ndarray:
+        slices, rows, columns = key
+        start, stop, _ = columns.indices(self.shape[2])
+        first_byte, last_byte = start // 8, -(-stop // 8)
+        return np.stack(
+            [
+                np.unpackbits(self._slice(i)[rows, first_byte:last_byte], axis=1)[
+                    :, start - 8 * first_byte : stop - 8 * first_byte
+                ].astype(bool)
+                for i in range(*slices.indices(self.shape[0]))
+            ]
+        )
+
+    def _slice(self, index: int) -> np.ndarray:
+        """Packed bits of a slice, decoded if not cached."""
+        packed = self._slices.get(index)
+        if packed is not None:
+            self._slices.move_to_end(index)
+            return packed
+        with Image.open(self.paths[index]) as image:
+            # Same thresholding as the 2D images
+            packed = np.packbits(np.asarray(image.convert("L")) > 128, axis=1)
+        self.decoded += 1
+        self._slices[index] = packed
+        self._slices_bytes += packed.nbytes
+        while self._slices_bytes > self.cache_bytes and len(self._slices) > 1:
+            _, dropped = self._slices.popitem(last=False)
+            self._slices_bytes -= dropped.nbytes
+        return packed
+
+
+class ChunkedVolume:
+    """
+    Binary volume loaded chunk by chunk, with the LMT boundary conditions.
+
+    Chunks are cubes of chunk_size voxels of side, held with their search
+    state in as many slots as fit in memory_budget, `_BYTES_PER_VOXEL`
+    bytes per voxel. Chunks are spilled to a scratch directory when their
+    slot is needed for another one, see the module docstring. A
+    VolumeBudgetError is raised when the budget is below the chunks a search
+    step needs at once. A volume runs a single search.
+    """
+
+    def __init__(
+        self,
+        source: "np.ndarray | SliceStack",
+        calculate_LMT: int,
+        boundary_margin: int,
+        chunk_size: int,
+        memory_budget: int,
+    ) -> None:
+        self.source = source
+        self.shape = tuple(int(s) for s in source.shape)
+        self.calculate_LMT = calculate_LMT
+        self.boundary_margin = boundary_margin
+        self.chunk_size = chunk_size
+        self.grid = tuple(-(-s // chunk_size) for s in self.shape)
+
+        voxels = chunk_size**3
+        chunks = prod(self.grid)
+        self.max_chunks = min(memory_budget // (_BYTES_PER_VOXEL * voxels), chunks)
+        if self.max_chunks < min(_MIN_CHUNKS, chunks):
+            raise VolumeBudgetError(
+                f"Memory budget of {memory_budget} bytes is below the "
+                f"{_MIN_CHUNKS} chunks of {chunk_size} voxels of side a search "
+                "needs at once, use smaller chunks"
+            )
+
+        # Slots, pages only touched when a chunk is loaded in them
+        slots = self.max_chunks
+        self.mortar = np.zeros((slots, voxels), dtype=np.uint8)
+        self.interface = np.zeros((slots, voxels), dtype=np.uint8)
+        self.distances = np.empty((slots, voxels))
+        # Index in `_OFFSETS` of the step from the predecessor, -1 for none
+        self.predecessors = np.empty((slots, voxels), dtype=np.int8)
+        self.settled = np.zeros((slots, voxels), dtype=np.uint8)
+        self.slot_of = np.full(chunks, -1, dtype=np.int64)
+        self.chunk_of = np.full(slots, -1, dtype=np.int64)
+        # Time of last use of each slot, for the least recently used
+        self.last_used = np.zeros(slots, dtype=np.int64)
+        self.clock = np.zeros(1, dtype=np.int64)
+
+        self.chunks_loaded = 0
+        self.chunks_spilled = 0
+        self._spilled: set[int] = set()
+        self._scratch: tempfile.TemporaryDirectory | None = None
+        self._scratch_arrays: dict[str, np.memmap] = {}
+
+    def chunk_index(self, point: Sequence[int]) -> int:
+        c = self.chunk_size
+        return int(np.ravel_multi_index(tuple(p // c for p in point), self.grid))
+
+    def local(self, point: Sequence[int]) -> int:
+        """Index of a voxel in the arrays of its chunk slot."""
+        c = self.chunk_size
+        z, y, x = (p % c for p in point)
+        return (z * c + y) * c + x
+
+    def slot(self, point: Sequence[int]) -> int:
+        """Slot of the chunk containing a voxel, loaded if needed."""
+        index = self.chunk_index(point)
+        slot = int(self.slot_of[index])
+        if slot < 0:
+            slot = self._load(index)
+        self.clock[0] += 1
+        self.last_used[slot] = self.clock[0]
+        return slot
+
+    def _bounds(self, index: int) -> tuple[list[int], list[int]]:
+        key = np.unravel_index(index, self.grid)
+        lo = [int(k) * self.chunk_size for k in key]
+        hi = [min(low + self.chunk_size, s) for low, s in zip(lo, self.shape)]
+        return lo, hi
+
+    def _load(self, index: int) -> int:
+        """Load a chunk in a free slot, or in the least recently used one."""
+        slot = int(np.argmin(self.last_used))
+        if self.chunk_of[slot] >= 0:
+            self._spill(slot)
+
+        if index in self._spilled:
+            for name, spilled in self._scratch_arrays.items():
+                getattr(self, name)[slot] = spilled[index]
+        else:
+            lo, hi = self._bounds(index)
+            # One more voxel around the chunk, for the interface test
+            halo_lo = [max(low - 1, 0) for low in lo]
+            halo_hi = [min(high + 1, s) for high, s in zip(hi, self.shape)]
+            block = self._read(halo_lo, halo_hi)
+            interface = interface_mask(block)
+            inner = tuple(
+                slice(low - h, high - h) for low, high, h in zip(lo, hi, halo_lo)
+            )
+            c = self.chunk_size
+            # Chunks at the far edges are smaller, padded with stone
+            window = tuple(slice(0, high - low) for low, high in zip(lo, hi))
+            for name, values in (("mortar", block), ("interface", interface)):
+                cube = np.zeros((c, c, c), dtype=np.uint8)
+                cube[window] = values[inner]
+                getattr(self, name)[slot] = cube.ravel()
+            self.distances[slot] = np.inf
+            self.predecessors[slot] = -1
+            self.settled[slot] = 0
+            self.chunks_loaded += 1
+
+        self.slot_of[index] = slot
+        self.chunk_of[slot] = index
+        return slot
+
+    def _spill(self, slot: int) -> None:
+        """Save the chunk of a slot to the scratch directory and free it."""
+        index = int(self.chunk_of[slot])
+        if self._scratch is None:
+            # Sparse files, with a row per chunk of the volume
+            self._scratch = tempfile.TemporaryDirectory(prefix="mmsdb_volume_")
+            self._scratch_arrays = {
+                name: np.lib.format.open_memmap(
+                    os.path.join(self._scratch.name, f"{name}.npy"),
+                    mode="w+",
+                    dtype=getattr(self, name).dtype,
+                    shape=(len(self.slot_of), self.chunk_size**3),
+                )
+                for name in _SPILLED
+            }
+        for name, spilled in self._scratch_arrays.items():
+            spilled[index] = getattr(self, name)[slot]
+        self._spilled.add(index)
+        self.chunks_spilled += 1
+        self.slot_of[index] = -1
+        self.chunk_of[slot] = -1
+
+    def _read(self, lo: Sequence[int], hi: Sequence[int]) -> np.ndarray:
+        """Read a block of the volume as a boolean array, boundaries applied."""
+        block = np.asarray(
+            self.source[tuple(slice(low, high) for low, high in zip(lo, hi))]
+        ).astype(bool)
+
+        margin = self.boundary_margin
+        if margin:
+            rows = np.arange(lo[1], hi[1])
+            columns = np.arange(lo[2], hi[2])
+            edge_rows = (rows < margin) | (rows >= self.shape[1] - margin)
+            edge_columns = (columns < margin) | (columns >= self.shape[2] - margin)
+            # Same order as `_apply_boundary_conditions`, rows win at corners
+            if self.calculate_LMT == 1:  # Horizontal bed joint
+                block[:, :, edge_columns] = True
+                block[:, edge_rows, :] = False
+            else:  # Vertical joints or wall leaf connections
+                block[:, :, edge_columns] = False
+                block[:, edge_rows, :] = True
+        return block
+
+    def snap(self, point: list[int]) -> list[int] | None:
+        """Nearest mortar voxel of a voxel, searched within its chunk."""
+        slot = self.slot(point)
+        if self.mortar[slot, self.local(point)]:
+            return point
+
+        lo, hi = self._bounds(self.chunk_index(point))
+        c = self.chunk_size
+        mortar = (
+            self.mortar[slot]
+            .reshape(c, c, c)[tuple(slice(0, high - low) for low, high in zip(lo, hi))]
+            .astype(bool)
+        )
+        if not mortar.any():
+            return None
+        nearest = ndimage.distance_transform_edt(
+            ~mortar, return_distances=False, return_indices=True
+        )
+        local = tuple(p - o for p, o in zip(point, lo))
+        return [int(nearest[(i, *local)]) + o for i, o in enumerate(lo)]
+
+    def shortest_path(
+        self, start: list[int], end: list[int], interface_weight: float
+    ) -> list[list[int]] | None:
+        """
+        Shortest path between two mortar voxels, None if there is no path.
+
+        Returns the [slice, row, column] coordinates of the voxels along the
+        path, from start to end.
+        """
+        if interface_weight <= 0:
+            raise ValueError("interface_weight must be positive")
+
+        slot = self.slot(start)
+        self.distances[slot, self.local(start)] = 0.0
+        shape = np.array(self.shape, dtype=np.int64)
+        grid = np.array(self.grid, dtype=np.int64)
+        target = np.array(end, dtype=np.int64)
+        heap_keys = np.empty(1024)
+        heap_nodes = np.empty(1024, dtype=np.int64)
+        heap_keys[0] = 0.0
+        heap_nodes[0] = np.ravel_multi_index(start, self.shape)
+        heap_size = np.ones(1, dtype=np.int64)
+        kernel = _astar if _astar_kernel is None else _astar_kernel
+
+        try:
+            while True:
+                outcome, chunk = kernel(
+                    self.mortar,
+                    self.interface,
+                    self.distances,
+                    self.predecessors,
+                    self.settled,
+                    self.slot_of,
+                    self.last_used,
+                    self.clock,
+                    shape,
+                    grid,
+                    self.chunk_size,
+                    _OFFSETS,
+                    _LENGTHS,
+                    interface_weight,
+                    min(1.0, interface_weight),
+                    target,
+                    heap_keys,
+                    heap_nodes,
+                    heap_size,
+                )
+                if outcome == _REACHED:
+                    return self._walk_back(end)
+                if outcome == _NO_PATH:
+                    return None
+                if outcome == _NEED_CHUNK:
+                    self._load(int(chunk))
+                else:  # _HEAP_FULL
+                    heap_keys = np.concatenate([heap_keys, np.empty(len(heap_keys))])
+                    heap_nodes = np.concatenate(
+                        [heap_nodes, np.empty(len(heap_nodes), dtype=np.int64)]
+                    )
+        finally:
+            if self._scratch is not None:
+                self._scratch_arrays.clear()
+                self._scratch.cleanup()
+                self._scratch = None
+                self._spilled.clear()
+
+    def _walk_back(self, target: list[int]) -> list[list[int]]:
+        path = [list(target)]
+        while True:
+            step = self.predecessors[self.slot(path[-1]), self.local(path[-1])]
+            if step < 0:
+                break
+            path.append([p - o for p, o in zip(path[-1], _OFFSETS[step].tolist())])
+        path.reverse()
+        return path
+
+
+def _clip(point: Sequence[int], shape: Sequence[int]) -> list[int]:
+    return [max(0, min(int(p), s - 1)) for p, s in zip(point, shape)]
+
+
+def _heap_push(keys: np.ndarray, nodes: np.ndarray, size: int, key, node) -> None:
+    """Push on a binary heap held in arrays, of size items before the push."""
+    i = size
+    while i > 0:
+        parent = (i - 1) >> 1
+        if keys[parent] <= key:
+            break
+        keys[i] = keys[parent]
+        nodes[i] = nodes[parent]
+        i = parent
+    keys[i] = key
+    nodes[i] = node
+
+
+def _heap_pop(keys: np.ndarray, nodes: np.ndarray, size: int) -> None:
+    """Remove the smallest item of a binary heap of size items."""
+    size -= 1
+    key = keys[size]
+    node = nodes[size]
+    i = 0
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            break
+        if child + 1 < size and keys[child + 1] < keys[child]:
+            child += 1
+        if key <= keys[child]:
+            break
+        keys[i] = keys[child]
+        nodes[i] = nodes[child]
+        i = child
+    keys[i] = key
+    nodes[i] = node
+
+
+def _astar(
+    mortar,
+    interface,
+    distances,
+    predecessors,
+    settled,
+    slot_of,
+    last_used,
+    clock,
+    shape,
+    grid,
+    chunk_size,
+    offsets,
+    lengths,
+    interface_weight,
+    scale,
+    target,
+    heap_keys,
+    heap_nodes,
+    heap_size,
+):
+    """
+    A* over the chunk slots of a `ChunkedVolume`, from the heap it is given.
+
+    Written in the subset of Python that numba compiles, see `_astar_kernel`.
+    The search runs until it settles the target, `_REACHED`, or empties the
+    heap, `_NO_PATH`. Before settling a voxel, it checks that the chunks of
+    the voxel and of its neighbors are loaded, and that the heap has room
+    for the neighbors, else it returns `_NEED_CHUNK` with the chunk to
+    load, or `_HEAP_FULL`, leaving its state so as to be resumed.
+    """
+    c = chunk_size
+    plane = shape[1] * shape[2]
+    target_node = (target[0] * shape[1] + target[1]) * shape[2] + target[2]
+    while heap_size[0] > 0:
+        u = heap_nodes[0]
+        uz = u // plane
+        uy = (u % plane) // shape[2]
+        ux = u % shape[2]
+        lz = uz % c
+        ly = uy % c
+        lx = ux % c
+
+        # The chunks of the voxel, and of its neighbors at a chunk face
+        clock[0] += 1
+        interior = 0 < lz < c - 1 and 0 < ly < c - 1 and 0 < lx < c - 1
+        for k in range(-1, 0 if interior else offsets.shape[0]):
+            vz, vy, vx = uz, uy, ux
+            if k >= 0:
+                vz += offsets[k, 0]
+                vy += offsets[k, 1]
+                vx += offsets[k, 2]
+                if not (
+                    0 <= vz < shape[0] and 0 <= vy < shape[1] and 0 <= vx < shape[2]
+                ):
+                    continue
+            chunk = ((vz // c) * grid[1] + vy // c) * grid[2] + vx // c
+            slot = slot_of[chunk]
+            if slot < 0:
+                return _NEED_CHUNK, chunk
+            last_used[slot] = clock[0]
+        if heap_size[0] + offsets.shape[0] > heap_keys.shape[0]:
+            return _HEAP_FULL, -1
+
+        _heap_pop(heap_keys, heap_nodes, heap_size[0])
+        heap_size[0] -= 1
+        su = slot_of[((uz // c) * grid[1] + uy // c) * grid[2] + ux // c]
+        iu = (lz * c + ly) * c + lx
+        if settled[su, iu]:
+            continue
+        settled[su, iu] = 1
+        if u == target_node:
+            return _REACHED, -1
+
+        du = distances[su, iu]
+        u_interface = interface[su, iu]
+        for k in range(offsets.shape[0]):
+            vz = uz + offsets[k, 0]
+            vy = uy + offsets[k, 1]
+            vx = ux + offsets[k, 2]
+            if not (0 <= vz < shape[0] and 0 <= vy < shape[1] and 0 <= vx < shape[2]):
+                continue
+            sv = slot_of[((vz // c) * grid[1] + vy // c) * grid[2] + vx // c]
+            iv = ((vz % c) * c + vy % c) * c + vx % c
+            if not mortar[sv, iv] or settled[sv, iv]:
+                continue
+            length = lengths[k]
+            if u_interface or interface[sv, iv]:
+                length *= interface_weight
+            dv = du + length
+            if dv < distances[sv, iv]:
+                distances[sv, iv] = dv
+                predecessors[sv, iv] = k
+                estimate = scale * np.sqrt(
+                    (vz - target[0]) ** 2
+                    + (vy - target[1]) ** 2
+                    + (vx - target[2]) ** 2
+                )
+                _heap_push(
+                    heap_keys,
+                    heap_nodes,
+                    heap_size[0],
+                    dv + estimate,
+                    (vz * shape[1] + vy) * shape[2] + vx,
+                )
+                heap_size[0] += 1
+
+    return _NO_PATH, -1
+
+
+# Compiled on first use, and cached on disk by numba across processes. The
+# heap helpers are compiled too, for the kernel to call them
+_astar_kernel = None
+if njit is not None:
+    _heap_push = njit(cache=True, nogil=True)(_heap_push)
+    _heap_pop = njit(cache=True, nogil=True)(_heap_pop)
+    _astar_kernel = njit(cache=True, nogil=True)(_astar)
@@ -0,0 +1,213 @@
+"""
+Average Line of Minimum Trace of a whole wall, from a stack of slice images.
+
+Every slice is run through `calculate_line_minimum_trace` in edge-to-edge
+mode, for each analysis type, in parallel worker processes. The per-slice
+results are streamed as they complete, and the averages are reported under
+the column names of the properties database.
+
+Command line usage, printing one JSON object per line:
+
+    python -m api.services.wall_lmt SLICES --length 98 --height 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import zipfile
+from collections.abc import AsyncIterator, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from io import BytesIO
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from .compute_pool import run_in_pool, run_with_shared_image, shared_bytes
+from .line_minimum_trace import GRAPH_ENGINES, calculate_line_minimum_trace
+from .timing import timed_call
+
+IMAGE_SUFFIXES = (".png", ".tif", ".tiff", ".bmp", ".jpg", ".jpeg")
+
+# Database column of the average of each analysis type
+LMT_COLUMNS = {
+    0: "Average vertical LMT",
+    1: "Average horizontal LMT",
+    2: "Average LMT for wall leaf connection",
+}
+
+# Slice name and its image, as a path or as the file content
+SliceSource = tuple[str, str | bytes]
+
+
+def slice_sources(path: str) -> list[SliceSource]:
+    """Slice images of a directory or a zip file, sorted by name."""
+    if os.path.isdir(path):
+        return [
+            (p.name, str(p))
+            for p in sorted(Path(path).iterdir())
+            if p.suffix.lower() in IMAGE_SUFFIXES
+        ]
+    with open(path, "rb") as f:
+        return zip_slice_sources(f.read())
+
+
+def zip_slice_sources(content: bytes) -> list[SliceSource]:
+    """Slice images of a zip file content, sorted by name."""
+    with zipfile.ZipFile(BytesIO(content)) as archive:
+        return [
+            (Path(name).name, archive.read(name))
+            for name in sorted(archive.namelist())
+            if Path(name).suffix.lower() in IMAGE_SUFFIXES
+            and not Path(name).name.startswith(".")
+        ]
+
+
+def compute_slice_lmt(
+    name: str, image: str | bytes | BinaryIO, calculate_LMT: int, **kwargs: Any
+) -> dict:
+    """Edge-to-edge LMT of one slice, without the path."""
+    result = calculate_line_minimum_trace(
+        BytesIO(image) if isinstance(image, bytes) else image,
+        calculate_LMT=calculate_LMT,
+        return_plot=False,
+        edge_to_edge=True,
+        **kwargs,
+    )
+    summary = {"slice": name, "calculate_LMT": calculate_LMT}
+    if result["success"]:
+        summary.update(
+            success=True,
+            lmt_type=result["lmt_type"],
+            lmt_result=result["lmt_result"],
+            total_length=result["total_length"],
+        )
+    else:
+        summary.update(success=False, error=result["error"])
+    return summary
+
+
+def average_lmt(results: Iterable[dict]) -> dict[str, float | None]:
+    """Average of the successful slice results per type, as in the database."""
+    values: dict[int, list[float]] = {t: [] for t in LMT_COLUMNS}
+    for result in results:
+        if result["success"]:
+            values[result["calculate_LMT"]].append(result["lmt_result"])
+    return {
+        column: round(sum(values[t]) / len(values[t]), 2) if values[t] else None
+        for t, column in LMT_COLUMNS.items()
+    }
+
+
+def iter_wall_lmt(
+    executor: Executor,
+    sources: list[SliceSource],
+    types: Iterable[int] = tuple(LMT_COLUMNS),
+    **kwargs: Any,
+) -> Iterator[dict]:
+    """Slice results in completion order, computed with the executor."""
+    futures = [
+        executor.submit(compute_slice_lmt, name, image, t, **kwargs)
+        for name, image in sources
+        for t in types
+    ]
+    for future in as_completed(futures):
+        yield future.result()
+
+
+async def stream_wall_lmt(
+    sources: list[SliceSource],
+    types: Iterable[int] = tuple(LMT_COLUMNS),
+    **kwargs: Any,
+) -> AsyncIterator[dict]:
+    """
+    Slice results in completion order, computed in the process pool.
+
+    Slice images given as content are passed to the workers in shared
+    memory, once per slice for all the analysis types. Each result has the
+    stage timings of its computation as timings, see `timing.timed_call`.
+    """
+    types = tuple(types)
+    with ExitStack() as segments:
+        tasks = []
+        for name, image in sources:
+            if isinstance(image, bytes):
+                shm_name, size = segments.enter_context(shared_bytes(image))
+                tasks += [
+                    run_in_pool(
+                        timed_call,
+                        run_with_shared_image,
+                        _compute_shared_slice_lmt,
+                        shm_name,
+                        size,
+                        name,
+                        t,
+                        **kwargs,
+                    )
+                    for t in types
+                ]
+            else:
+                tasks += [
+                    run_in_pool(timed_call, compute_slice_lmt, name, image, t, **kwargs)
+                    for t in types
+                ]
+        for task in asyncio.as_completed(tasks):
+            result, timings = await task
+            yield {**result, "timings": timings}
+
+
+def _compute_shared_slice_lmt(
+    image: BinaryIO, name: str, calculate_LMT: int, **kwargs: Any
+) -> dict:
+    """`compute_slice_lmt` with the image first, see `run_with_shared_image`."""
+    return compute_slice_lmt(name, image, calculate_LMT, **kwargs)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Average LMT of a wall over a directory or zip of slices, "
+        "printing the slice results and then the averages as JSON lines."
+    )
+    parser.add_argument("slices", help="directory or zip file of slice images")
+    parser.add_argument("--length", type=float, required=True, help="real length")
+    parser.add_argument("--height", type=float, required=True, help="real height")
+    parser.add_argument(
+        "--types",
+        type=int,
+        nargs="+",
+        choices=list(LMT_COLUMNS),
+        default=list(LMT_COLUMNS),
+        help="analysis types: 0=vertical, 1=horizontal, 2=wall leaf connection",
+    )
+    parser.add_argument("--interface-weight", type=float, default=1.0)
+    parser.add_argument("--boundary-margin", type=int, default=5)
+    parser.add_argument("--graph-engine", choices=GRAPH_ENGINES, default="csr")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="default is one per CPU"
+    )
+    args = parser.parse_args(argv)
+
+    sources = slice_sources(args.slices)
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for result in iter_wall_lmt(
+            executor,
+            sources,
+            args.types,
+            real_length=args.length,
+            real_height=args.height,
+            interface_weight=args.interface_weight,
+            boundary_margin=args.boundary_margin,
+            graph_engine=args.graph_engine,
+        ):
+            results.append(result)
+            print(json.dumps(result), flush=True)
+    print(json.dumps({"averages": average_lmt(results)}))
+
+    if not any(result["success"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
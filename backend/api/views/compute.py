@@ -1,13 +1,62 @@
+import asyncio
+import json
 import logging
+import os
 import tempfile
 import timeit
-from typing import Annotated
+import zipfile
+from collections.abc import Callable
+from functools import partial
+from typing import Annotated, Any
 
-from api.models.compute import CorrelationResult
-from api.services.correlation import compute_correlation_parameters
-from api.services.line_minimum_trace import calculate_line_minimum_trace
-from fastapi import APIRouter, HTTPException, Query, UploadFile
+from api.config import config
+from api.models.compute import (
+    CorrelationMatrix,
+    CorrelationResult,
+    GraphEngine,
+    JobStatus,
+    LineQuery,
+    PathEncoding,
+    SearchMode,
+    SweepEngine,
+)
+from api.services.artifact_cache import artifact_cache
+from api.services.compute_pool import run_in_pool, run_with_shared_image, shared_bytes
+from api.services.correlation import (
+    compute_correlation_matrix,
+    compute_correlation_parameters,
+)
+from api.services.jobs import JobQueueFullError, job_queue
+from api.services.line_minimum_trace import (
+    calculate_line_minimum_trace,
+    calculate_line_minimum_trace_batch,
+    calculate_line_minimum_trace_sweep,
+)
+from api.services.overlay import (
+    LineOverlay,
+    get_overlay,
+    render_overlay_svg,
+    render_stored_overlay,
+)
+from api.services.timing import (
+    StageTimings,
+    add_timings,
+    collect_timings,
+    server_timing,
+    timed_call,
+    timing_metrics,
+)
+from api.services.volume_lmt import calculate_line_minimum_trace_3d
+from api.services.wall_lmt import (
+    LMT_COLUMNS,
+    average_lmt,
+    stream_wall_lmt,
+    zip_slice_sources,
+)
+from fastapi import APIRouter, Form, HTTPException, Query, UploadFile
+from fastapi.responses import Response, StreamingResponse
 from fastapi_cache.decorator import cache
+from pydantic import TypeAdapter, ValidationError
 
 router = APIRouter()
 logger = logging.getLogger("uvicorn.error")
@@ -18,54 +67,654 @@ logger = logging.getLogger("uvicorn.error")
 async def get_correlation_parameters(
     x_column: str,
     y_column: str,
+    response: Response,
     allowed_categories: Annotated[list[str], Query()] = [],
+    bootstrap: Annotated[int, Query(ge=0, le=10000)] = 0,
+    seed: int = 0,
+    confidence: Annotated[float, Query(gt=0, lt=1)] = 0.95,
+    timings: bool = False,
 ) -> CorrelationResult:
-    """Get correlation parameters between two columns in a dataset."""
-    return await compute_correlation_parameters(
-        x_column, y_column, allowed_categories=allowed_categories
+    """Get correlation parameters between two columns in a dataset.
+
+    With bootstrap, that many fits of resampled pairs give confidence
+    intervals of the slope and intercept, a confidence band of the fitted
+    line, and a prediction band of new pairs, wider with the residuals. They
+    are deterministic for a given seed.
+
+    The durations of the computation stages are sent in the Server-Timing
+    header, except for cached responses, and in the result as well with
+    timings, cached responses keeping the ones of their computation.
+    """
+    start_time = timeit.default_timer()
+    with collect_timings() as stage_timings:
+        result = await compute_correlation_parameters(
+            x_column,
+            y_column,
+            allowed_categories=allowed_categories,
+            bootstrap=bootstrap,
+            seed=seed,
+            confidence=confidence,
+        )
+    stage_timings = stage_timings.as_dict()
+    _record_timings(
+        "correlation", response, stage_timings, timeit.default_timer() - start_time
+    )
+    if timings:
+        result.timings = stage_timings
+    return result
+
+
+@router.get("/correlation/matrix")
+@cache()
+async def get_correlation_matrix(
+    response: Response,
+    allowed_categories: Annotated[list[str], Query()] = [],
+    fit_x: Annotated[list[str], Query()] = [],
+    fit_y: Annotated[list[str], Query()] = [],
+    timings: bool = False,
+) -> CorrelationMatrix:
+    """Get the correlation coefficients between every pair of numeric columns.
+
+    Pearson and Spearman coefficients are computed over the rows where both
+    columns are numbers, null when there are fewer than three. fit_x and
+    fit_y are parallel lists of columns, each pair getting the robust fit of
+    GET /correlation.
+
+    The durations of the computation stages are sent as for GET /correlation.
+    """
+    if len(fit_x) != len(fit_y):
+        raise HTTPException(
+            status_code=400, detail="fit_x and fit_y must have the same length"
+        )
+    start_time = timeit.default_timer()
+    with collect_timings() as stage_timings:
+        result = await compute_correlation_matrix(
+            allowed_categories=allowed_categories,
+            fit_pairs=list(zip(fit_x, fit_y)),
+        )
+    stage_timings = stage_timings.as_dict()
+    _record_timings(
+        "correlation_matrix",
+        response,
+        stage_timings,
+        timeit.default_timer() - start_time,
     )
+    if timings:
+        result.timings = stage_timings
+    return result
 
 
 @router.post("/line")
 async def compute_line_minimum_trace(
     image: UploadFile,
-    start_x: int,
-    start_y: int,
-    end_x: int,
-    end_y: int,
+    response: Response,
     real_length: float,
     real_height: float,
     analysis_type: int,
     interface_weight: float,
     boundary_margin: int,
+    start_x: int | None = None,
+    start_y: int | None = None,
+    end_x: int | None = None,
+    end_y: int | None = None,
+    graph_engine: GraphEngine = "networkx",
+    edge_to_edge: bool = False,
+    search: SearchMode = "dijkstra",
+    path_encoding: PathEncoding = "full",
+    simplify_tolerance: float | None = None,
+    timings: bool = False,
+    overlay: bool = False,
 ) -> dict:
-    """Compute the line of minimum trace."""
-    if (
-        not hasattr(image, "content_type")
-        or image.content_type is None
-        or not image.content_type.startswith("image/")
-    ):
-        raise HTTPException(status_code=400, detail="Invalid image file")
+    """Compute the line of minimum trace.
+
+    With edge_to_edge, the start and end points are not needed: the minimum
+    trace crossing the whole wall is searched instead. The search algorithm
+    between the start and end points may be "astar" or, with the grid engine,
+    "bidirectional_astar", which find the same trace faster. The path may be
+    returned as a "chain" code, a float32 "npy" buffer or "simplified" within
+    simplify_tolerance, in real-world units, instead of "full" lists. The
+    "multiresolution" engine is approximate, its trace may be up to about 2%
+    above the minimum.
+
+    The image may also be a boolean .npy array, True for mortar, or a .npz
+    file of rows of bits packed with np.packbits, "packed", and "shape".
+
+    With overlay, a successful result has a result_id, to get its overlay on
+    the image from GET /line/{result_id}/overlay.png or overlay.svg for a
+    while.
+
+    The durations of the computation stages, with the cache hits, are sent in
+    the Server-Timing header, and in the result as well with timings. The
+    "pool" stage is the time spent outside of the computation, passing the
+    image to a compute worker and waiting for one to be free.
+    """
+    _check_image(image)
+    if not edge_to_edge and None in (start_x, start_y, end_x, end_y):
+        raise HTTPException(status_code=400, detail="Start and end points are required")
+
+    try:
+        start_time = timeit.default_timer()
+        result, stage_timings = await _run_on_image(
+            await image.read(),
+            partial(timed_call, calculate_line_minimum_trace),
+            start_coords=None if edge_to_edge else [start_x, start_y],
+            end_coords=None if edge_to_edge else [end_x, end_y],
+            real_length=real_length,
+            real_height=real_height,
+            calculate_LMT=analysis_type,
+            interface_weight=interface_weight,
+            boundary_margin=boundary_margin,
+            return_plot=False,
+            graph_engine=graph_engine,
+            path_encoding=path_encoding,
+            simplify_tolerance=simplify_tolerance,
+            edge_to_edge=edge_to_edge,
+            search=search,
+            keep_overlay=overlay,
+        )
+        elapsed = timeit.default_timer() - start_time
+        logger.info(f"Line minimum trace computed in {elapsed:.2f} seconds")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    _add_pool_stage(stage_timings, elapsed)
+    _record_timings("line", response, stage_timings, elapsed)
+    if timings:
+        result["timings"] = stage_timings
+    return result
+
+
+@router.get("/line/{result_id}/overlay.png")
+async def get_line_minimum_trace_overlay_png(result_id: str) -> Response:
+    """Get the path of a POST /line result drawn on its image, at full size."""
+    png = await run_in_pool(render_stored_overlay, result_id)
+    if png is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return Response(content=png, media_type="image/png")
+
+
+@router.get("/line/{result_id}/overlay.svg")
+async def get_line_minimum_trace_overlay_svg(result_id: str) -> Response:
+    """Get the path of a POST /line result as an SVG to lay over its image."""
+    overlay = _get_overlay(result_id)
+    svg = render_overlay_svg(
+        overlay.width,
+        overlay.height,
+        overlay.pixel_coordinates,
+        overlay.start_point,
+        overlay.end_point,
+    )
+    return Response(content=svg, media_type="image/svg+xml")
+
+
+@router.post("/line/batch")
+async def compute_line_minimum_trace_batch(
+    image: UploadFile,
+    queries: Annotated[str, Form()],
+    response: Response,
+    real_length: float,
+    real_height: float,
+    interface_weight: float,
+    boundary_margin: int,
+    graph_engine: GraphEngine = "networkx",
+    path_encoding: PathEncoding = "full",
+    simplify_tolerance: float | None = None,
+    timings: bool = False,
+) -> dict:
+    """Compute the line of minimum trace for many start/end pairs on one image.
+
+    The queries form field is a JSON list of objects with start_x, start_y,
+    end_x, end_y and analysis_type. Results are returned in the same order.
+
+    The durations of the computation stages are sent as for POST /line.
+    """
+    _check_image(image)
+    try:
+        line_queries = _line_queries_adapter.validate_json(queries)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid queries: {e}")
+
+    try:
+        start_time = timeit.default_timer()
+        result, stage_timings = await _run_on_image(
+            await image.read(),
+            partial(timed_call, calculate_line_minimum_trace_batch),
+            queries=[
+                {
+                    "start_coords": [q.start_x, q.start_y],
+                    "end_coords": [q.end_x, q.end_y],
+                    "calculate_LMT": q.analysis_type,
+                }
+                for q in line_queries
+            ],
+            real_length=real_length,
+            real_height=real_height,
+            interface_weight=interface_weight,
+            boundary_margin=boundary_margin,
+            graph_engine=graph_engine,
+            path_encoding=path_encoding,
+            simplify_tolerance=simplify_tolerance,
+        )
+        elapsed = timeit.default_timer() - start_time
+        logger.info(
+            f"{len(line_queries)} line minimum traces computed in {elapsed:.2f} seconds"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    _add_pool_stage(stage_timings, elapsed)
+    _record_timings("line_batch", response, stage_timings, elapsed)
+    if timings:
+        result["timings"] = stage_timings
+    return result
+
+
+@router.post("/line/sweep")
+async def compute_line_minimum_trace_sweep(
+    image: UploadFile,
+    interface_weights: Annotated[list[float], Query(min_length=1)],
+    response: Response,
+    real_length: float,
+    real_height: float,
+    analysis_type: int,
+    boundary_margin: int,
+    start_x: int | None = None,
+    start_y: int | None = None,
+    end_x: int | None = None,
+    end_y: int | None = None,
+    graph_engine: SweepEngine = "csr",
+    edge_to_edge: bool = False,
+    parallel: bool = False,
+    path_encoding: PathEncoding = "full",
+    simplify_tolerance: float | None = None,
+    timings: bool = False,
+) -> dict:
+    """Compute the line of minimum trace for several interface weights.
+
+    The graph is built once for all the weights. With parallel, the weights
+    are split between the compute workers, each building the graph once.
+    Results are returned in the order of the interface weights.
+
+    The durations of the computation stages are sent as for POST /line, added
+    up over the compute workers with parallel.
+    """
+    _check_image(image)
+    if not edge_to_edge and None in (start_x, start_y, end_x, end_y):
+        raise HTTPException(status_code=400, detail="Start and end points are required")
+
+    chunks = [interface_weights]
+    if parallel:
+        n = min(config.COMPUTE_WORKERS or os.cpu_count() or 1, len(interface_weights))
+        chunks = [interface_weights[i::n] for i in range(n)]
+
+    try:
+        start_time = timeit.default_timer()
+        with (
+            collect_timings() as stage_timings,
+            shared_bytes(await image.read()) as (shm_name, size),
+        ):
+            chunk_results = await asyncio.gather(
+                *(
+                    run_in_pool(
+                        run_with_shared_image,
+                        partial(timed_call, calculate_line_minimum_trace_sweep),
+                        shm_name,
+                        size,
+                        interface_weights=chunk,
+                        start_coords=None if edge_to_edge else [start_x, start_y],
+                        end_coords=None if edge_to_edge else [end_x, end_y],
+                        real_length=real_length,
+                        real_height=real_height,
+                        calculate_LMT=analysis_type,
+                        boundary_margin=boundary_margin,
+                        graph_engine=graph_engine,
+                        path_encoding=path_encoding,
+                        simplify_tolerance=simplify_tolerance,
+                        edge_to_edge=edge_to_edge,
+                    )
+                    for chunk in chunks
+                )
+            )
+            for _, chunk_timings in chunk_results:
+                add_timings(chunk_timings)
+        elapsed = timeit.default_timer() - start_time
+        logger.info(
+            f"Line minimum trace computed for {len(interface_weights)} interface "
+            f"weights in {elapsed:.2f} seconds"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    stage_timings = _add_pool_stage(stage_timings.as_dict(), elapsed)
+    _record_timings("line_sweep", response, stage_timings, elapsed)
+    chunk_results = [result for result, _ in chunk_results]
+    for result in chunk_results:
+        if not result["success"]:
+            return result
+    # Interleave the chunks back into the order of the weights
+    results = [None] * len(interface_weights)
+    for i, result in enumerate(chunk_results):
+        results[i :: len(chunks)] = result["results"]
+    result = {"success": True, "results": results}
+    if timings:
+        result["timings"] = stage_timings
+    return result
+
+
+@router.post("/line/wall")
+async def compute_wall_line_minimum_trace(
+    slices: UploadFile,
+    real_length: float,
+    real_height: float,
+    interface_weight: float,
+    boundary_margin: int,
+    analysis_types: Annotated[list[int], Query()] = list(LMT_COLUMNS),
+    graph_engine: GraphEngine = "csr",
+) -> StreamingResponse:
+    """Compute the average edge-to-edge LMT of a wall over a zip of slices.
+
+    The response is streamed as JSON lines: one per slice and analysis type,
+    in completion order, then the averages, named as in the properties table.
+
+    The durations of the computation stages, added up over the slices, come
+    with the averages as timings, the headers being sent before them.
+    """
+    sources = await _wall_slice_sources(slices, analysis_types)
+
+    async def lines():
+        start_time = timeit.default_timer()
+        # Not collected in a context, which may change between the lines
+        stage_timings = StageTimings()
+        results = []
+        async for result in stream_wall_lmt(
+            sources,
+            analysis_types,
+            real_length=real_length,
+            real_height=real_height,
+            interface_weight=interface_weight,
+            boundary_margin=boundary_margin,
+            graph_engine=graph_engine,
+        ):
+            stage_timings.add(result.pop("timings"))
+            results.append(result)
+            yield json.dumps(result) + "\n"
+        elapsed = timeit.default_timer() - start_time
+        stage_timings = _add_pool_stage(stage_timings.as_dict(), elapsed)
+        timing_metrics.record("line_wall", stage_timings, elapsed)
+        yield (
+            json.dumps({"averages": average_lmt(results), "timings": stage_timings})
+            + "\n"
+        )
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 
-    with tempfile.NamedTemporaryFile(delete=True) as temp_image:
-        temp_image.write(await image.read())
-        temp_image.flush()
+@router.post("/jobs")
+async def submit_line_minimum_trace_job(
+    image: UploadFile,
+    real_length: float,
+    real_height: float,
+    analysis_type: int,
+    interface_weight: float,
+    boundary_margin: int,
+    start_x: int | None = None,
+    start_y: int | None = None,
+    end_x: int | None = None,
+    end_y: int | None = None,
+    graph_engine: GraphEngine = "networkx",
+    edge_to_edge: bool = False,
+    search: SearchMode = "dijkstra",
+    path_encoding: PathEncoding = "full",
+    simplify_tolerance: float | None = None,
+) -> JobStatus:
+    """Queue a line of minimum trace computation, see POST /line.
+
+    Poll GET /jobs/{job_id} until the job is done, then fetch its result.
+    """
+    _check_image(image)
+    if not edge_to_edge and None in (start_x, start_y, end_x, end_y):
+        raise HTTPException(status_code=400, detail="Start and end points are required")
+
+    work = partial(
+        _run_timed_on_image,
+        await image.read(),
+        calculate_line_minimum_trace,
+        start_coords=None if edge_to_edge else [start_x, start_y],
+        end_coords=None if edge_to_edge else [end_x, end_y],
+        real_length=real_length,
+        real_height=real_height,
+        calculate_LMT=analysis_type,
+        interface_weight=interface_weight,
+        boundary_margin=boundary_margin,
+        return_plot=False,
+        graph_engine=graph_engine,
+        path_encoding=path_encoding,
+        simplify_tolerance=simplify_tolerance,
+        edge_to_edge=edge_to_edge,
+        search=search,
+    )
+    try:
+        return job_queue.submit(work, name="job_line")
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.post("/jobs/volume")
+async def submit_volume_line_minimum_trace_job(
+    volume: UploadFile,
+    real_length: float,
+    real_height: float,
+    real_thickness: float,
+    analysis_type: int,
+    interface_weight: float,
+    boundary_margin: int,
+    start_x: int,
+    start_y: int,
+    start_z: int,
+    end_x: int,
+    end_y: int,
+    end_z: int,
+) -> JobStatus:
+    """Queue a line of minimum trace computation through a wall volume.
+
+    The volume is a 3D .npy array of shape (slices, rows, columns), non-zero
+    for mortar. z is the slice index.
+    """
+    if not (volume.filename or "").lower().endswith(".npy"):
+        raise HTTPException(status_code=400, detail="Volume must be a .npy file")
+
+    # Kept on disk to be memory mapped, removed once the job is finished
+    with tempfile.NamedTemporaryFile(suffix=".npy", delete=False) as temp_volume:
+        while chunk := await volume.read(1024 * 1024):
+            temp_volume.write(chunk)
 
+    async def work() -> dict:
         try:
-            start_time = timeit.default_timer()
-            result = calculate_line_minimum_trace(
-                temp_image.name,
-                start_coords=[start_x, start_y],
-                end_coords=[end_x, end_y],
+            result, stage_timings = await run_in_pool(
+                timed_call,
+                calculate_line_minimum_trace_3d,
+                temp_volume.name,
+                start_coords=[start_x, start_y, start_z],
+                end_coords=[end_x, end_y, end_z],
                 real_length=real_length,
                 real_height=real_height,
+                real_thickness=real_thickness,
                 calculate_LMT=analysis_type,
                 interface_weight=interface_weight,
                 boundary_margin=boundary_margin,
-                return_plot=False,
             )
-            elapsed = timeit.default_timer() - start_time
-            logger.info(f"Line minimum trace computed in {elapsed:.2f} seconds")
+            add_timings(stage_timings)
             return result
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            os.remove(temp_volume.name)
+
+    try:
+        return job_queue.submit(work, name="job_volume")
+    except JobQueueFullError as e:
+        os.remove(temp_volume.name)
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.post("/jobs/wall")
+async def submit_wall_line_minimum_trace_job(
+    slices: UploadFile,
+    real_length: float,
+    real_height: float,
+    interface_weight: float,
+    boundary_margin: int,
+    analysis_types: Annotated[list[int], Query()] = list(LMT_COLUMNS),
+    graph_engine: GraphEngine = "csr",
+) -> JobStatus:
+    """Queue the computation of the average LMT of a wall, see POST /line/wall.
+
+    The job result has the slice results and the averages.
+    """
+    sources = await _wall_slice_sources(slices, analysis_types)
+
+    async def work() -> dict:
+        results = []
+        async for result in stream_wall_lmt(
+            sources,
+            analysis_types,
+            real_length=real_length,
+            real_height=real_height,
+            interface_weight=interface_weight,
+            boundary_margin=boundary_margin,
+            graph_engine=graph_engine,
+        ):
+            add_timings(result.pop("timings"))
+            results.append(result)
+        return {"slices": results, "averages": average_lmt(results)}
+
+    try:
+        return job_queue.submit(work, name="job_wall")
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/cache")
+async def get_artifact_cache_stats() -> dict[str, int]:
+    """Get the hit and miss counts and the size of the artifact cache.
+
+    The artifact cache is looked up when a graph or prepared slice is not in
+    the memory of a compute worker. Counts are over all the compute workers
+    since the server started.
+    """
+    return artifact_cache.stats()
+
+
+@router.get("/metrics")
+async def get_timing_metrics() -> dict[str, dict]:
+    """Get the aggregated stage timings of the compute requests.
+
+    For each instrumented endpoint, and each kind of job as job_line,
+    job_volume and job_wall: the request count, then the count, total,
+    mean and maximum durations in seconds of the whole requests and of each
+    stage, and the hit and miss counts of each cache. Metrics are kept since
+    the server started, by each server process.
+    """
+    return timing_metrics.snapshot()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str) -> JobStatus:
+    """Get the state of a job and the time spent in each state.
+
+    Finished jobs have the durations of their computation stages as well, see
+    POST /line.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job.status()
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, response: Response) -> dict:
+    """Get the result of a finished job, with its stage timings.
+
+    The stage timings are sent in the Server-Timing header as well, with the
+    running time of the job as total. They are aggregated in GET /metrics
+    when the job finishes.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    if job.state == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.state != "done":
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' is {job.state}")
+    response.headers["Server-Timing"] = server_timing(
+        job.stage_timings, job.finished_at - job.started_at
+    )
+    return {**job.result, "timings": job.stage_timings}
+
+
+async def _wall_slice_sources(
+    slices: UploadFile, analysis_types: list[int]
+) -> list[tuple[str, str | bytes]]:
+    if any(t not in LMT_COLUMNS for t in analysis_types):
+        raise HTTPException(status_code=400, detail="Invalid analysis type")
+    try:
+        sources = zip_slice_sources(await slices.read())
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Slices must be a zip file")
+    if not sources:
+        raise HTTPException(status_code=400, detail="No slice images found")
+    return sources
+
+
+def _check_image(image: UploadFile) -> None:
+    """Accept images, and binary images as .npy or packed-bit .npz arrays."""
+    if (image.filename or "").lower().endswith((".npy", ".npz")):
+        return
+    if (
+        not hasattr(image, "content_type")
+        or image.content_type is None
+        or not image.content_type.startswith("image/")
+    ):
+        raise HTTPException(status_code=400, detail="Invalid image file")
+
+
+def _record_timings(
+    endpoint: str, response: Response, timings: dict[str, dict], total: float
+) -> None:
+    """Send the timings of a request as Server-Timing header and aggregate them."""
+    response.headers["Server-Timing"] = server_timing(timings, total)
+    timing_metrics.record(endpoint, timings, total)
+
+
+def _add_pool_stage(timings: dict[str, dict], total: float) -> dict[str, dict]:
+    """
+    Add the time of a request spent outside of its stages, passing data to
+    the compute workers and waiting for one to be free, as the "pool" stage.
+    """
+    timings["stages"]["pool"] = max(0.0, total - sum(timings["stages"].values()))
+    return timings
+
+
+def _get_overlay(result_id: str) -> LineOverlay:
+    overlay = get_overlay(result_id)
+    if overlay is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return overlay
+
+
+async def _run_on_image(content: bytes, fn: Callable[..., Any], **kwargs: Any) -> Any:
+    """Run fn in the process pool on an uploaded image, passed in shared memory."""
+    with shared_bytes(content) as (shm_name, size):
+        return await run_in_pool(run_with_shared_image, fn, shm_name, size, **kwargs)
+
+
+async def _run_timed_on_image(
+    content: bytes, fn: Callable[..., Any], **kwargs: Any
+) -> Any:
+    """Run fn as `_run_on_image`, adding its stage timings to the current ones."""
+    result, stage_timings = await _run_on_image(
+        content, partial(timed_call, fn), **kwargs
+    )
+    add_timings(stage_timings)
+    return result
+
+
+_line_queries_adapter = TypeAdapter(list[LineQuery])
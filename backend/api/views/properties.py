@@ -1,6 +1,8 @@
-from api.models.properties import Table
+from typing import Annotated
+
+from api.models.properties import PropertyQueryResult, Table
 from api.services.properties import properties
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from fastapi_cache.decorator import cache
 
 router = APIRouter()
@@ -16,6 +18,34 @@ async def get_properties() -> Table:
     return await properties.get_property_entries()
 
 
+@router.get(
+    "/query",
+    status_code=200,
+    description="Get the rows and columns of the table of properties matching "
+    'a query. Filters are "<column><operator><value>", the operators being '
+    "==, !=, <, <=, > and >=, compared as numbers except for equality on text "
+    'columns. Sort keys are column names, prefixed with "-" for descending '
+    "order, missing values last.",
+)
+@cache()
+async def query_properties(
+    columns: Annotated[list[str], Query()] = [],
+    filters: Annotated[list[str], Query()] = [],
+    allowed_categories: Annotated[list[str], Query()] = [],
+    sort: Annotated[list[str], Query()] = [],
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int | None, Query(ge=0)] = None,
+) -> PropertyQueryResult:
+    return await properties.query_property_entries(
+        columns=columns,
+        filters=filters,
+        allowed_categories=allowed_categories,
+        sort=sort,
+        offset=offset,
+        limit=limit,
+    )
+
+
 @router.get(
     "/stones/{wall_id}",
     status_code=200,
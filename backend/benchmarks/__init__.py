@@ -0,0 +1,8 @@
+"""
+Performance benchmarks of the backend computations.
+
+Run from the backend directory, see `benchmarks.lmt`:
+
+    python -m benchmarks.lmt run --output results.json
+    python -m benchmarks.lmt compare baseline.json results.json
+"""
@@ -0,0 +1,384 @@
+"""
+Benchmark of the line minimum trace computation, stage by stage.
+
+Each case runs `calculate_line_minimum_trace` on one image with one graph
+engine, in edge-to-edge mode, and reports the durations of its stages, see
+`api.services.timing`:
+
+- decode: reading the PNG file into a binary image;
+- boundary: boundary conditions, slice precomputations and end points;
+- graph: building the graph, none for the engines searching the grid;
+- search: the shortest path search;
+- serialization: path results encoded as JSON;
+- plot: the PNG overlay of the path.
+
+The in-memory and on-disk caches are cleared before every repetition, so
+that the stages are timed as for a new image. Every case runs in a new
+process, which reports its peak resident memory. Results are written as
+JSON, to be compared between commits:
+
+    python -m benchmarks.lmt run --output baseline.json
+    git checkout my-branch
+    python -m benchmarks.lmt run --output results.json
+    python -m benchmarks.lmt compare baseline.json results.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from io import BytesIO
+from multiprocessing import get_context
+from pathlib import Path
+from statistics import median
+
+import numpy as np
+from api.services.timing import timed_call
+
+from .synthetic import synthetic_wall_png
+
+EXAMPLE_SLICE = Path(__file__).parent.parent / "data" / "example_slice.png"
+STAGES = ("decode", "boundary", "graph", "search", "serialization", "plot")
+DEFAULT_SIZES = (500, 1000, 2000, 4000, 8000)
+DEFAULT_ENGINES = ("csr", "grid", "multiresolution")
+
+# Differences below this many seconds are noise, never regressions
+_MIN_SECONDS = 0.005
+
+
+def run_case(case: dict) -> dict:
+    """
+    Time the stages of one case, see `benchmark_cases` for its items.
+
+    Returns the case with the median duration of each stage in seconds over
+    the repetitions, their total, the resident memory before the first
+    repetition and at its peak in MB, the LMT result and the weighted cost
+    of the path, see `path_cost`.
+    """
+    from api.services import line_minimum_trace as lmt
+    from api.services.artifact_cache import artifact_cache
+    from api.services.grid_dijkstra import path_cost
+
+    artifact_cache.path = None
+    if case["image"] == "example":
+        png = EXAMPLE_SLICE.read_bytes()
+    else:
+        png = synthetic_wall_png(
+            case["size"], stone_ratio=case["stone_ratio"], seed=case["seed"]
+        )
+
+    # Compilations and imports on first use are not part of the timings
+    _compute(lmt, synthetic_wall_png(64), case, {})
+    baseline_rss = _peak_rss_mb()
+
+    durations: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    for _ in range(case["repeat"]):
+        for cache in (
+            lmt._bwgraph_cache,
+            lmt._bwgraph_csr_cache,
+            lmt._prepared_slice_cache,
+        ):
+            cache.clear()
+        timings: dict[str, float] = {}
+        result = _compute(lmt, png, case, timings)
+        for stage in STAGES:
+            durations[stage].append(timings.get(stage, 0.0))
+
+    stages = {stage: median(values) for stage, values in durations.items()}
+
+    # Cost on the full resolution image the path was searched on
+    image = lmt._load_binary_image(BytesIO(png))
+    lmt._apply_boundary_conditions(
+        image, case["calculate_LMT"], case["boundary_margin"]
+    )
+    x, y = np.asarray(result["pixel_coordinates"]).T
+    nodes = np.ravel_multi_index((y, x), image.shape)
+    cost = path_cost(image, nodes, case["interface_weight"])
+
+    return {
+        **case,
+        "shape": list(result["shape"]),
+        "stages": stages,
+        "total": sum(stages.values()),
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": _peak_rss_mb(),
+        "lmt_result": result["lmt_result"],
+        "path_cost": cost,
+        "path_pixels": len(result["pixel_coordinates"]),
+    }
+
+
+def _compute(lmt, png: bytes, case: dict, timings: dict[str, float]) -> dict:
+    """
+    Run `calculate_line_minimum_trace`, with the durations of its stages.
+
+    The JSON encoding of the result, done by the API, is added to the
+    serialization stage.
+    """
+    result, stage_timings = timed_call(
+        lmt.calculate_line_minimum_trace,
+        BytesIO(png),
+        calculate_LMT=case["calculate_LMT"],
+        interface_weight=case["interface_weight"],
+        boundary_margin=case["boundary_margin"],
+        graph_engine=case["graph_engine"],
+        edge_to_edge=True,
+    )
+    if not result["success"]:
+        raise ValueError(f"{result['error']}, in case {case}")
+    if result.pop("plot_image") is None:
+        raise ValueError(f"No plot, in case {case}")
+
+    start = time.perf_counter()
+    json.dumps(result)
+    timings.update(stage_timings["stages"])
+    timings["serialization"] += time.perf_counter() - start
+
+    dimensions = result["image_dimensions"]
+    return {
+        "shape": (dimensions["height"], dimensions["width"]),
+        "lmt_result": result["lmt_result"],
+        "pixel_coordinates": result["path_coordinates"]["pixel_coordinates"],
+    }
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident memory of this process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def benchmark_cases(
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    engines: Sequence[str] = DEFAULT_ENGINES,
+    example: bool = True,
+    stone_ratio: float = 0.7,
+    seed: int = 0,
+    calculate_LMT: int = 1,
+    interface_weight: float = 0.5,
+    boundary_margin: int = 5,
+    repeat: int = 3,
+) -> list[dict]:
+    """Cases of a benchmark run, for every image and graph engine."""
+    images: list[dict] = [{"image": "example", "size": None}] if example else []
+    images += [{"image": f"synthetic-{size}", "size": size} for size in sizes]
+    return [
+        {
+            **image,
+            "graph_engine": engine,
+            "stone_ratio": stone_ratio,
+            "seed": seed,
+            "calculate_LMT": calculate_LMT,
+            "interface_weight": interface_weight,
+            "boundary_margin": boundary_margin,
+            "repeat": repeat,
+        }
+        for image in images
+        for engine in engines
+    ]
+
+
+def run_benchmark(cases: list[dict]) -> dict:
+    """
+    Run the cases one after the other, each in a new process.
+
+    The results of the "multiresolution" engine, which is not guaranteed
+    to find the optimal path, get the relative excess of their path cost
+    over the cost of the path found by an exact engine on the same image,
+    when it was run before. Both are costs on the full resolution image,
+    the ones minimized by the searches, so that the excess is never negative.
+    The LMT values are not compared: a path with a lower LMT may cost more.
+    """
+    results = []
+    exact: dict[tuple, float] = {}
+    for case in cases:
+        # A new pool every time, out of memory kills break the pool
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context("spawn")
+        ) as executor:
+            try:
+                result = executor.submit(run_case, case).result()
+            except Exception as e:
+                result = {**case, "error": f"{type(e).__name__}: {e}"}
+        if "error" not in result:
+            key = _image_key(result)
+            if result["graph_engine"] != "multiresolution":
+                exact[key] = result["path_cost"]
+            elif key in exact:
+                result["cost_excess"] = result["path_cost"] / exact[key] - 1
+        results.append(result)
+        print(_format_result(result), file=sys.stderr, flush=True)
+    return {"metadata": _metadata(), "results": results}
+
+
+def compare(baseline: dict, results: dict, threshold: float = 0.2) -> list[str]:
+    """
+    Regressions of results over a baseline, as messages.
+
+    A stage, the total or the peak memory regresses when it grows by more
+    than the threshold, a relative factor. The computations being
+    deterministic, the LMT result and the path cost of a case must not
+    change either.
+    """
+    before = {_case_key(r): r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    for result in results["results"]:
+        key = _case_key(result)
+        name = f"{result['image']} {result['graph_engine']}"
+        if key not in before:
+            continue
+        if "error" in result:
+            regressions.append(f"{name}: failed, {result['error']}")
+            continue
+        old = before[key]
+        timings = [
+            (stage, old["stages"][stage], result["stages"][stage]) for stage in STAGES
+        ]
+        timings.append(("total", old["total"], result["total"]))
+        for stage, old_time, new_time in timings:
+            if (
+                new_time > old_time * (1 + threshold)
+                and new_time - old_time > _MIN_SECONDS
+            ):
+                regressions.append(
+                    f"{name}: {stage} {old_time:.3f}s -> {new_time:.3f}s "
+                    f"(+{new_time / old_time - 1:.0%})"
+                )
+        if result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + threshold):
+            regressions.append(
+                f"{name}: peak memory {old['peak_rss_mb']:.0f} MB -> "
+                f"{result['peak_rss_mb']:.0f} MB"
+            )
+        if not np.isclose(result["lmt_result"], old["lmt_result"], rtol=1e-9):
+            regressions.append(
+                f"{name}: LMT {old['lmt_result']:.6f} -> {result['lmt_result']:.6f}"
+            )
+        if "path_cost" in old and not np.isclose(
+            result["path_cost"], old["path_cost"], rtol=1e-9
+        ):
+            regressions.append(
+                f"{name}: path cost {old['path_cost']:.3f} -> {result['path_cost']:.3f}"
+            )
+    return regressions
+
+
+def _case_key(result: dict) -> tuple:
+    return (result["graph_engine"], *_image_key(result))
+
+
+def _image_key(result: dict) -> tuple:
+    return (
+        result["image"],
+        result["stone_ratio"],
+        result["seed"],
+        result["calculate_LMT"],
+        result["interface_weight"],
+        result["boundary_margin"],
+    )
+
+
+def _format_result(result: dict) -> str:
+    name = f"{result['image']:>16} {result['graph_engine']:>15}"
+    if "error" in result:
+        return f"{name}  failed: {result['error']}"
+    stages = " ".join(f"{s}={result['stages'][s]:.3f}" for s in STAGES)
+    line = (
+        f"{name}  total={result['total']:.3f}s {stages} "
+        f"peak={result['peak_rss_mb']:.0f}MB lmt={result['lmt_result']:.4f}"
+    )
+    if "cost_excess" in result:
+        line += f" cost_excess={result['cost_excess']:+.2%}"
+    return line
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        import numba
+
+        numba_version = numba.__version__
+    except ImportError:
+        numba_version = None
+    return {
+        "date": datetime.now(UTC).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": numba_version,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the line minimum trace computation stage by stage."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmark")
+    run.add_argument("--sizes", type=int, nargs="*", default=list(DEFAULT_SIZES))
+    run.add_argument("--engines", nargs="+", default=list(DEFAULT_ENGINES))
+    run.add_argument(
+        "--no-example", action="store_true", help="skip data/example_slice.png"
+    )
+    run.add_argument("--stone-ratio", type=float, default=0.7)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--calculate-lmt", type=int, choices=[0, 1, 2], default=1)
+    run.add_argument("--interface-weight", type=float, default=0.5)
+    run.add_argument("--boundary-margin", type=int, default=5)
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--output", help="JSON file of the results, default stdout")
+
+    comparison = commands.add_parser("compare", help="compare two runs")
+    comparison.add_argument("baseline")
+    comparison.add_argument("results")
+    comparison.add_argument(
+        "--threshold", type=float, default=0.2, help="relative regression threshold"
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        cases = benchmark_cases(
+            sizes=args.sizes,
+            engines=args.engines,
+            example=not args.no_example,
+            stone_ratio=args.stone_ratio,
+            seed=args.seed,
+            calculate_LMT=args.calculate_lmt,
+            interface_weight=args.interface_weight,
+            boundary_margin=args.boundary_margin,
+            repeat=args.repeat,
+        )
+        output = json.dumps(run_benchmark(cases), indent=2)
+        if args.output:
+            Path(args.output).write_text(output)
+        else:
+            print(output)
+        return
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    results = json.loads(Path(args.results).read_text())
+    regressions = compare(baseline, results, args.threshold)
+    for regression in regressions:
+        print(regression)
+    if regressions:
+        sys.exit(1)
+    print("No regression")
+
+
+if __name__ == "__main__":
+    main()
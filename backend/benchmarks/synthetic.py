@@ -0,0 +1,126 @@
+"""
+Synthetic binary images of masonry walls, for benchmarks and tests.
+
+Stones are random polygons laid in courses with staggered joints, each one
+inside its own cell of the bond, so that the mortar network always connects
+the four edges of the wall. The polygons are scaled to reach the requested
+stone ratio, which is the fraction of stone pixels.
+"""
+
+from io import BytesIO
+from itertools import pairwise
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Largest scale of a stone in its cell, keeping a mortar joint between cells
+_MAX_SCALE = 0.98
+# Stone length over course height, on average
+_ASPECT = 1.8
+
+
+def synthetic_wall(
+    height: int,
+    width: int | None = None,
+    stone_ratio: float = 0.7,
+    courses: int = 10,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Binary image of a random wall, True for mortar and False for stone.
+
+    Parameters
+    ----------
+    height : int
+        Height of the image in pixels.
+    width : int, optional
+        Width of the image in pixels, default is a square image.
+    stone_ratio : float, default=0.7
+        Fraction of stone pixels, reached within about 0.5%.
+    courses : int, default=10
+        Number of courses of stones. The layout only depends on the seed
+        and on the number of courses, so that images of different sizes
+        show the same wall at different resolutions.
+    seed : int, default=0
+        Seed of the random layout.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean image of shape (height, width).
+    """
+    width = height if width is None else width
+    if not 0 < stone_ratio < 1:
+        raise ValueError("stone_ratio must be between 0 and 1")
+    rng = np.random.default_rng(seed)
+
+    # Stone outlines in the unit square, as offsets from their cell center
+    # relative to the half sizes of the cell
+    stones = []
+    course_heights = rng.uniform(0.7, 1.3, courses)
+    tops = np.concatenate(([0.0], np.cumsum(course_heights))) / course_heights.sum()
+    for top, bottom in pairwise(tops):
+        mean_length = _ASPECT * (bottom - top) * height / width
+        left = -rng.uniform(0, mean_length)
+        while left < 1:
+            right = left + rng.uniform(0.6, 1.4) * mean_length
+            stones.append(((left, top, right, bottom), _stone_outline(rng)))
+            left = right
+
+    def draw(scale: float) -> np.ndarray:
+        canvas = Image.new("1", (width, height), 1)
+        drawing = ImageDraw.Draw(canvas)
+        for (x0, y0, x1, y1), outline in stones:
+            center = np.array([(x0 + x1) / 2 * width, (y0 + y1) / 2 * height])
+            half = np.array([(x1 - x0) / 2 * width, (y1 - y0) / 2 * height])
+            vertices = center + scale * half * outline
+            drawing.polygon([tuple(v) for v in vertices.tolist()], fill=0)
+        return np.array(canvas, dtype=bool)
+
+    # The stone ratio grows with the scale, find it by bisection
+    low, high = 0.0, _MAX_SCALE
+    wall = draw(high)
+    if 1 - wall.mean() < stone_ratio:
+        raise ValueError(
+            f"stone_ratio {stone_ratio} is above the maximum of this layout, "
+            f"{1 - wall.mean():.3f}"
+        )
+    for _ in range(20):
+        scale = (low + high) / 2
+        wall = draw(scale)
+        ratio = 1 - wall.mean()
+        if abs(ratio - stone_ratio) < 0.005:
+            break
+        if ratio < stone_ratio:
+            low = scale
+        else:
+            high = scale
+    return wall
+
+
+def synthetic_wall_png(*args, **kwargs) -> bytes:
+    """PNG file of a `synthetic_wall`, as a mode "1" image."""
+    buffer = BytesIO()
+    Image.fromarray(synthetic_wall(*args, **kwargs)).save(buffer, format="png")
+    return buffer.getvalue()
+
+
+def _stone_outline(rng: np.random.Generator) -> np.ndarray:
+    """
+    Random octagon in the square [-1, 1]², like a rough block.
+
+    Each side of the square is moved inwards by up to 15% and each corner
+    is cut at random lengths along its two sides.
+    """
+    # Sides right, bottom, left, top and their position along their normal
+    normals = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]])
+    positions = rng.uniform(0.85, 1.0, 4)
+    vertices = []
+    for k in range(4):
+        following = (k + 1) % 4
+        corner = normals[k] * positions[k] + normals[following] * positions[following]
+        # Cut lengths towards the start of this side and the next side
+        back, forward = rng.uniform(0.05, 0.4, 2)
+        vertices.append(corner - back * normals[following])
+        vertices.append(corner - forward * normals[k])
+    return np.array(vertices)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scipy import ndimage
+
+
+def test_synthetic_wall():
+    from benchmarks.synthetic import synthetic_wall
+
+    wall = synthetic_wall(300, 400, stone_ratio=0.6, seed=3)
+    assert wall.shape == (300, 400) and wall.dtype == bool
+    assert 1 - wall.mean() == pytest.approx(0.6, abs=0.005)
+    # A single mortar network, touching the four edges
+    labels, count = ndimage.label(wall, np.ones((3, 3)))
+    assert count == 1
+    assert wall[0].any() and wall[-1].any() and wall[:, 0].any() and wall[:, -1].any()
+
+    assert np.array_equal(wall, synthetic_wall(300, 400, stone_ratio=0.6, seed=3))
+    assert not np.array_equal(wall, synthetic_wall(300, 400, stone_ratio=0.6, seed=4))
+    with pytest.raises(ValueError):
+        synthetic_wall(100, stone_ratio=0.99)
+
+
+def test_benchmark_case_and_compare(monkeypatch):
+    from api.services.artifact_cache import artifact_cache
+    from benchmarks.lmt import STAGES, benchmark_cases, compare, run_case
+
+    # Cases run in their own process, which turns the artifact cache off
+    monkeypatch.setattr(artifact_cache, "path", None)
+    cases = benchmark_cases(sizes=[120], engines=["csr"], example=False, repeat=1)
+    assert len(cases) == 1
+    result = run_case(cases[0])
+    assert set(result["stages"]) == set(STAGES)
+    assert result["shape"] == [120, 120]
+    assert result["total"] == pytest.approx(sum(result["stages"].values()))
+    assert result["peak_rss_mb"] >= result["baseline_rss_mb"] > 0
+    assert result["lmt_result"] >= 1.0
+    assert result["path_cost"] > 0
+
+    baseline = {"results": [result]}
+    assert compare(baseline, {"results": [result]}) == []
+    slower = {**result, "stages": {**result["stages"], "search": 10.0}}
+    slower["total"] = sum(slower["stages"].values())
+    regressions = compare(baseline, {"results": [slower]})
+    assert len(regressions) == 2
+    assert "search" in regressions[0] and "total" in regressions[1]
+    changed = {**result, "lmt_result": result["lmt_result"] + 0.1}
+    assert "LMT" in compare(baseline, {"results": [changed]})[0]
+    changed = {**result, "path_cost": result["path_cost"] + 0.1}
+    assert "path cost" in compare(baseline, {"results": [changed]})[0]
+
+    # Cost of the paths on the full resolution image, the exact one the lowest
+    cases = benchmark_cases(
+        sizes=[120], engines=["multiresolution"], example=False, repeat=1
+    )
+    assert run_case(cases[0])["path_cost"] >= result["path_cost"] - 1e-9
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+
+def test_job_queue():
+    from api.services.jobs import JobQueue, JobQueueFullError
+    from api.services.timing import add_timings, timed, timed_call
+
+    async def scenario() -> None:
+        queue = JobQueue(workers=1, max_queued=1, result_ttl=60)
+        await queue.start()
+        release = asyncio.Event()
+
+        def compute() -> str:
+            with timed("compute"):
+                return "blocked"
+
+        async def blocked() -> str:
+            with timed("wait"):
+                await release.wait()
+            # As returned by a timed call in the process pool
+            result, timings = timed_call(compute)
+            add_timings(timings)
+            return result
+
+        async def failing() -> None:
+            raise ValueError("boom")
+
+        first = queue.submit(blocked)
+        await asyncio.sleep(0)
+        assert queue.get(first.id).state == "running"
+
+        second = queue.submit(failing)
+        assert second.state == "queued"
+        with pytest.raises(JobQueueFullError):
+            queue.submit(blocked)
+
+        release.set()
+        while queue.get(second.id).state in ("queued", "running"):
+            await asyncio.sleep(0)
+
+        job = queue.get(first.id)
+        assert job.state == "done" and job.result == "blocked"
+        status = job.status()
+        assert set(status.timings) == {"queued", "running"}
+        assert set(status.stage_timings["stages"]) == {"wait", "compute", "pool"}
+        assert queue.get(second.id).state == "failed"
+        assert queue.get(second.id).error == "boom"
+        assert queue.get("unknown") is None
+        await queue.stop()
+
+    asyncio.run(scenario())
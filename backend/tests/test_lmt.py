@@ -1,3 +1,5 @@
+import os
+
 import networkx as nx
 import numpy as np
 import pytest
@@ -17,6 +19,13 @@ def image() -> np.ndarray:
     )
 
 
+@pytest.fixture(autouse=True)
+def artifact_cache_path(tmp_path, monkeypatch):
+    from api.services.artifact_cache import artifact_cache
+
+    monkeypatch.setattr(artifact_cache, "path", tmp_path / "artifacts")
+
+
 def test_get_connectivity_matrix():
     from api.services.bwgraph import _get_connectivity_matrix
 
@@ -65,6 +74,15 @@ def test_is_interface(image: np.ndarray):
     np.testing.assert_array_equal(interfaces, expected_interfaces)
 
 
+def test_interface_mask(image: np.ndarray):
+    from api.services.bwgraph import _is_interface, interface_mask
+
+    sz = image.shape
+    coords = np.unravel_index(np.arange(image.size), sz)
+    expected = _is_interface(image, coords, sz, len(sz)).reshape(sz)
+    np.testing.assert_array_equal(interface_mask(image), expected)
+
+
 def test_bwgraph(image: np.ndarray):
     from api.services.bwgraph import bwgraph
 
@@ -88,3 +106,724 @@ def test_shortest_path(image: np.ndarray):
     path_nodes = nx.shortest_path(G, source=source, target=target, weight="weight")
     expected_path_nodes = [3, 10, 16, 22, 30, 38]
     assert np.array_equal(path_nodes, expected_path_nodes)
+
+
+def test_shortest_path_csr(image: np.ndarray):
+    from api.services.bwgraph import bwgraph
+    from api.services.line_minimum_trace import _shortest_path
+
+    sz = image.shape
+    source = int(np.ravel_multi_index((0, 3), sz))
+    target = int(np.ravel_multi_index((5, 3), sz))
+    image = image.astype(bool)
+    G = bwgraph(image, interface_weight=0.1)
+
+    # Equal-cost paths may be broken differently, compare costs
+    path_nodes = _shortest_path(image, [source], [target], 0.1, "csr")
+    expected_path_nodes = _shortest_path(image, [source], [target], 0.1, "networkx")
+    assert path_nodes[0] == source and path_nodes[-1] == target
+    assert nx.path_weight(G, path_nodes, "weight") == pytest.approx(
+        nx.path_weight(G, expected_path_nodes, "weight")
+    )
+
+
+@pytest.mark.parametrize(
+    "graph_engine, search",
+    [("networkx", "astar"), ("grid", "astar"), ("grid", "bidirectional_astar")],
+)
+@pytest.mark.parametrize("interface_weight", [0.1, 1.0, 2.0])
+def test_shortest_path_search(
+    image: np.ndarray, graph_engine: str, search: str, interface_weight: float
+):
+    from api.services.bwgraph import bwgraph
+    from api.services.line_minimum_trace import _shortest_path
+
+    image = image.astype(bool)
+    G = bwgraph(image, interface_weight=interface_weight)
+    for start, end in [((0, 3), (5, 3)), ((2, 1), (3, 6)), ((5, 0), (0, 6))]:
+        source = int(np.ravel_multi_index(start, image.shape))
+        target = int(np.ravel_multi_index(end, image.shape))
+        expected_path_nodes = nx.shortest_path(G, source, target, weight="weight")
+
+        path_nodes = _shortest_path(
+            image, [source], [target], interface_weight, graph_engine, search=search
+        )
+        assert path_nodes[0] == source and path_nodes[-1] == target
+        assert nx.path_weight(G, path_nodes, "weight") == pytest.approx(
+            nx.path_weight(G, expected_path_nodes, "weight")
+        )
+
+
+@pytest.mark.parametrize("interface_weight", [0.1, 1.0])
+def test_grid_shortest_path(image: np.ndarray, interface_weight: float):
+    from api.services.bwgraph import bwgraph
+    from api.services.grid_dijkstra import grid_shortest_path
+
+    sz = image.shape
+    source = int(np.ravel_multi_index((0, 3), sz))
+    target = int(np.ravel_multi_index((5, 3), sz))
+    G = bwgraph(image, interface_weight=interface_weight)
+    expected_path_nodes = nx.shortest_path(G, source, target, weight="weight")
+
+    for heuristic in [False, True]:
+        path_nodes = grid_shortest_path(
+            image, [source], [target], interface_weight, heuristic=heuristic
+        )
+        assert path_nodes[0] == source and path_nodes[-1] == target
+        assert nx.path_weight(G, path_nodes, "weight") == pytest.approx(
+            nx.path_weight(G, expected_path_nodes, "weight")
+        )
+
+
+@pytest.mark.parametrize("kernel", ["fallback", "python", "numba"])
+@pytest.mark.parametrize("interface_weight", [0.1, 1.0, 2.0])
+def test_grid_dijkstra_kernel(
+    image: np.ndarray, kernel: str, interface_weight: float, monkeypatch
+):
+    from api.services import grid_dijkstra
+    from api.services.bwgraph import bwgraph
+    from api.services.grid_dijkstra import grid_shortest_path, grid_shortest_path_tree
+
+    if kernel == "numba":
+        pytest.importorskip("numba")
+    else:
+        # The kernels run as plain Python check their logic without numba
+        python = kernel == "python"
+        monkeypatch.setattr(
+            grid_dijkstra,
+            "_search_kernel",
+            grid_dijkstra._grid_search if python else None,
+        )
+        monkeypatch.setattr(
+            grid_dijkstra,
+            "_bidirectional_kernel",
+            grid_dijkstra._bidirectional if python else None,
+        )
+
+    rng = np.random.default_rng(1)
+    slices = [image.astype(bool)]
+    for _ in range(3):
+        synthetic = np.ones((40, 50), dtype=bool)
+        for i, j in zip(rng.integers(0, 40, 15), rng.integers(0, 50, 15)):
+            synthetic[i : i + 6, j : j + 9] = False
+        slices.append(synthetic)
+
+    for bw in slices:
+        G = bwgraph(bw, interface_weight=interface_weight)
+        mortar = np.flatnonzero(bw)
+        sources = mortar[: bw.shape[1] // 2].tolist()
+        targets = mortar[-bw.shape[1] // 2 :].tolist()
+        lengths, _ = nx.multi_source_dijkstra(G, sources, weight="weight")
+        expected_cost = min(lengths.get(t, np.inf) for t in targets)
+
+        path_nodes = grid_shortest_path(bw, sources, targets, interface_weight)
+        if np.isinf(expected_cost):
+            assert path_nodes is None
+            continue
+        assert path_nodes[0] in sources and path_nodes[-1] in targets
+        assert nx.path_weight(G, path_nodes, "weight") == pytest.approx(expected_cost)
+
+        lengths = nx.single_source_dijkstra_path_length(G, sources[0])
+        target = max(lengths, key=lengths.get)
+        for bidirectional in [False, True]:
+            path_nodes = grid_shortest_path(
+                bw,
+                sources[:1],
+                [target],
+                interface_weight,
+                heuristic=True,
+                bidirectional=bidirectional,
+            )
+            assert path_nodes[0] == sources[0] and path_nodes[-1] == target
+            assert nx.path_weight(G, path_nodes, "weight") == pytest.approx(
+                lengths[target]
+            )
+
+        paths = grid_shortest_path_tree(bw, sources[0], targets, interface_weight)
+        for target, path_nodes in zip(targets, paths):
+            if target not in lengths:
+                assert path_nodes is None
+                continue
+            assert nx.path_weight(G, path_nodes, "weight") == pytest.approx(
+                lengths[target]
+            )
+
+
+@pytest.mark.parametrize("graph_engine", ["networkx", "csr", "grid"])
+def test_shortest_path_edge_to_edge(image: np.ndarray, graph_engine: str):
+    from api.services.bwgraph import bwgraph
+    from api.services.line_minimum_trace import _boundary_nodes, _shortest_path
+
+    image = image.astype(bool)
+    sources, targets = _boundary_nodes(image, 0)
+    assert sources == list(range(7))
+    assert targets == list(range(35, 42))
+
+    path_nodes = _shortest_path(image, sources, targets, 1.0, graph_engine)
+    assert path_nodes[0] in sources and path_nodes[-1] in targets
+    # Any straight vertical line avoiding the stones
+    G = bwgraph(image)
+    assert nx.path_weight(G, path_nodes, "weight") == pytest.approx(5.0)
+
+
+@pytest.mark.parametrize("graph_engine", ["networkx", "csr", "grid"])
+def test_shortest_path_tree(image: np.ndarray, graph_engine: str):
+    from api.services.bwgraph import bwgraph
+    from api.services.line_minimum_trace import _shortest_path, _shortest_path_tree
+
+    image = image.astype(bool)
+    source = 3
+    targets = [3, 38, 41, 35]
+    G = bwgraph(image, interface_weight=0.1)
+
+    paths = _shortest_path_tree(image, source, targets, 0.1, graph_engine)
+    assert len(paths) == len(targets)
+    assert paths[0] == [source]
+    for target, path_nodes in zip(targets, paths):
+        expected = _shortest_path(image, [source], [target], 0.1, "networkx")
+        assert path_nodes[0] == source and path_nodes[-1] == target
+        assert nx.path_weight(G, path_nodes, "weight") == pytest.approx(
+            nx.path_weight(G, expected, "weight")
+        )
+
+
+def test_calculate_line_minimum_trace_batch(image: np.ndarray, tmp_path):
+    from api.services.line_minimum_trace import (
+        calculate_line_minimum_trace,
+        calculate_line_minimum_trace_batch,
+    )
+    from PIL import Image
+
+    image_file_path = str(tmp_path / "image.png")
+    Image.fromarray((image * 255).astype(np.uint8)).save(image_file_path)
+    queries = [
+        {"start_coords": [3, 0], "end_coords": [3, 5], "calculate_LMT": 0},
+        {"start_coords": [3, 0], "end_coords": [6, 5], "calculate_LMT": 2},
+        {"start_coords": [0, 2], "end_coords": [6, 3], "calculate_LMT": 1},
+    ]
+
+    result = calculate_line_minimum_trace_batch(
+        image_file_path, queries, interface_weight=0.1, boundary_margin=0
+    )
+    assert result["success"]
+    assert len(result["results"]) == len(queries)
+    for query, query_result in zip(queries, result["results"]):
+        expected = calculate_line_minimum_trace(
+            image_file_path,
+            **query,
+            interface_weight=0.1,
+            boundary_margin=0,
+            return_plot=False,
+        )
+        assert query_result["success"]
+        assert query_result["lmt_type"] == expected["lmt_type"]
+        assert query_result["start_point_used"] == expected["start_point_used"]
+        assert query_result["end_point_used"] == expected["end_point_used"]
+        assert query_result["total_length"] == pytest.approx(expected["total_length"])
+
+
+@pytest.mark.parametrize("graph_engine", ["csr", "grid"])
+@pytest.mark.parametrize("edge_to_edge", [False, True])
+def test_calculate_line_minimum_trace_sweep(
+    image: np.ndarray, graph_engine: str, edge_to_edge: bool, tmp_path
+):
+    from api.services.line_minimum_trace import (
+        calculate_line_minimum_trace,
+        calculate_line_minimum_trace_sweep,
+    )
+    from PIL import Image
+
+    image_file_path = str(tmp_path / "image.png")
+    Image.fromarray((image * 255).astype(np.uint8)).save(image_file_path)
+    interface_weights = [0.1, 0.5, 1.0, 2.0]
+    kwargs = {
+        "start_coords": None if edge_to_edge else [3, 0],
+        "end_coords": None if edge_to_edge else [3, 5],
+        "calculate_LMT": 0,
+        "boundary_margin": 0,
+        "graph_engine": graph_engine,
+        "edge_to_edge": edge_to_edge,
+    }
+
+    result = calculate_line_minimum_trace_sweep(
+        image_file_path, interface_weights, **kwargs
+    )
+    assert result["success"]
+    assert [r["interface_weight"] for r in result["results"]] == interface_weights
+    for interface_weight, sweep_result in zip(interface_weights, result["results"]):
+        expected = calculate_line_minimum_trace(
+            image_file_path,
+            interface_weight=interface_weight,
+            return_plot=False,
+            **kwargs,
+        )
+        assert sweep_result["success"]
+        assert sweep_result["start_point_used"] == expected["start_point_used"]
+        assert sweep_result["end_point_used"] == expected["end_point_used"]
+        assert sweep_result["path_coordinates"] == expected["path_coordinates"]
+        assert sweep_result["lmt_result"] == pytest.approx(expected["lmt_result"])
+
+    result = calculate_line_minimum_trace_sweep(image_file_path, [0.5, 0.0], **kwargs)
+    assert not result["success"]
+
+
+def test_prepare_slice(image: np.ndarray):
+    from api.services.bwgraph import interface_mask
+    from api.services.prepared_slice import prepare_slice
+
+    image = image.astype(bool)
+    image[:, 5] = False  # Cut off the two rightmost columns
+    prepared = prepare_slice(image)
+
+    np.testing.assert_array_equal(prepared.interface, image & interface_mask(image))
+    assert prepared.snap([0, 0]) == [0, 0]
+    assert prepared.snap([3, 3]) == [4, 3]
+    assert prepared.snap([0, 5]) in ([0, 4], [0, 6])
+    assert prepared.connected(0, 4)
+    assert not prepared.connected(0, 6)
+    assert not prepared.connected(5, 5)
+    assert prepared.reachable([0, 6], [4, 35]) == ([0], [4, 35])
+
+
+@pytest.mark.parametrize("kernel", ["python", "numba"])
+@pytest.mark.parametrize("interface_weight", [0.3, 1.0])
+def test_volume_shortest_path(
+    interface_weight: float, kernel: str, tmp_path, monkeypatch
+):
+    from api.services import volume_lmt
+    from api.services.bwgraph import bwgraph
+    from api.services.volume_lmt import ChunkedVolume, SliceStack, VolumeBudgetError
+    from PIL import Image
+
+    if kernel == "python":
+        monkeypatch.setattr(volume_lmt, "_astar_kernel", None)
+    elif volume_lmt._astar_kernel is None:
+        pytest.skip("numba is not installed")
+
+    volume = np.random.default_rng(0).random((6, 10, 12)) > 0.35
+    for i, section in enumerate(volume):
+        Image.fromarray(section.astype(np.uint8) * 255).save(tmp_path / f"{i}.png")
+    stack = SliceStack(sorted(tmp_path.iterdir()), cache_bytes=40)
+    np.testing.assert_array_equal(stack[1:4, 2:5, :], volume[1:4, 2:5, :])
+    np.testing.assert_array_equal(stack[2:3, :, 3:11], volume[2:3, :, 3:11])
+    # Two slices of 10 rows of 2 packed bytes fit in the cache
+    stack[1:3, :, :]
+    assert stack.decoded == 4
+
+    G = bwgraph(volume, interface_weight=interface_weight)
+
+    # Room for all the 18 chunks, then for 8 of them only
+    for memory_budget in (10**9, 8 * 12 * 4**3):
+        chunked = ChunkedVolume(
+            stack,
+            calculate_LMT=2,
+            boundary_margin=0,
+            chunk_size=4,
+            memory_budget=memory_budget,
+        )
+        start = chunked.snap([0, 0, 0])
+        end = chunked.snap([5, 9, 11])
+        path = chunked.shortest_path(start, end, interface_weight)
+        assert path[0] == start and path[-1] == end
+        assert (chunked.chunks_spilled > 0) == (memory_budget < 10**9)
+
+        path_nodes = [int(np.ravel_multi_index(p, volume.shape)) for p in path]
+        assert nx.path_weight(G, path_nodes, "weight") == pytest.approx(
+            nx.shortest_path_length(G, path_nodes[0], path_nodes[-1], weight="weight")
+        )
+
+    # Room for a single chunk only
+    with pytest.raises(VolumeBudgetError):
+        ChunkedVolume(
+            volume, calculate_LMT=2, boundary_margin=0, chunk_size=4, memory_budget=1
+        )
+
+
+def test_wall_lmt(image: np.ndarray, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from api.services.wall_lmt import average_lmt, iter_wall_lmt, slice_sources
+    from PIL import Image
+
+    for i in range(3):
+        Image.fromarray((np.roll(image, i, axis=1) * 255).astype(np.uint8)).save(
+            tmp_path / f"slice_{i}.png"
+        )
+    sources = slice_sources(str(tmp_path))
+    assert [name for name, _ in sources] == [f"slice_{i}.png" for i in range(3)]
+
+    with ThreadPoolExecutor(2) as executor:
+        results = list(
+            iter_wall_lmt(
+                executor,
+                sources,
+                [0, 1],
+                real_length=7.0,
+                real_height=6.0,
+                boundary_margin=0,
+            )
+        )
+    assert len(results) == 6 and all(r["success"] for r in results)
+
+    averages = average_lmt(results)
+    assert averages["Average vertical LMT"] == pytest.approx(1.0)
+    assert averages["Average horizontal LMT"] == pytest.approx(1.0)
+    assert averages["Average LMT for wall leaf connection"] is None
+
+
+def test_multiresolution_shortest_path():
+    from api.services.bwgraph import bwgraph
+    from api.services.grid_dijkstra import grid_shortest_path, path_cost
+    from api.services.multiresolution import _downsample, multiresolution_shortest_path
+
+    rng = np.random.default_rng(0)
+    image = np.ones((130, 150), dtype=bool)
+    for i, j in zip(rng.integers(0, 130, 60), rng.integers(0, 150, 60)):
+        image[i : i + 12, j : j + 18] = False
+    image[0, :] = image[-1, :] = True
+
+    coarse = _downsample(image, 2)
+    assert coarse.shape == (65, 75)
+    assert not np.any(image & ~np.repeat(np.repeat(coarse, 2, 0), 2, 1))
+
+    sources = list(range(150))
+    targets = list(range(image.size - 150, image.size))
+    G = bwgraph(image, interface_weight=0.5)
+    path_nodes = multiresolution_shortest_path(image, sources, targets, 0.5)
+    expected = grid_shortest_path(image, sources, targets, 0.5)
+    assert path_nodes[0] in sources and path_nodes[-1] in targets
+    # Within max_gap of the estimate, optimal here
+    cost = nx.path_weight(G, path_nodes, "weight")
+    expected_cost = nx.path_weight(G, expected, "weight")
+    assert cost == pytest.approx(expected_cost)
+    assert path_cost(image, path_nodes, 0.5) == pytest.approx(cost)
+    assert path_cost(image, expected, 0.5) == pytest.approx(expected_cost)
+
+    # Beyond max_gap, the full image is searched
+    path_nodes = multiresolution_shortest_path(
+        image, sources, targets, 0.5, max_levels=3, max_gap=1.0
+    )
+    assert path_cost(image, path_nodes, 0.5) > 1.05 * expected_cost
+    for max_levels in (3, 4):
+        path_nodes = multiresolution_shortest_path(
+            image, sources, targets, 0.5, max_levels=max_levels, max_gap=0.0
+        )
+        assert path_cost(image, path_nodes, 0.5) == pytest.approx(expected_cost)
+
+
+def test_render_overlay(image: np.ndarray):
+    from io import BytesIO
+
+    from api.services.overlay import (
+        END_COLOR,
+        PATH_COLOR,
+        START_COLOR,
+        render_overlay_png,
+        render_overlay_svg,
+    )
+    from PIL import Image
+
+    image = np.pad(image.astype(bool), 100, constant_values=True)
+    pixel_coordinates = [[103, y] for y in range(100, 106)] + [
+        [103 + k, 105 + k] for k in range(1, 6)
+    ]
+    start_point, end_point = [100, 103], [110, 108]
+
+    png = render_overlay_png(image, pixel_coordinates, start_point, end_point)
+    rgb = np.array(Image.open(BytesIO(png)).convert("RGB"))
+    assert rgb.shape == (*image.shape, 3)
+    assert tuple(rgb[105, 103]) == PATH_COLOR
+    assert tuple(rgb[start_point[0], start_point[1]]) == START_COLOR
+    assert tuple(rgb[end_point[0], end_point[1]]) == END_COLOR
+    assert tuple(rgb[0, 0]) == (255, 255, 255)
+    assert tuple(rgb[103, 104]) == (0, 0, 0)
+
+    svg = render_overlay_svg(
+        image.shape[1], image.shape[0], pixel_coordinates, start_point, end_point
+    )
+    # Straight runs are merged
+    assert 'points="103,100 103,105 108,110"' in svg
+
+
+def test_store_overlay(image: np.ndarray, tmp_path, monkeypatch):
+    from api.services.artifact_cache import artifact_cache
+    from api.services.line_minimum_trace import calculate_line_minimum_trace
+    from api.services.overlay import (
+        get_overlay,
+        render_overlay_png,
+        render_stored_overlay,
+    )
+    from PIL import Image
+
+    image_file_path = str(tmp_path / "image.png")
+    Image.fromarray((image * 255).astype(np.uint8)).save(image_file_path)
+    kwargs = {
+        "start_coords": [0, 0],
+        "end_coords": [6, 5],
+        "calculate_LMT": 2,
+        "boundary_margin": 0,
+        "return_plot": False,
+        "keep_overlay": True,
+    }
+
+    monkeypatch.setattr(artifact_cache, "path", None)
+    assert "result_id" not in calculate_line_minimum_trace(image_file_path, **kwargs)
+
+    monkeypatch.setattr(artifact_cache, "path", tmp_path / "artifacts")
+    result = calculate_line_minimum_trace(image_file_path, **kwargs)
+    overlay = get_overlay(result["result_id"])
+    np.testing.assert_array_equal(overlay.image, image.astype(bool))
+    assert (overlay.height, overlay.width) == image.shape
+    assert overlay.start_point == result["start_point_used"]
+    assert overlay.end_point == result["end_point_used"]
+    assert render_stored_overlay(result["result_id"]) == render_overlay_png(
+        overlay.image,
+        result["path_coordinates"]["pixel_coordinates"],
+        overlay.start_point,
+        overlay.end_point,
+    )
+    assert get_overlay("0" * 32) is None
+    assert get_overlay("../" + result["result_id"]) is None
+
+
+@pytest.mark.parametrize("path_encoding", ["full", "chain", "npy", "simplified"])
+def test_path_encoding(image: np.ndarray, path_encoding: str, tmp_path):
+    from api.services.line_minimum_trace import calculate_line_minimum_trace
+    from api.services.path_encoding import decode_path, simplify
+    from PIL import Image
+
+    image_file_path = str(tmp_path / "image.png")
+    Image.fromarray((image * 255).astype(np.uint8)).save(image_file_path)
+    kwargs = {
+        "start_coords": [0, 0],
+        "end_coords": [6, 5],
+        "real_length": 14.0,
+        "real_height": 12.0,
+        "calculate_LMT": 2,
+        "interface_weight": 0.1,
+        "boundary_margin": 0,
+        "return_plot": False,
+    }
+    full = calculate_line_minimum_trace(image_file_path, **kwargs)
+    result = calculate_line_minimum_trace(
+        image_file_path, **kwargs, path_encoding=path_encoding
+    )
+    assert result["success"]
+    assert result["lmt_result"] == full["lmt_result"]
+
+    pixels = np.array(full["path_coordinates"]["pixel_coordinates"])
+    vertices = decode_path(result["path_coordinates"], result["scale_factors"])
+    if path_encoding == "simplified":
+        assert vertices.tolist() == pixels[simplify(pixels * [2, 2], 2.0)].tolist()
+        assert vertices[0].tolist() == pixels[0].tolist()
+        assert vertices[-1].tolist() == pixels[-1].tolist()
+    else:
+        assert vertices.tolist() == pixels.tolist()
+
+
+def test_simplify():
+    from api.services.path_encoding import simplify
+
+    points = np.array([[0, 0], [1, 0.1], [2, -0.1], [3, 0], [3, 1], [3, 2], [4, 5]])
+    assert simplify(points, 0.5).tolist() == [1, 0, 0, 1, 0, 0, 1]
+    assert simplify(points, 0.05).tolist() == [1, 1, 1, 1, 0, 1, 1]
+    assert simplify(points[:1], 1.0).tolist() == [True]
+
+
+def test_load_binary_image(image: np.ndarray, tmp_path):
+    from io import BytesIO
+
+    from api.services.line_minimum_trace import (
+        _load_binary_image,
+        calculate_line_minimum_trace,
+    )
+    from PIL import Image
+
+    bw = image.astype(bool)
+    gray = (image * 255).astype(np.uint8)
+
+    def saved(save) -> bytes:
+        buffer = BytesIO()
+        save(buffer)
+        return buffer.getvalue()
+
+    sources = {
+        "png": saved(lambda f: Image.fromarray(gray).save(f, format="png")),
+        "1-bit png": saved(lambda f: Image.fromarray(bw).save(f, format="png")),
+        "npy": saved(lambda f: np.save(f, bw)),
+        "npz": saved(
+            lambda f: np.savez(f, packed=np.packbits(bw, axis=-1), shape=bw.shape)
+        ),
+    }
+    path = tmp_path / "image.png"
+    path.write_bytes(sources["png"])
+
+    for source in [
+        str(path),
+        gray,
+        bw,
+        *sources.values(),
+        *(BytesIO(content) for content in sources.values()),
+    ]:
+        loaded = _load_binary_image(source)
+        assert loaded.dtype == bool
+        assert np.array_equal(loaded, bw)
+
+    # Arrays are not modified by the boundary conditions
+    result = calculate_line_minimum_trace(
+        bw, [3, 0], [3, 5], calculate_LMT=0, return_plot=False
+    )
+    assert result["success"]
+    assert np.array_equal(bw, image.astype(bool))
+
+
+@pytest.mark.parametrize("shape", [(9, 11), (5, 6, 7)])
+def test_bwgraph_edges(shape: tuple[int, ...]):
+    from api.services.bwgraph import (
+        _get_base_offsets,
+        _get_connectivity_matrix,
+        bwgraph_edges,
+        interface_mask,
+    )
+
+    rng = np.random.default_rng(0)
+    bw = rng.random(shape) > 0.3
+    source, target, weights = bwgraph_edges(bw, interface_weight=0.5)
+    assert source.dtype == np.uint32 and weights.dtype == np.float32
+
+    # Every pair of mortar neighbors once, ordered by first end pixel
+    base = _get_base_offsets(
+        _get_connectivity_matrix(3 ** len(shape) - 1, len(shape)), len(shape)
+    )
+    expected = []
+    for pixel in np.argwhere(bw):
+        for offset in base:
+            neighbor = pixel + offset
+            if np.all((neighbor >= 0) & (neighbor < shape)) and bw[tuple(neighbor)]:
+                expected.append(
+                    (
+                        np.ravel_multi_index(tuple(pixel), shape),
+                        np.ravel_multi_index(tuple(neighbor), shape),
+                        np.linalg.norm(offset),
+                    )
+                )
+    expected = np.array(expected)
+    np.testing.assert_array_equal(source, expected[:, 0])
+    np.testing.assert_array_equal(target, expected[:, 1])
+    interface = interface_mask(bw).ravel()
+    factors = np.where(interface[source] | interface[target], 0.5, 1.0)
+    np.testing.assert_allclose(weights, expected[:, 2] * factors, rtol=1e-6)
+
+
+def test_artifact_cache(tmp_path):
+    from api.services.artifact_cache import ArtifactCache, array_key
+
+    bw = np.eye(5, dtype=bool)
+    assert array_key(bw, 1.0) == array_key(bw.copy(), 1.0)
+    assert array_key(bw, 1.0) != array_key(bw, 0.5)
+    assert array_key(bw) != array_key(bw.astype(np.uint8))
+
+    arrays = {"a": np.arange(1000, dtype=np.int64), "b": bw}
+    cache = ArtifactCache(str(tmp_path), max_bytes=20_000)
+    hits, misses = cache.stats()["hits"], cache.stats()["misses"]
+    assert cache.get("x") is None
+    assert cache.get_or_create("x", lambda: arrays) is arrays
+
+    cached = cache.get("x")
+    assert isinstance(cached["a"], np.memmap) and not cached["a"].flags.writeable
+    np.testing.assert_array_equal(cached["a"], arrays["a"])
+    np.testing.assert_array_equal(cached["b"], arrays["b"])
+    stats = cache.stats()
+    assert (stats["hits"] - hits, stats["misses"] - misses) == (1, 2)
+    assert stats["entries"] == 1
+
+    # The least recently used entry is evicted above the byte budget
+    cache.put("y", arrays)
+    cache.get("x")
+    os.utime(tmp_path / "y", (0, 0))
+    cache.put("z", arrays)
+    assert cache.get("y") is None
+    assert cache.get("x") is not None and cache.get("z") is not None
+    assert cache.stats()["bytes"] <= 20_000
+    # Evicted entries are renamed out of place before being removed
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["x", "z"]
+
+    # Entries missing any of their arrays, being removed, are misses
+    (tmp_path / "z" / "b.npy").unlink()
+    assert cache.get("z") is None
+    cache.put("empty", {})
+    assert cache.get("empty") == {}
+
+
+def test_stage_timings(tmp_path):
+    from api.services.line_minimum_trace import calculate_line_minimum_trace
+    from api.services.timing import (
+        TimingMetrics,
+        add_timings,
+        collect_timings,
+        server_timing,
+        timed,
+        timed_call,
+    )
+    from PIL import Image
+
+    # Nested stages only count their own time
+    with collect_timings() as timings:
+        with timed("outer"):
+            with timed("inner"):
+                pass
+            with timed("inner"):
+                pass
+    assert set(timings.stages) == {"outer", "inner"}
+    # Added timings are nested in the running stage
+    with collect_timings() as added:
+        with timed("outer"):
+            add_timings({"stages": {"pool": 2.0}, "cache": {"graph": True}})
+    assert added.stages["pool"] == 2.0 and added.stages["outer"] == 0.0
+    assert added.cache == {"graph": True}
+    with timed("ignored"):
+        pass
+
+    rng = np.random.default_rng(0)
+    image = np.ones((60, 80), dtype=bool)
+    image[rng.integers(0, 60, 40), rng.integers(0, 80, 40)] = False
+    image_path = str(tmp_path / "slice.png")
+    Image.fromarray(image).save(image_path)
+
+    for hit in [False, True]:
+        result, timings = timed_call(
+            calculate_line_minimum_trace,
+            image_path,
+            real_length=80,
+            real_height=60,
+            calculate_LMT=1,
+            return_plot=True,
+            graph_engine="csr",
+            edge_to_edge=True,
+        )
+        assert result["success"]
+        assert set(timings["stages"]) == {
+            "decode",
+            "boundary",
+            "graph",
+            "search",
+            "serialization",
+            "plot",
+        }
+        assert timings["cache"]["graph"] is hit
+        assert timings["cache"]["prepared_slice"] is hit
+
+    header = server_timing(timings, total=1.5)
+    assert header.startswith("decode;dur=")
+    assert 'cache-graph;desc="hit"' in header
+    assert header.endswith("total;dur=1500.0")
+
+    metrics = TimingMetrics()
+    metrics.record("line", timings, 1.0)
+    metrics.record("line", {"stages": {"decode": 3.0}, "cache": {"graph": False}}, 5.0)
+    line = metrics.snapshot()["line"]
+    assert line["requests"] == 2
+    assert line["total"] == {"count": 2, "total": 6.0, "max": 5.0, "mean": 3.0}
+    assert line["stages"]["decode"]["max"] == 3.0
+    assert line["stages"]["plot"]["count"] == 1
+    assert line["cache"]["graph"] == {"hits": 1, "misses": 1}
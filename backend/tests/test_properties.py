@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+
+import numpy as np
+import pytest
+
+CSV = b"""Sr.No,Wall ID,Ratio,Leaf LMT,Note,Not Fulfill (l<20 cm) [%]
+1,OC01,0.5,1.2,a,10
+2,OC02,,-,,35
+3,OM01,0.25,1.5,b,
+4,BR01,1.0,-,a,20
+"""
+
+
+@pytest.fixture(autouse=True)
+def artifact_cache_path(tmp_path, monkeypatch):
+    from api.services.artifact_cache import artifact_cache
+
+    monkeypatch.setattr(artifact_cache, "path", tmp_path / "artifacts")
+
+
+def test_property_store():
+    from api.services.artifact_cache import artifact_cache
+    from api.services.property_store import build_property_store, load_property_store
+
+    store = build_property_store(CSV)
+    assert store.rows == 4
+    assert [c.kind for c in store.columns.values()] == [
+        "int",
+        "text",
+        "float",
+        "text",
+        "text",
+        "float",
+    ]
+    np.testing.assert_array_equal(store["Ratio"].numeric, [0.5, np.nan, 0.25, 1.0])
+    # Mixed numbers and text are both numeric and dictionary-encoded
+    np.testing.assert_array_equal(store["Leaf LMT"].numeric, [1.2, np.nan, 1.5, np.nan])
+    assert store["Leaf LMT"].categories.tolist() == ["-", "1.2", "1.5"]
+    assert store["Note"].codes.tolist() == [0, -1, 1, 0]
+
+    assert store["Sr.No"].strings() == ["1", "2", "3", "4"]
+    assert store["Ratio"].strings() == ["0.5", "nan", "0.25", "1.0"]
+    assert store["Note"].strings() == ["a", "nan", "b", "a"]
+
+    assert {k: v.tolist() for k, v in store.category_rows.items()} == {
+        "BR": [3],
+        "OC": [0, 1],
+        "OM": [2],
+    }
+    assert store.rows_in_categories(["OM", "OC", "XX"]).tolist() == [0, 1, 2]
+    assert store.rows_in_categories([]).tolist() == []
+
+    assert store.version == hashlib.sha256(CSV).hexdigest()
+
+    before = artifact_cache.stats()
+    for _ in range(2):
+        loaded = load_property_store(CSV)
+        assert list(loaded.columns) == list(store.columns)
+        for name, column in store.columns.items():
+            assert loaded[name].kind == column.kind
+            assert loaded[name].strings() == column.strings()
+        assert loaded.version == store.version
+    after = artifact_cache.stats()
+    # Parsed on the first load only
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+
+
+def test_properties(tmp_path, monkeypatch):
+    from api.config import config
+    from api.services import properties as properties_module
+    from api.services.properties import Properties
+    from api.services.property_store import build_property_store
+    from fastapi import HTTPException
+
+    (tmp_path / "properties.csv").write_bytes(CSV)
+    monkeypatch.setattr(config, "DATA_PATH", str(tmp_path))
+    monkeypatch.setattr(config, "PROPERTIES_PATH", "properties.csv")
+    loads = []
+
+    def load_property_store(content: bytes):
+        loads.append(content)
+        return build_property_store(content)
+
+    monkeypatch.setattr(properties_module, "load_property_store", load_property_store)
+    properties = Properties()
+
+    async def scenario() -> None:
+        stores = await asyncio.gather(*(properties.get_store() for _ in range(5)))
+        # Concurrent first requests share a single load
+        assert len(loads) == 1
+        assert all(store is stores[0] for store in stores)
+
+        entries = await properties.get_property_entries()
+        assert [c.name for c in entries] == [
+            "Sr.No",
+            "Wall ID",
+            "Ratio",
+            "Leaf LMT",
+            "Note",
+            "Not Fulfill (l<20 cm) [%]",
+        ]
+        assert entries[3].values == ["1.2", "-", "1.5", "-"]
+
+        values = await properties.get_property_column_values("Ratio")
+        np.testing.assert_array_equal(values, [0.5, np.nan, 0.25, 1.0])
+        values = await properties.get_property_column_values(
+            "Ratio", allowed_categories=["OC", "BR"]
+        )
+        np.testing.assert_array_equal(values, [0.5, np.nan, 1.0])
+        # Cached by set of categories
+        assert values is await properties.get_property_column_values(
+            "Ratio", allowed_categories=["BR", "OC", "OC"]
+        )
+
+        async def query(**kwargs):
+            result = await properties.query_property_entries(**kwargs)
+            return result.total, result.rows, {c.name: c.values for c in result.columns}
+
+        total, rows, columns = await query(columns=["Wall ID", "Ratio"])
+        assert total == 4 and rows == [0, 1, 2, 3]
+        assert columns == {
+            "Wall ID": ["OC01", "OC02", "OM01", "BR01"],
+            "Ratio": ["0.5", "nan", "0.25", "1.0"],
+        }
+        assert (await query(filters=["Ratio>=0.5"]))[1] == [0, 3]
+        assert (await query(filters=["Ratio!=0.5"]))[1] == [1, 2, 3]
+        assert (await query(filters=["Note==a", "Sr.No<4"]))[1] == [0]
+        assert (await query(filters=["Note!=a"]))[1] == [1, 2]
+        assert (await query(filters=["Leaf LMT>1"]))[1] == [0, 2]
+        assert (await query(filters=["Note==z"]))[1] == []
+        # Column names with operator characters
+        assert (await query(filters=["Not Fulfill (l<20 cm) [%]>=20"]))[1] == [1, 3]
+        assert (await query(filters=["Not Fulfill (l<20 cm) [%]<20"]))[1] == [0]
+        assert (await query(allowed_categories=["OC", "BR"]))[1] == [0, 1, 3]
+        # Missing values last, ties in table order
+        assert (await query(sort=["Ratio"]))[1] == [2, 0, 3, 1]
+        assert (await query(sort=["-Ratio"]))[1] == [3, 0, 2, 1]
+        assert (await query(sort=["Note", "-Sr.No"]))[1] == [3, 0, 2, 1]
+        total, rows, columns = await query(
+            columns=["Sr.No"], sort=["-Sr.No"], offset=1, limit=2
+        )
+        assert total == 4 and rows == [2, 1] and columns == {"Sr.No": ["3", "2"]}
+
+        for kwargs, status in [
+            ({"filters": ["Ratio"]}, 400),
+            ({"filters": ["Ratio<high"]}, 400),
+            ({"filters": ["Missing==1"]}, 404),
+            ({"filters": ["Not Fulfill (l>40cm) [%]>1"]}, 404),
+            ({"columns": ["Missing"]}, 404),
+            ({"sort": ["-Missing"]}, 404),
+        ]:
+            with pytest.raises(HTTPException) as error:
+                await query(**kwargs)
+            assert error.value.status_code == status
+
+    asyncio.run(scenario())
+
+
+def test_pairwise_correlations():
+    import pandas as pd
+    from api.services.correlation import pairwise_correlations
+
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(60, 4))
+    values[:, 1] += values[:, 0]
+    values[:, 2] = np.exp(values[:, 0])
+    values[rng.random(values.shape) < 0.2] = np.nan
+    # Too few rows in common with the other columns, and a constant column
+    values[3:, 3] = np.nan
+    values = np.column_stack([values, np.ones(60)])
+
+    counts, pearson, spearman = pairwise_correlations(values)
+    frame = pd.DataFrame(values)
+    np.testing.assert_array_equal(counts, frame.notna().T.astype(int) @ frame.notna())
+    expected_pearson = frame.corr(method="pearson", min_periods=3).to_numpy()
+    expected_spearman = frame.corr(method="spearman", min_periods=3).to_numpy()
+    np.testing.assert_allclose(pearson, expected_pearson, equal_nan=True)
+    np.testing.assert_allclose(spearman, expected_spearman, equal_nan=True)
+    assert np.isnan(pearson[:, 4]).all()
+    assert np.isnan(pearson[0, 3])
+
+
+def test_bootstrap(monkeypatch):
+    from api.services import correlation
+    from api.services.timing import collect_timings
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, 10, 40)
+    y = 2 * x + 1 + rng.normal(0, 0.5, 40)
+
+    # Samples only depend on the seed, not on the chunks
+    fits = correlation.bootstrap_fits(x, y, seed=3, start=0, stop=10)
+    np.testing.assert_array_equal(
+        fits,
+        np.concatenate(
+            [
+                correlation.bootstrap_fits(x, y, seed=3, start=0, stop=4),
+                correlation.bootstrap_fits(x, y, seed=3, start=4, stop=10),
+            ]
+        ),
+    )
+    assert not np.array_equal(
+        fits, correlation.bootstrap_fits(x, y, seed=4, start=0, stop=10)
+    )
+
+    class Store:
+        version = "v1"
+
+    async def get_property_column_values(column, allowed_categories=[]):
+        return {"x": x, "y": y}[column]
+
+    async def get_store():
+        return Store()
+
+    async def run_in_pool(fn, *args):
+        return fn(*args)
+
+    monkeypatch.setattr(correlation, "_BOOTSTRAP_CHUNK", 64)
+    monkeypatch.setattr(correlation, "run_in_pool", run_in_pool)
+    monkeypatch.setattr(correlation.properties, "get_store", get_store)
+    monkeypatch.setattr(
+        correlation.properties,
+        "get_property_column_values",
+        get_property_column_values,
+    )
+    correlation._bootstrap_cache.clear()
+
+    async def scenario() -> None:
+        for hit in (False, True):
+            with collect_timings() as timings:
+                result = await correlation.compute_correlation_parameters(
+                    "x", "y", bootstrap=200, seed=1
+                )
+            assert timings.cache == {"bootstrap": hit}
+        bootstrap = result.bootstrap
+        assert bootstrap.samples == 200
+        assert bootstrap.slope[0] < result.slope < bootstrap.slope[1]
+        assert bootstrap.slope[0] < 2 < bootstrap.slope[1]
+        assert bootstrap.intercept[0] < result.intercept < bootstrap.intercept[1]
+        band = bootstrap.band
+        assert band.x[0] == x.min() and band.x[-1] == x.max()
+        assert np.all(np.array(band.lower) < np.array(band.upper))
+        prediction = bootstrap.prediction_band
+        assert prediction.x == band.x
+        assert np.all(np.array(prediction.lower) < np.array(band.lower))
+        assert np.all(np.array(prediction.upper) > np.array(band.upper))
+
+        Store.version = "v2"
+        with collect_timings() as timings:
+            await correlation.compute_correlation_parameters(
+                "x", "y", bootstrap=200, seed=1
+            )
+        assert timings.cache == {"bootstrap": False}
+
+        result = await correlation.compute_correlation_parameters("x", "y")
+        assert result.bootstrap is None
+
+    asyncio.run(scenario())